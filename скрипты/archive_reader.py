@@ -0,0 +1,237 @@
+import io
+import zipfile
+import fnmatch
+from bisect import bisect_right
+from datetime import datetime
+from itertools import accumulate
+from pathlib import Path
+
+
+def find_archive_parts(location):
+    """
+    Поиск частей архива
+
+    Parameters:
+    -----------
+    location : str, Path или список путей
+        Директория с файлами *.zip.partNNN, сам ZIP-файл или список частей
+
+    Returns:
+    --------
+    list of Path
+        Части в порядке склейки (как в copy /b part001+part002+...)
+    """
+    if isinstance(location, (list, tuple)):
+        return [Path(p) for p in location]
+
+    location = Path(location)
+    if location.is_file():
+        return [location]
+
+    parts = sorted(location.glob('*.zip.part*'))
+    if not parts:
+        parts = sorted(location.glob('*.zip'))
+    if not parts:
+        raise FileNotFoundError(f"В {location} не найдены части архива (*.zip.partNNN)")
+    return parts
+
+
+class SplitFile(io.RawIOBase):
+    """
+    Склейка частей архива в один виртуальный файл с произвольным доступом
+
+    Части не копируются и не объединяются на диске: чтение по смещению
+    перенаправляется в нужную часть.
+    """
+
+    def __init__(self, part_paths):
+        self.part_paths = [Path(p) for p in part_paths]
+        sizes = [p.stat().st_size for p in self.part_paths]
+        # offsets[i] - смещение начала i-й части, offsets[-1] - общий размер
+        self.offsets = list(accumulate(sizes, initial=0))
+        self.size = self.offsets[-1]
+        self._pos = 0
+        self._handles = {}
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Недопустимое значение whence: {whence}")
+        if pos < 0:
+            raise ValueError("Отрицательная позиция в файле")
+        self._pos = pos
+        return pos
+
+    def _part_handle(self, index):
+        if index not in self._handles:
+            self._handles[index] = open(self.part_paths[index], 'rb')
+        return self._handles[index]
+
+    def readinto(self, buffer):
+        if self._pos >= self.size:
+            return 0
+
+        index = bisect_right(self.offsets, self._pos) - 1
+        part_end = self.offsets[index + 1]
+        length = min(len(buffer), part_end - self._pos)
+
+        handle = self._part_handle(index)
+        handle.seek(self._pos - self.offsets[index])
+        read = handle.readinto(memoryview(buffer)[:length])
+        self._pos += read
+        return read
+
+    def close(self):
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = {}
+        super().close()
+
+
+class MerArchive:
+    """
+    Архив отчётов MER, читаемый напрямую из частей без распаковки
+
+    Файлы месяцев (например, EVEOnline_MER_Jan2021/kill_dump.csv)
+    открываются как потоки внутри ZIP и передаются в pandas как есть.
+    """
+
+    def __init__(self, parts, buffer_size=1 << 20):
+        """
+        Parameters:
+        -----------
+        parts : str, Path или список путей
+            Части архива (см. find_archive_parts)
+        buffer_size : int
+            Размер буфера чтения поверх склеенных частей
+        """
+        self.parts = find_archive_parts(parts)
+        self.buffer_size = buffer_size
+        self._zipfile = None
+        self._names = None
+
+    def __getstate__(self):
+        # Открытый архив не передаётся между процессами, он откроется заново
+        state = self.__dict__.copy()
+        state['_zipfile'] = None
+        state['_names'] = None
+        return state
+
+    @property
+    def zipfile(self):
+        if self._zipfile is None:
+            stream = io.BufferedReader(SplitFile(self.parts), buffer_size=self.buffer_size)
+            self._zipfile = zipfile.ZipFile(stream)
+        return self._zipfile
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = set(self.zipfile.namelist())
+        return self._names
+
+    def close(self):
+        if self._zipfile is not None:
+            self._zipfile.close()
+            self._zipfile.fp = None
+        self._zipfile = None
+
+    def month_folders(self, prefix="EVEOnline_MER_"):
+        """
+        Папки месяцев внутри архива
+
+        Returns:
+        --------
+        dict
+            Имя папки -> ArchiveFolder
+        """
+        folders = {}
+        for name in self.names:
+            components = name.split('/')
+            # Папка - любой компонент пути, кроме последнего (имени файла)
+            for depth, component in enumerate(components[:-1]):
+                if component.startswith(prefix):
+                    folder_prefix = '/'.join(components[:depth + 1]) + '/'
+                    folders.setdefault(component, ArchiveFolder(self, folder_prefix))
+                    break
+        return folders
+
+
+class ArchiveFolder:
+    """Папка месяца внутри архива с интерфейсом, как у Path"""
+
+    def __init__(self, archive, prefix):
+        self.archive = archive
+        self.prefix = prefix
+
+    @property
+    def name(self):
+        return self.prefix.rstrip('/').rsplit('/', 1)[-1]
+
+    def __truediv__(self, name):
+        return ArchiveMember(self.archive, self.prefix + name)
+
+    def __repr__(self):
+        return f"ArchiveFolder({self.prefix!r})"
+
+    def exists(self):
+        return any(name.startswith(self.prefix) for name in self.archive.names)
+
+    def glob(self, pattern):
+        """Файлы непосредственно в этой папке, подходящие под шаблон"""
+        members = []
+        for name in sorted(self.archive.names):
+            if not name.startswith(self.prefix):
+                continue
+            relative = name[len(self.prefix):]
+            if relative and '/' not in relative and fnmatch.fnmatch(relative, pattern):
+                members.append(ArchiveMember(self.archive, name))
+        return members
+
+
+class ArchiveMember:
+    """Файл внутри архива с интерфейсом, как у Path"""
+
+    def __init__(self, archive, member_name):
+        self.archive = archive
+        self.member_name = member_name
+
+    @property
+    def name(self):
+        return self.member_name.rsplit('/', 1)[-1]
+
+    def __repr__(self):
+        return f"ArchiveMember({self.member_name!r})"
+
+    def exists(self):
+        return self.member_name in self.archive.names
+
+    def open(self, mode='rb'):
+        """Поток распакованного содержимого (читается по мере обращения)"""
+        if mode != 'rb':
+            raise ValueError("Файлы архива открываются только в режиме 'rb'")
+        return self.archive.zipfile.open(self.member_name)
+
+    def fingerprint(self, previous=None):
+        """Отпечаток по данным оглавления ZIP: размер, время и CRC32 без чтения содержимого"""
+        info = self.archive.zipfile.getinfo(self.member_name)
+        mtime = datetime(*info.date_time)
+        return {
+            'size': info.file_size,
+            'mtime_ns': int(mtime.timestamp()) * 1_000_000_000,
+            'hash': f"crc32:{info.CRC:08x}",
+        }
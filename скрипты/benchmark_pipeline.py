@@ -0,0 +1,273 @@
+import io
+import sys
+import json
+import time
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+
+from synthetic_mer import SCALES, generate_scale, directory_size
+from consolidation_profiler import peak_rss_mb
+from consolidate_eve_data import EveDataConsolidatorFinal
+from eve_exploratory_analysis import EveExploratoryAnalysis
+from production_history import summarize_history
+from date_parsing import detect_date_format, period_codes
+
+BASELINE_DIR = Path(__file__).resolve().parent.parent / "данные" / "бенчмарки"
+# Допустимое замедление этапа относительно эталона
+TOLERANCE = 0.25
+# Этапы короче этого порога (с) не считаются регрессией: их время - в основном шум
+MIN_SECONDS = 0.05
+# Допустимый рост пиковой памяти этапа относительно эталона
+MEMORY_TOLERANCE = 0.25
+# Этапы, которым нужно меньше этого объёма (МБ), не проверяются по памяти
+MIN_MEMORY_MB = 5.0
+
+
+class PipelineBenchmark:
+    """
+    Замер этапов консолидации и разведочного анализа на синтетических данных
+
+    Кроме полных прогонов консолидации отдельно замеряются её горячие
+    участки: суммирование дампов убийств, разбор дат и разбор историй
+    производства. Для каждого этапа записываются время и память этапа -
+    насколько пик выделений (tracemalloc, включая массивы numpy и pandas)
+    поднялся над памятью, занятой на входе в этап. Выделения дочерних
+    процессов (workers > 1) в память этапов не попадают; пиковый RSS
+    процесса и дочерних процессов записывается один раз на весь прогон.
+    """
+
+    def __init__(self, data_dir, work_dir, workers=1, n_resamples=10_000, trace_memory=True, quiet=True):
+        """
+        Parameters:
+        -----------
+        data_dir : str или Path
+            Директория с папками EVEOnline_MER_*
+        work_dir : str или Path
+            Директория для результатов консолидации и кэшей
+        workers : int
+            Число процессов консолидатора
+        n_resamples : int
+            Число выборок в проверке значимости
+        trace_memory : bool
+            Замерять память этапов через tracemalloc (время этапов тогда включает
+            накладные расходы трассировки; эталон нужно снимать с тем же значением)
+        quiet : bool
+            Подавлять консольный вывод этапов
+        """
+        self.data_dir = Path(data_dir)
+        self.work_dir = Path(work_dir)
+        self.workers = workers
+        self.n_resamples = n_resamples
+        self.trace_memory = trace_memory
+        self.quiet = quiet
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Замер одного этапа"""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        output = io.StringIO()
+        redirect = contextlib.redirect_stdout(output) if self.quiet else contextlib.nullcontext()
+        start = time.perf_counter()
+        try:
+            with redirect:
+                yield
+        finally:
+            seconds = time.perf_counter() - start
+            record = {'seconds': round(seconds, 4)}
+            memory = ''
+            if self.trace_memory:
+                record['memory_mb'] = round((tracemalloc.get_traced_memory()[1] - start_bytes) / 2**20, 2)
+                memory = f"   память {record['memory_mb']:8.1f} МБ"
+            self.stages[name] = record
+            print(f"  {name:22} {seconds:8.3f} с{memory}")
+
+    def make_consolidator(self, force_rebuild):
+        return EveDataConsolidatorFinal(archives_dir=self.data_dir, output_dir=self.work_dir / "consolidated",
+                                        workers=self.workers, use_cache=True, force_rebuild=force_rebuild,
+                                        log_level='WARNING')
+
+    def run(self):
+        """Все этапы по порядку; возвращает словарь результатов"""
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            months = self.run_stages()
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+
+        return {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'data_dir': str(self.data_dir),
+            'data_mb': round(directory_size(self.data_dir) / 2**20, 1),
+            'months': months,
+            'workers': self.workers,
+            'trace_memory': self.trace_memory,
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_rss_children_mb': peak_rss_mb(children=True),
+            'stages': self.stages,
+        }
+
+    def run_stages(self):
+        with self.stage('consolidate_cold'):
+            df = self.make_consolidator(force_rebuild=True).run_full_consolidation()
+        if df is None:
+            raise RuntimeError(f"Консолидация {self.data_dir} не дала данных")
+
+        with self.stage('consolidate_warm'):
+            self.make_consolidator(force_rebuild=False).run_full_consolidation()
+
+        data_path = self.work_dir / "consolidated" / "eve_consolidated_data_final.csv"
+        analyzer = EveExploratoryAnalysis(data_path)
+        with self.stage('eda_load'):
+            analyzer.load_and_prepare_data()
+        with self.stage('eda_statistics'):
+            analyzer.calculate_basic_statistics()
+        with self.stage('eda_significance'):
+            analyzer.analyze_war_peace_statistics(n_resamples=self.n_resamples)
+        with self.stage('eda_correlations'):
+            analyzer.plot_correlation_matrix(show=False)
+        with self.stage('eda_plots'):
+            analyzer.plot_time_series_with_war_periods(save_path=self.work_dir, show=False, dpi=100)
+            analyzer.plot_comparison_boxplots(save_path=self.work_dir, show=False, dpi=100)
+
+        self.run_hot_paths()
+        return len(df)
+
+    def run_hot_paths(self):
+        """Горячие участки консолидации по всем папкам месяцев, каждый - отдельным этапом"""
+        consolidator = self.make_consolidator(force_rebuild=False)
+        folders = [folder for folder in sorted(self.data_dir.iterdir()) if folder.is_dir()]
+        kill_plans = [plan for plan in (consolidator.schema_registry.resolve('kill', folder) for folder in folders)
+                      if plan is not None and 'total_isk_destroyed' in plan.columns]
+        history_plans = [plan for plan in (consolidator.schema_registry.resolve('production', folder)
+                                           for folder in folders)
+                         if plan is not None and 'date' in plan.columns]
+
+        with self.stage('kill_dump_sum'):
+            for plan in kill_plans:
+                consolidator.sum_kill_isk_streaming(plan.file_path, plan.sep, plan.columns['total_isk_destroyed'])
+
+        # Столбцы дат читаются заранее: в этап входит только разбор
+        dates = [pd.read_csv(plan.file_path, sep=plan.sep, usecols=[plan.columns['date']]).iloc[:, 0]
+                 for plan in history_plans]
+        with self.stage('date_parsing'):
+            for values in dates:
+                period_codes(values, detect_date_format(values))
+        dates = None
+
+        with self.stage('production_history'):
+            for plan in history_plans:
+                summarize_history(plan)
+
+
+def save_baseline(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Эталон сохранен: {path}")
+
+
+def compare_to_baseline(results, baseline, tolerance=TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Сравнение с эталоном по времени и памяти этапов
+
+    Returns:
+    --------
+    list of str
+        Этапы, которые замедлились больше чем на tolerance или которым
+        понадобилось больше памяти, чем на memory_tolerance
+    """
+    if results.get('trace_memory') != baseline.get('trace_memory'):
+        print("\nВнимание: эталон снят с другим режимом tracemalloc, время этапов несопоставимо")
+    print(f"\n{'Этап':22} {'эталон, с':>10} {'сейчас, с':>10} {'изменение':>10}"
+          f" {'эталон, МБ':>11} {'сейчас, МБ':>11} {'изменение':>10}")
+    regressions = []
+    for name, current in results['stages'].items():
+        reference = baseline['stages'].get(name)
+        if reference is None:
+            print(f"{name:22} {'-':>10} {current['seconds']:10.3f}")
+            continue
+        ratio = current['seconds'] / reference['seconds'] if reference['seconds'] else float('inf')
+        flags = []
+        if ratio > 1 + tolerance and current['seconds'] >= MIN_SECONDS:
+            regressions.append(f"{name} (время)")
+            flags.append('время')
+        line = f"{name:22} {reference['seconds']:10.3f} {current['seconds']:10.3f} {ratio - 1:+10.1%}"
+
+        if 'memory_mb' in current and 'memory_mb' in reference:
+            memory_ratio = current['memory_mb'] / reference['memory_mb'] if reference['memory_mb'] else float('inf')
+            if memory_ratio > 1 + memory_tolerance and current['memory_mb'] >= MIN_MEMORY_MB:
+                regressions.append(f"{name} (память)")
+                flags.append('память')
+            line += f" {reference['memory_mb']:11.1f} {current['memory_mb']:11.1f} {memory_ratio - 1:+10.1%}"
+        if flags:
+            line += f"  <- регрессия: {', '.join(flags)}"
+        print(line)
+    return regressions
+
+
+def run_benchmark(scale='year', data_root=None, baseline_path=None, save=False, **options):
+    """
+    Генерация данных нужного масштаба (если их ещё нет), замер и сравнение с эталоном
+
+    Returns:
+    --------
+    tuple
+        (результаты, список регрессий)
+    """
+    data_root = Path(data_root or Path(tempfile.gettempdir()) / "eve_benchmark")
+    data_dir = data_root / "data" / scale
+    if not data_dir.exists() or not any(data_dir.iterdir()):
+        print(f"Генерация синтетических данных ({scale}) в {data_dir}...")
+        generate_scale(data_dir, scale)
+
+    print(f"\nЗамер этапов ({scale}):")
+    results = PipelineBenchmark(data_dir, data_root / "work" / scale, **options).run()
+    results['scale'] = scale
+
+    baseline_path = Path(baseline_path or BASELINE_DIR / f"{scale}.json")
+    regressions = []
+    if save or not baseline_path.exists():
+        save_baseline(results, baseline_path)
+    else:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f))
+        if regressions:
+            print(f"\nРегрессии: {', '.join(regressions)}")
+        else:
+            print("\nРегрессий нет")
+    return results, regressions
+
+
+def main():
+    """Бенчмарк: python benchmark_pipeline.py [масштаб] [--save-baseline]"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    scale = args[0] if args else 'year'
+    if scale not in SCALES:
+        print(f"Неизвестный масштаб: {scale}; доступны {list(SCALES)}")
+        return 2
+
+    print("=" * 70)
+    print("БЕНЧМАРК КОНСОЛИДАЦИИ И РАЗВЕДОЧНОГО АНАЛИЗА")
+    print("=" * 70)
+    _, regressions = run_benchmark(scale, save='--save-baseline' in sys.argv)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
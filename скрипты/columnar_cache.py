@@ -0,0 +1,219 @@
+import os
+import json
+import warnings
+from pathlib import Path
+import pandas as pd
+from month_cache import file_fingerprint
+from schema_registry import SchemaRegistry
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # без pyarrow загрузчики работают напрямую с CSV
+    pa = None
+
+# Сводные таблицы проекта
+SUMMARY_TABLES_DIR = Path(__file__).resolve().parent.parent / "данные" / "обработанные" / "сводные_таблицы"
+SUMMARY_TABLES = [
+    "combined_kill_dump",
+    "combined_regional_stats",
+    "combined_mining_by_region",
+    "combined_moon_materials_by_region",
+    "summary_by_region_month",
+]
+COLUMNAR_SUBDIR = "columnar"
+
+
+def columnar_paths(csv_path):
+    """Пути к колоночной копии таблицы и файлу с её метаданными"""
+    csv_path = Path(csv_path)
+    columnar_dir = csv_path.parent / COLUMNAR_SUBDIR
+    return columnar_dir / f"{csv_path.stem}.parquet", columnar_dir / f"{csv_path.stem}.json"
+
+
+def csv_separator(csv_path):
+    """Разделитель таблицы, определённый по её началу (как у реестра схем)"""
+    sep, _ = SchemaRegistry().read_header(Path(csv_path), True)
+    return sep
+
+
+def read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(csv_path):
+    """
+    Проверка актуальности колоночной копии
+
+    Копия свежая, если хэш исходного CSV совпадает с записанным при конвертации
+    и она разобрана с тем же разделителем (копии, записанные до определения
+    разделителя, пересоздаются). При неизменных размере и времени изменения
+    файл повторно не хэшируется.
+    """
+    parquet_path, meta_path = columnar_paths(csv_path)
+    if not parquet_path.exists():
+        return False
+    meta = read_meta(meta_path)
+    if not meta or meta.get('sep') != csv_separator(csv_path):
+        return False
+    current = file_fingerprint(csv_path, meta['source'])
+    return current['hash'] == meta['source']['hash']
+
+
+def convert_table(csv_path, block_size=64 << 20, compression='zstd'):
+    """
+    Конвертация CSV в типизированный сжатый Parquet
+
+    CSV читается потоково блоками по block_size байт с разделителем,
+    определённым по началу файла (',' или ';'); строковые столбцы
+    кодируются словарём (при загрузке становятся категориальными).
+
+    Parameters:
+    -----------
+    csv_path : str или Path
+        Исходная таблица
+    block_size : int
+        Размер блока чтения CSV
+    compression : str
+        Кодек сжатия Parquet
+
+    Returns:
+    --------
+    Path
+        Путь к Parquet-файлу
+    """
+    if pa is None:
+        raise ImportError("Для колоночного кэша нужен пакет pyarrow")
+
+    csv_path = Path(csv_path)
+    parquet_path, meta_path = columnar_paths(csv_path)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Отпечаток снимаем до чтения: если файл изменится во время конвертации,
+    # копия будет считаться устаревшей
+    source = file_fingerprint(csv_path)
+    sep = csv_separator(csv_path)
+    tmp_path = parquet_path.with_suffix('.parquet.tmp')
+
+    try:
+        schema, rows = write_parquet(csv_path, tmp_path, block_size, compression, sep=sep)
+    except pa.ArrowInvalid:
+        # Типы выводятся по первому блоку; если дальше в целочисленном
+        # столбце встретилось дробное значение, повторяем с float64
+        first_block = pa_csv.open_csv(csv_path, read_options=pa_csv.ReadOptions(block_size=block_size),
+                                      parse_options=pa_csv.ParseOptions(delimiter=sep))
+        column_types = {field.name: pa.float64() for field in first_block.schema
+                        if pa.types.is_integer(field.type)}
+        schema, rows = write_parquet(csv_path, tmp_path, block_size, compression, column_types, sep)
+    os.replace(tmp_path, parquet_path)
+
+    meta = {
+        'source': source,
+        'rows': rows,
+        'sep': sep,
+        'columns': {field.name: str(field.type) for field in schema},
+    }
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    return parquet_path
+
+
+def write_parquet(csv_path, parquet_path, block_size, compression, column_types=None, sep=','):
+    """Потоковая запись CSV в Parquet; возвращает схему и число строк"""
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        parse_options=pa_csv.ParseOptions(delimiter=sep),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types or {}),
+    )
+    schema = dictionary_schema(reader.schema)
+    rows = 0
+    with pq.ParquetWriter(parquet_path, schema, compression=compression) as writer:
+        for batch in reader:
+            table = pa.Table.from_batches([batch]).cast(schema)
+            writer.write_table(table)
+            rows += table.num_rows
+    return schema, rows
+
+
+def dictionary_schema(schema):
+    """Схема, в которой строковые столбцы закодированы словарём"""
+    fields = []
+    for field in schema:
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def convert_summary_tables(tables_dir=SUMMARY_TABLES_DIR, force=False):
+    """
+    Конвертация всех сводных таблиц (только устаревших, если force=False)
+
+    Returns:
+    --------
+    dict
+        Имя таблицы -> путь к Parquet-файлу
+    """
+    tables_dir = Path(tables_dir)
+    converted = {}
+    for name in SUMMARY_TABLES:
+        csv_path = tables_dir / f"{name}.csv"
+        if not csv_path.exists():
+            print(f"Таблица {csv_path.name} не найдена, пропускаю")
+            continue
+        if not force and is_fresh(csv_path):
+            print(f"{name}: колоночная копия актуальна")
+            converted[name] = columnar_paths(csv_path)[0]
+            continue
+        converted[name] = convert_table(csv_path)
+        print(f"{name}: сохранено в {converted[name]}")
+    return converted
+
+
+def load_table(csv_path, columns=None):
+    """
+    Загрузка таблицы с предпочтением свежей колоночной копии
+
+    Parameters:
+    -----------
+    csv_path : str или Path
+        Путь к исходному CSV
+    columns : list, optional
+        Нужные столбцы; из Parquet читаются только они
+
+    Returns:
+    --------
+    pd.DataFrame
+    """
+    csv_path = Path(csv_path)
+    if pa is not None and is_fresh(csv_path):
+        parquet_path, _ = columnar_paths(csv_path)
+        return pd.read_parquet(parquet_path, columns=columns)
+
+    if pa is not None:
+        warnings.warn(f"Колоночная копия {csv_path.name} отсутствует или устарела, читаю CSV")
+    return pd.read_csv(csv_path, sep=csv_separator(csv_path), usecols=columns)
+
+
+def load_summary_table(name, columns=None, tables_dir=SUMMARY_TABLES_DIR):
+    """Загрузка сводной таблицы по имени (например, 'combined_kill_dump')"""
+    return load_table(Path(tables_dir) / f"{name}.csv", columns=columns)
+
+
+def main():
+    """Конвертация сводных таблиц в колоночный формат"""
+    print("=" * 70)
+    print("КОНВЕРТАЦИЯ СВОДНЫХ ТАБЛИЦ В PARQUET")
+    print("=" * 70)
+    convert_summary_tables()
+
+
+if __name__ == "__main__":
+    main()
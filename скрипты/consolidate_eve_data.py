@@ -1,29 +1,99 @@
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import warnings
+from month_cache import MonthResultCache
+from archive_reader import MerArchive
+from consolidation_log import ConsolidationLogger
+from schema_registry import SchemaRegistry
+from production_history import ProductionHistoryIndex
+from date_parsing import period_code, period_label
+from war_classifier import classify_series
+from consolidation_profiler import StageProfiler
+from kill_partitions import KillPartitions
+from month_prefetch import MonthPrefetcher, PREFETCH_MONTHS, PREFETCH_BUDGET
 warnings.filterwarnings('ignore')
 
 class EveDataConsolidatorFinal:
     """Окончательная версия консолидатора данных EVE Online"""
     
-    def __init__(self):
-        self.archives_dir = Path(r"C:\Users\Yapupalo\Desktop\Учёба\Мага\Курсовая\v2\данные\архивы")
-        self.output_dir = Path(r"C:\Users\Yapupalo\Desktop\Учёба\Мага\Курсовая\v2\данные\Подготовленные данные")
+    def __init__(self, stream_kill_dump=True, kill_chunk_size=250_000, workers=1,
+                 use_cache=True, force_rebuild=False,
+                 archives_dir=None, output_dir=None, archive_parts=None,
+                 production_history='per_month', log_level='INFO', log_format='text',
+                 war_method='global', war_options=None, kill_partitions=None,
+                 prefetch_months=PREFETCH_MONTHS, prefetch_budget=PREFETCH_BUDGET):
+        """
+        stream_kill_dump : читать kill_dump.csv потоково (только столбец ISK, по частям)
+        kill_chunk_size : число строк в одной части при потоковом чтении
+        workers : число процессов для обработки месяцев (1 - последовательно)
+        use_cache : использовать кэш результатов по месяцам
+        force_rebuild : сбросить кэш и заново обработать все месяцы
+        archives_dir : директория с распакованными папками EVEOnline_MER_*
+        output_dir : директория для результатов
+        archive_parts : части архива (директория с *.zip.partNNN, ZIP-файл или список);
+            если заданы, папки месяцев читаются прямо из архива без распаковки
+        production_history : 'per_month' - каждый месяц берётся из файла истории своей папки;
+            'shared' - самый свежий файл истории обслуживает все покрытые им месяцы,
+            файлы остальных папок читаются только для непокрытых месяцев
+        log_level : минимальный уровень журнала (DEBUG включает построчные отладочные дампы)
+        log_format : 'text' или 'jsonl'
+        war_method : 'global' - единый порог по всей истории (метки старых месяцев могут
+            меняться с приходом новых); 'rolling' или 'ewma' - причинный порог по
+            предыдущим месяцам (см. war_classifier), прошлые метки стабильны
+        war_options : параметры причинного классификатора (window, span, k, min_periods)
+        kill_partitions : директория шардов сводного дампа убийств (см. kill_partitions);
+            потери месяцев, которые есть в шардах, считаются по шарду месяца,
+            остальных - по kill_dump.csv папки
+        prefetch_months : сколько следующих месяцев читать в память в фоне при
+            последовательной обработке (0 - без предзагрузки)
+        prefetch_budget : предел суммарного размера буферов предзагрузки, байт
+        """
+        self.stream_kill_dump = stream_kill_dump
+        self.kill_chunk_size = kill_chunk_size
+        self.workers = workers
+        self.production_history = production_history
+        self.war_method = war_method
+        self.war_options = war_options or {}
+        self.kill_partitions = KillPartitions(kill_partitions) if kill_partitions is not None else None
+        self.prefetch_months = prefetch_months
+        self.prefetch_budget = prefetch_budget
+        # Профиль этапов; включается флагом run_full_consolidation(profile=True)
+        self.profiler = StageProfiler(enabled=False)
+        self.production_index = ProductionHistoryIndex(self.profiler)
+        self.schema_registry = SchemaRegistry()
+        
+        self.archives_dir = Path(archives_dir or r"C:\Users\Yapupalo\Desktop\Учёба\Мага\Курсовая\v2\данные\архивы")
+        self.output_dir = Path(output_dir or r"C:\Users\Yapupalo\Desktop\Учёба\Мага\Курсовая\v2\данные\Подготовленные данные")
+        self.archive = MerArchive(archive_parts) if archive_parts is not None else None
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
         self.consolidated_data = []
-        self.log_file = self.output_dir / "consolidation_final_log.txt"
-        
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            f.write("Лог консолидации данных EVE Online (финальная версия)\n")
-            f.write("=" * 60 + "\n")
+        log_name = "consolidation_final_log.jsonl" if log_format == 'jsonl' else "consolidation_final_log.txt"
+        self.log_file = self.output_dir / log_name
+        self.logger = ConsolidationLogger(
+            self.log_file, level=log_level, fmt=log_format,
+            header=["Лог консолидации данных EVE Online (финальная версия)", "=" * 60],
+        )
+        
+        # Кэш результатов по месяцам: повторно обрабатываются только новые и изменённые папки
+        self.month_cache = None
+        if use_cache:
+            self.month_cache = MonthResultCache(self.output_dir / "month_cache", force_rebuild=force_rebuild)
+    
+    def __getstate__(self):
+        # В дочерний процесс передаём только настройки, без накопленных данных
+        state = self.__dict__.copy()
+        state['consolidated_data'] = []
+        state['month_cache'] = None
+        return state
     
-    def log_message(self, message):
-        print(message)
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(message + "\n")
+    def log_message(self, message, level='INFO'):
+        self.logger.log(message, level)
     
     def parse_date_from_folder(self, folder_name):
         """Извлекает дату из имени папки"""
@@ -46,247 +116,213 @@ class EveDataConsolidatorFinal:
                 return f"{year_str}-{month_map[month_str]}-01"
             return None
         except Exception as e:
-            self.log_message(f"Ошибка при разборе даты из '{folder_name}': {e}")
+            self.log_message(f"Ошибка при разборе даты из '{folder_name}': {e}", 'ERROR')
             return None
     
-    def find_file(self, folder_path, possible_names):
-        """Находит файл по списку возможных имён"""
-        for name in possible_names:
-            file_path = folder_path / name
-            if file_path.exists():
-                return file_path
-        return None
+    def list_mer_folders(self):
+        """Папки с отчётами: имя -> путь (каталог на диске или папка внутри архива)"""
+        if self.archive is not None:
+            return self.archive.month_folders()
+        return {f: self.archives_dir / f for f in os.listdir(self.archives_dir)
+                if f.startswith("EVEOnline_MER_")}
     
     def extract_production_data_fixed(self, folder_path, target_date):
-        """ИСПРАВЛЕННАЯ функция извлечения данных о производстве"""
+        """ИСПРАВЛЕННАЯ функция извлечения данных о производстве
+        
+        Файл истории разбирается один раз и группируется по месяцам
+        (см. production_history); здесь берутся суммы за целевой месяц.
+        """
         result = {}
+        period = period_code(target_date.year, target_date.month)
+        target_year_month = period_label(period)
+        
+        history = None
+        if self.production_history == 'shared':
+            history = self.production_index.shared_history(period)
+            if history is not None:
+                self.log_message(f"    Используется общая история: {history.label}")
+        
+        if history is None:
+            file_name = "с производством"
+            try:
+                plan = self.schema_registry.resolve('production', folder_path)
+                
+                if plan is None:
+                    self.log_message(f"    Файл с производством не найден", 'WARNING')
+                    return result
+                
+                file_name = plan.file_path.name
+                history = self.production_index.load(plan, f"{folder_path.name}/{file_name}")
+            except Exception as e:
+                self.log_message(f"    ОШИБКА при чтении файла {file_name}: {e}", 'ERROR')
+                import traceback
+                self.log_message(f"    Трассировка: {traceback.format_exc()}", 'ERROR')
+                return result
         
-        # Возможные имена файлов
-        possible_files = [
-            "ProducedDestroyedMined.csv",
-            "produced_destroyed_mined.csv",
-        ]
+        self.log_message(f"    Файл найден: {history.label}, строк: {history.rows}")
         
-        file_path = self.find_file(folder_path, possible_files)
+        # ВАЖНО: Выводим ВСЕ столбцы для отладки
+        self.log_message(f"    Все столбцы в файле: {history.columns}", 'DEBUG')
+        self.log_message(f"    Формат дат: {history.date_format or 'не определён (разбор pandas)'}", 'DEBUG')
         
-        if not file_path:
-            self.log_message(f"    Файл с производством не найден")
+        if not history.date_column:
+            self.log_message(f"    ОШИБКА: Нет столбца с датой!", 'ERROR')
             return result
         
-        try:
-            df = pd.read_csv(file_path)
-            self.log_message(f"    Файл найден: {file_path.name}, строк: {len(df)}")
-            
-            # ВАЖНО: Выводим ВСЕ столбцы для отладки
-            all_columns = list(df.columns)
-            self.log_message(f"    Все столбцы в файле: {all_columns}")
-            
-            # Определяем столбец с датой
-            date_column = None
-            if 'history_date' in df.columns:
-                date_column = 'history_date'
-            elif 'date' in df.columns:
-                date_column = 'date'
-            
-            if not date_column:
-                self.log_message(f"    ОШИБКА: Нет столбца с датой!")
-                return result
-            
-            # Преобразуем дату
-            df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
-            
-            # Фильтруем по целевому месяцу
-            target_year_month = target_date.strftime('%Y-%m')
-            df['year_month'] = df[date_column].dt.strftime('%Y-%m')
-            month_data = df[df['year_month'] == target_year_month]
-            
-            self.log_message(f"    Найдено {len(month_data)} записей за {target_year_month}")
-            
-            if len(month_data) == 0:
-                self.log_message(f"    ВНИМАНИЕ: Нет данных за {target_year_month}!")
-                return result
-            
-            # ВАЖНО: Проверяем первые несколько строк для отладки
-            self.log_message(f"    Первые 3 строки за {target_year_month}:")
-            for i, (_, row) in enumerate(month_data.head(3).iterrows()):
-                self.log_message(f"      Строка {i+1}: {row[date_column].date()}, производство={row.get('production_isk', row.get('produced', 'N/A'))}")
-            
-            # Ищем данные о ПРОИЗВОДСТВЕ
-            if 'production_isk' in month_data.columns:
-                result['production_isk'] = float(month_data['production_isk'].sum())
-                self.log_message(f"    Найден production_isk: {result['production_isk']:,.2f}")
-            elif 'produced' in month_data.columns:
-                result['production_isk'] = float(month_data['produced'].sum())
-                self.log_message(f"    Найден produced: {result['production_isk']:,.2f}")
-            else:
-                self.log_message(f"    ВНИМАНИЕ: Столбец производства не найден!")
-                # Показываем доступные столбцы
-                self.log_message(f"    Доступные столбцы: {list(month_data.columns)}")
-            
-            # Ищем данные об УНИЧТОЖЕНИИ
-            if 'destruction_isk' in month_data.columns:
-                result['destruction_isk'] = float(month_data['destruction_isk'].sum())
-                self.log_message(f"    Найден destruction_isk: {result['destruction_isk']:,.2f}")
-            elif 'destroyed' in month_data.columns:
-                result['destruction_isk'] = float(month_data['destroyed'].sum())
-                self.log_message(f"    Найден destroyed: {result['destruction_isk']:,.2f}")
-            
-            # Ищем данные о ДОБЫЧЕ
-            if 'mining_isk' in month_data.columns:
-                result['mining_isk'] = float(month_data['mining_isk'].sum())
-                self.log_message(f"    Найден mining_isk: {result['mining_isk']:,.2f}")
-            elif 'mining.value' in month_data.columns:
-                result['mining_isk'] = float(month_data['mining.value'].sum())
-                self.log_message(f"    Найден mining.value: {result['mining_isk']:,.2f}")
-            elif 'mining' in month_data.columns:
-                result['mining_isk'] = float(month_data['mining'].sum())
-                self.log_message(f"    Найден mining: {result['mining_isk']:,.2f}")
-            
-        except Exception as e:
-            self.log_message(f"    ОШИБКА при чтении файла {file_path.name}: {e}")
-            import traceback
-            self.log_message(f"    Трассировка: {traceback.format_exc()}")
+        record_count = history.record_count(period)
+        self.log_message(f"    Найдено {record_count} записей за {target_year_month}")
+        
+        if record_count == 0:
+            self.log_message(f"    ВНИМАНИЕ: Нет данных за {target_year_month}!", 'WARNING')
+            return result
+        
+        # Построчный отладочный дамп (только на уровне DEBUG)
+        if self.logger.enabled('DEBUG'):
+            self.log_message(f"    Первые 3 строки за {target_year_month}:", 'DEBUG')
+            for i, (date, value) in enumerate(history.previews.get(period, [])):
+                self.log_message(f"      Строка {i+1}: {date}, производство={value}", 'DEBUG')
+        
+        sums = history.month_sums(period)
+        if 'production_isk' not in sums:
+            self.log_message(f"    ВНИМАНИЕ: Столбец производства не найден!", 'WARNING')
+            # Показываем доступные столбцы
+            self.log_message(f"    Доступные столбцы: {history.columns}", 'WARNING')
+        
+        # Производство, уничтожение, добыча
+        for key, value in sums.items():
+            result[key] = value
+            self.log_message(f"    Найден {history.source_columns[key]}: {value:,.2f}")
         
         return result
     
     def extract_trade_data_fixed(self, folder_path):
         """Извлечение торговых данных"""
+        return self.extract_aggregates('trade', folder_path, "Ошибка при чтении торговых данных")
+    
+    def extract_money_data_fixed(self, folder_path):
+        """Извлечение данных о денежной массе"""
+        return self.extract_aggregates('money', folder_path, "Ошибка при чтении денежных данных")
+    
+    def extract_aggregates(self, kind, folder_path, error_message):
+        """Чтение только нужных столбцов файла по плану схемы и их агрегирование (сумма или среднее)"""
         result = {}
         
-        possible_files = [
-            "RegionalStats.csv",
-            "regional_stats.csv",
-        ]
-        
-        file_path = self.find_file(folder_path, possible_files)
-        
-        if not file_path:
-            return result
-        
         try:
-            df = pd.read_csv(file_path)
-            
-            # Ищем столбцы с торговлей
-            if 'trade_value' in df.columns:
-                result['trade_value'] = float(df['trade_value'].sum())
-            elif 'trade.value' in df.columns:
-                result['trade_value'] = float(df['trade.value'].sum())
-            elif 'trade' in df.columns:
-                result['trade_value'] = float(df['trade'].sum())
+            plan = self.schema_registry.resolve(kind, folder_path)
+            if plan is None or not plan.columns:
+                return result
             
-            if 'exports' in df.columns:
-                result['total_exports'] = float(df['exports'].sum())
-            elif 'export' in df.columns:
-                result['total_exports'] = float(df['export'].sum())
+            with self.profiler.stage('read_csv', file=kind):
+                with plan.file_path.open('rb') as f:
+                    df = pd.read_csv(f, sep=plan.sep, usecols=plan.usecols)
+            self.profiler.count_file(kind, plan.file_path, rows=len(df))
             
-            if 'imports' in df.columns:
-                result['total_imports'] = float(df['imports'].sum())
-            elif 'import' in df.columns:
-                result['total_imports'] = float(df['import'].sum())
+            for key, col in plan.columns.items():
+                result[key] = float(df[col].agg(plan.aggregate))
             
         except Exception as e:
-            self.log_message(f"    Ошибка при чтении торговых данных: {e}")
+            self.log_message(f"    {error_message}: {e}", 'ERROR')
         
         return result
     
-    def extract_kill_data_fixed(self, folder_path):
-        """Извлечение данных о потерях"""
-        result = {'total_isk_destroyed': 0.0}
-        
-        possible_files = [
-            "kill_dump.csv",
-            "Killdump.csv",
-            "kills.csv",
-            "Kills.csv"
-        ]
-        
-        file_path = self.find_file(folder_path, possible_files)
+    def kill_shard(self, target_date):
+        """Шард сводного дампа за месяц target_date (None, если шардов нет или месяца в них нет)"""
+        if self.kill_partitions is None or target_date is None:
+            return None
+        return self.kill_partitions.month_path(period_label(period_code(target_date.year, target_date.month)))
+    
+    def extract_kill_data_fixed(self, folder_path, target_date=None):
+        """Извлечение данных о потерях
         
-        if not file_path:
-            return result
+        Если заданы шарды сводного дампа и целевой месяц в них есть,
+        читается только шард этого месяца, а не kill_dump.csv папки.
+        """
+        result = {'total_isk_destroyed': 0.0}
         
         try:
-            # Пробуем разные разделители
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                sample = f.read(5000)
+            shard = self.kill_shard(target_date)
+            if shard is not None:
+                self.log_message(f"    Потери из шарда: {shard.name}")
+                file_path, sep = shard, self.kill_partitions.sep
+                isk_col = self.kill_partitions.columns.get('isk_destroyed')
+            else:
+                plan = self.schema_registry.resolve('kill', folder_path)
+                if plan is None:
+                    return result
+                # Столбец с потерями и разделитель определены по заголовку
+                file_path, sep = plan.file_path, plan.sep
+                isk_col = plan.columns.get('total_isk_destroyed')
+            
+            if isk_col is None:
+                return result
             
-            sep = ';' if ';' in sample else ','
+            if self.stream_kill_dump:
+                result['total_isk_destroyed'] = self.sum_kill_isk_streaming(file_path, sep, isk_col)
+                return result
             
-            df = pd.read_csv(file_path, sep=sep, low_memory=False, on_bad_lines='skip')
+            with self.profiler.stage('read_csv', file='kill'):
+                with file_path.open('rb') as f:
+                    df = pd.read_csv(f, sep=sep, usecols=[isk_col], low_memory=False, on_bad_lines='skip')
+            self.profiler.count_file('kill', file_path, rows=len(df))
             
-            # Ищем столбец с потерями
-            for col in df.columns:
-                col_lower = col.lower()
-                if 'isk' in col_lower and ('destroyed' in col_lower or 'lost' in col_lower):
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                    total = float(df[col].sum())
-                    result['total_isk_destroyed'] = total
-                    break
+            df[isk_col] = pd.to_numeric(df[isk_col], errors='coerce')
+            result['total_isk_destroyed'] = float(df[isk_col].sum())
             
         except Exception as e:
-            self.log_message(f"    Ошибка при чтении данных о потерях: {e}")
+            self.log_message(f"    Ошибка при чтении данных о потерях: {e}", 'ERROR')
         
         return result
     
-    def extract_money_data_fixed(self, folder_path):
-        """Извлечение данных о денежной массе"""
-        result = {}
-        
-        possible_files = [
-            "MoneySupply.csv",
-            "money_supply.csv",
-        ]
-        
-        file_path = self.find_file(folder_path, possible_files)
-        
-        if not file_path:
-            return result
-        
-        try:
-            df = pd.read_csv(file_path)
-            
-            # Ищем столбец скорости обращения
-            for col in df.columns:
-                col_lower = col.lower()
-                if 'velocity' in col_lower:
-                    result['isk_velocity'] = float(df[col].mean())
-                    break
-            
-            # Ищем общую денежную массу
-            if 'total_isk' in df.columns:
-                result['total_isk'] = float(df['total_isk'].mean())
-            elif 'total' in df.columns and 'isk' in str(df.columns).lower():
-                # Может быть, столбец называется просто 'total'
-                result['total_isk'] = float(df['total'].mean())
-            
-        except Exception as e:
-            self.log_message(f"    Ошибка при чтении денежных данных: {e}")
-        
-        return result
+    def sum_kill_isk_streaming(self, file_path, sep, isk_col):
+        """Потоковое суммирование ISK: читается только нужный столбец, по частям.
+        
+        Пиковая память определяется размером части (kill_chunk_size),
+        а не размером файла.
+        """
+        total = 0.0
+        rows = 0
+        with self.profiler.stage('read_csv', file='kill'):
+            with file_path.open('rb') as f:
+                reader = pd.read_csv(f, sep=sep, usecols=[isk_col],
+                                     chunksize=self.kill_chunk_size, on_bad_lines='skip')
+                for chunk in reader:
+                    total += float(pd.to_numeric(chunk[isk_col], errors='coerce').sum())
+                    rows += len(chunk)
+        self.profiler.count_file('kill', file_path, rows=rows)
+        return total
     
     def process_month_fixed(self, folder_path, date_str):
         """Обработка данных за один месяц (исправленная)"""
+        with self.profiler.stage('month', month=date_str[:7]):
+            return self._process_month(folder_path, date_str)
+    
+    def _process_month(self, folder_path, date_str):
         month_data = {"history_date": date_str}
         target_date = pd.to_datetime(date_str)
+        self.logger.context = {'month': date_str[:7]}
         
         self.log_message(f"\n{'='*50}")
         self.log_message(f"ОБРАБОТКА: {folder_path.name} ({date_str})")
         self.log_message(f"{'='*50}")
         
         # 1. Производство, уничтожение, добыча
-        prod_data = self.extract_production_data_fixed(folder_path, target_date)
+        with self.profiler.stage('production'):
+            prod_data = self.extract_production_data_fixed(folder_path, target_date)
         month_data.update(prod_data)
         
         # 2. Торговля
-        trade_data = self.extract_trade_data_fixed(folder_path)
+        with self.profiler.stage('trade'):
+            trade_data = self.extract_trade_data_fixed(folder_path)
         month_data.update(trade_data)
         
         # 3. Потери
-        kill_data = self.extract_kill_data_fixed(folder_path)
+        with self.profiler.stage('kill'):
+            kill_data = self.extract_kill_data_fixed(folder_path, target_date)
         month_data.update(kill_data)
         
         # 4. Денежная масса
-        money_data = self.extract_money_data_fixed(folder_path)
+        with self.profiler.stage('money'):
+            money_data = self.extract_money_data_fixed(folder_path)
         month_data.update(money_data)
         
         # Проверяем, что данные извлечены
@@ -304,34 +340,51 @@ class EveDataConsolidatorFinal:
                     self.log_message(f"    {metric}: {value:,.2f}")
         
         if extracted_count == 0:
-            self.log_message(f"    ВНИМАНИЕ: Не удалось извлечь ни одного показателя!")
+            self.log_message(f"    ВНИМАНИЕ: Не удалось извлечь ни одного показателя!", 'WARNING')
         
         return month_data
     
-    def consolidate_all_months_fixed(self):
-        """Консолидация данных за все месяцы (исправленная)"""
+    def consolidate_all_months_fixed(self, workers=None):
+        """Консолидация данных за все месяцы (исправленная)
+        
+        workers : число процессов; по умолчанию берётся из self.workers.
+        Результат и порядок записей в логе совпадают с последовательным запуском.
+        """
+        workers = self.workers if workers is None else workers
         self.log_message("Начинаю консолидацию данных (исправленная версия)...")
         
         # Получаем все папки с отчётами
-        mer_folders = sorted([f for f in os.listdir(self.archives_dir) 
-                            if f.startswith("EVEOnline_MER_")])
+        folders = self.list_mer_folders()
+        mer_folders = sorted(folders)
         
         self.log_message(f"Найдено папок: {len(mer_folders)}")
         
-        processed_count = 0
+        # Сначала отбираем месяцы для обработки, сохраняя исходный порядок папок
+        plan = []
         for folder_name in mer_folders:
             date_str = self.parse_date_from_folder(folder_name)
             if not date_str:
-                self.log_message(f"Пропускаю папку: {folder_name} (не удалось определить дату)")
+                plan.append((folder_name, None, f"Пропускаю папку: {folder_name} (не удалось определить дату)"))
                 continue
             
-            folder_path = self.archives_dir / folder_name
+            folder_path = folders[folder_name]
             if not folder_path.exists():
-                self.log_message(f"Пропускаю: {folder_name} (папка не существует)")
+                plan.append((folder_name, None, f"Пропускаю: {folder_name} (папка не существует)"))
+                continue
+            
+            plan.append((folder_name, (folder_path, date_str), None))
+        
+        tasks = [task for _, task, _ in plan if task is not None]
+        month_results = self.process_months(tasks, workers)
+        
+        processed_count = 0
+        for folder_name, task, skip_message in plan:
+            if task is None:
+                self.log_message(skip_message)
                 continue
             
             # Обрабатываем месяц
-            month_data = self.process_month_fixed(folder_path, date_str)
+            month_data = next(month_results)
             
             if month_data and len(month_data) > 1:  # Есть хотя бы один показатель кроме даты
                 self.consolidated_data.append(month_data)
@@ -339,33 +392,190 @@ class EveDataConsolidatorFinal:
             else:
                 self.log_message(f"Пропускаю: {folder_name} (нет данных)")
         
+        if self.month_cache is not None:
+            self.log_message(f"\nКэш месяцев: {self.month_cache.hits} из кэша, "
+                             f"{self.month_cache.misses} обработано заново")
+        
         if not self.consolidated_data:
-            self.log_message("Не удалось получить данные ни за один месяц!")
+            self.log_message("Не удалось получить данные ни за один месяц!", 'ERROR')
+            self.logger.flush()
             return None
         
         # Создаём DataFrame
-        df = pd.DataFrame(self.consolidated_data)
-        df["history_date"] = pd.to_datetime(df["history_date"])
-        df = df.sort_values("history_date").reset_index(drop=True)
+        df = self.months_to_frame(self.consolidated_data)
         
         self.log_message(f"\nКонсолидация завершена!")
         self.log_message(f"Успешно обработано месяцев: {processed_count}")
         self.log_message(f"Период: {df['history_date'].min().date()} - {df['history_date'].max().date()}")
+        self.logger.flush()
         
         return df
     
-    def add_war_indicator(self, df, percentile=75):
+    def months_to_frame(self, records):
+        """Записи месяцев -> DataFrame, отсортированный по дате"""
+        df = pd.DataFrame(records)
+        df["history_date"] = pd.to_datetime(df["history_date"])
+        return df.sort_values("history_date").reset_index(drop=True)
+    
+    def process_months(self, tasks, workers=1):
+        """Обрабатывает месяцы по порядку задач и отдаёт результаты по одному.
+        
+        Месяцы, найденные в кэше, не перечитываются. Остальные при workers > 1
+        считаются в пуле процессов; лог каждого месяца собирается в дочернем
+        процессе и записывается здесь в исходном порядке.
+        """
+        if self.production_history == 'shared':
+            # Общую историю задаёт самый свежий файл среди всех месяцев, а не только
+            # непосчитанных: от неё зависят и результаты месяцев из кэша
+            with self.profiler.stage('shared_production'):
+                self.prepare_shared_production(tasks)
+        
+        cached = {}
+        fingerprints = {}
+        settings = {}
+        if self.month_cache is not None:
+            with self.profiler.stage('cache_lookup'):
+                for i, (folder_path, date_str) in enumerate(tasks):
+                    # Шард месяца - такой же источник результата, как файлы папки
+                    shard = self.kill_shard(pd.to_datetime(date_str))
+                    extra_files = {f"{shard.parent.name}/{shard.name}": shard} if shard is not None else None
+                    settings[i] = self.month_settings(date_str)
+                    month_data, fingerprints[i] = self.month_cache.lookup(folder_path, date_str, extra_files,
+                                                                          settings[i])
+                    if month_data is not None:
+                        cached[i] = month_data
+        
+        pending = [task for i, task in enumerate(tasks) if i not in cached]
+        computed = self.compute_months(pending, workers)
+        
+        for i, (folder_path, date_str) in enumerate(tasks):
+            if i in cached:
+                self.log_cached_month(folder_path, date_str, cached[i])
+                yield cached[i]
+                continue
+            
+            month_data = next(computed)
+            if self.month_cache is not None:
+                with self.profiler.stage('cache_store'):
+                    self.month_cache.store(folder_path, date_str, fingerprints[i], month_data, settings[i])
+            # Граница месяца: сбрасываем журнал в файл
+            self.logger.context = {}
+            with self.profiler.stage('log_flush'):
+                self.logger.flush()
+            yield month_data
+    
+    def month_settings(self, date_str):
+        """Настройки, от которых зависит результат месяца (часть ключа кэша месяцев)
+        
+        В общем режиме сюда входит ключ файла истории, обслуживающего месяц,
+        поэтому prepare_shared_production должен быть вызван до поиска в кэше.
+        """
+        target_date = pd.to_datetime(date_str)
+        settings = {
+            'production_history': self.production_history,
+            'kill_source': 'partitions' if self.kill_shard(target_date) is not None else 'folder',
+        }
+        if self.production_history == 'shared':
+            history = self.production_index.shared_history(period_code(target_date.year, target_date.month))
+            settings['shared_history'] = history.source_key if history is not None else None
+        return settings
+    
+    def prepare_shared_production(self, tasks):
+        """Однократный разбор общих файлов истории до обработки месяцев
+        
+        Делается в основном процессе, чтобы дочерние процессы получили
+        готовые месячные суммы и не разбирали историю повторно.
+        """
+        history_files = []
+        for folder_path, date_str in tasks:
+            try:
+                plan = self.schema_registry.resolve('production', folder_path)
+            except Exception as e:
+                # Свой файл не читается, но месяц может покрыть более свежая история
+                self.log_message(f"  Пропуск истории производства {folder_path.name}: {e}", 'WARNING')
+                plan = None
+            target_date = pd.to_datetime(date_str)
+            label = f"{folder_path.name}/{plan.file_path.name}" if plan is not None else folder_path.name
+            history_files.append((period_code(target_date.year, target_date.month), plan, label))
+        self.production_index.assign_shared(history_files)
+    
+    def compute_months(self, tasks, workers=1):
+        """Обработка месяцев последовательно или в пуле процессов
+        
+        При последовательной обработке файлы следующих месяцев читаются
+        в фоне (MonthPrefetcher), пока разбирается текущий; в пуле процессов
+        чтение и разбор и так идут параллельно в разных процессах.
+        """
+        if workers <= 1 or len(tasks) <= 1:
+            if self.prefetch_months <= 0 or len(tasks) <= 1:
+                for folder_path, date_str in tasks:
+                    yield self.process_month_fixed(folder_path, date_str)
+                return
+            
+            prefetcher = MonthPrefetcher(self.prefetch_kinds, depth=self.prefetch_months,
+                                         budget=self.prefetch_budget, schema_registry=self.schema_registry,
+                                         profiler=self.profiler)
+            months = prefetcher.iterate(tasks)
+            try:
+                for i, (folder_path, date_str) in enumerate(months, 1):
+                    month_data = self.process_month_fixed(folder_path, date_str)
+                    # После последнего месяца генератор больше не возобновляется
+                    if i == len(tasks):
+                        self.log_message(prefetcher.summary())
+                    yield month_data
+            finally:
+                months.close()
+            return
+        
+        folder_paths = [folder_path for folder_path, _ in tasks]
+        date_strs = [date_str for _, date_str in tasks]
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = executor.map(_process_month_in_worker, repeat(self), folder_paths, date_strs)
+            for month_data, log_records, profile in results:
+                self.logger.replay(log_records)
+                self.profiler.merge(profile)
+                yield month_data
+    
+    def prefetch_kinds(self, folder_path, date_str):
+        """Файлы папки, которые process_month_fixed действительно прочитает"""
+        kinds = ['trade', 'money']
+        if self.production_history != 'shared':
+            kinds.insert(0, 'production')
+        if self.kill_shard(pd.to_datetime(date_str)) is None:
+            kinds.append('kill')
+        return kinds
+    
+    def log_cached_month(self, folder_path, date_str, month_data):
+        """Запись в лог месяца, взятого из кэша"""
+        self.log_message(f"\n{'='*50}")
+        self.log_message(f"ИЗ КЭША: {folder_path.name} ({date_str})")
+        self.log_message(f"{'='*50}")
+        self.log_message(f"    Извлечено показателей: {len(month_data) - 1}")
+    
+    def add_war_indicator(self, df, percentile=75, method=None):
         """Добавление индикатора военных периодов"""
         if "total_isk_destroyed" not in df.columns:
-            self.log_message("Невозможно добавить индикатор войн: нет данных о потерях")
+            self.log_message("Невозможно добавить индикатор войн: нет данных о потерях", 'WARNING')
             return df
         
-        threshold = df["total_isk_destroyed"].quantile(percentile / 100)
-        df["is_war_period"] = (df["total_isk_destroyed"] >= threshold).astype(int)
+        method = method or self.war_method
+        if method == 'global':
+            threshold = df["total_isk_destroyed"].quantile(percentile / 100)
+            df["is_war_period"] = (df["total_isk_destroyed"] >= threshold).astype(int)
+        else:
+            options = dict(self.war_options)
+            if method == 'rolling':
+                options.setdefault('percentile', percentile)
+            df = df.sort_values('history_date')
+            labels = classify_series(df["total_isk_destroyed"], method, **options)
+            df["is_war_period"] = labels["is_war_period"]
+            threshold = labels["war_threshold"].iloc[-1]
         
         war_months = df["is_war_period"].sum()
         
         self.log_message(f"\nСтатистика военных периодов:")
+        if method != 'global':
+            self.log_message(f"  Метод: {method} (причинный порог по предыдущим месяцам)")
         self.log_message(f"  Порог: {threshold:,.2f} ISK")
         self.log_message(f"  Военных месяцев: {war_months} ({war_months/len(df)*100:.1f}%)")
         self.log_message(f"  Мирных месяцев: {len(df)-war_months} ({(len(df)-war_months)/len(df)*100:.1f}%)")
@@ -375,24 +585,29 @@ class EveDataConsolidatorFinal:
     def save_results_fixed(self, df):
         """Сохранение результатов"""
         if df is None or len(df) == 0:
-            self.log_message("Невозможно сохранить: датасет пуст")
+            self.log_message("Невозможно сохранить: датасет пуст", 'ERROR')
             return
         
-        # Сохраняем основной датасет
+        # Сохраняем основной датасет (через временный файл: читатели не видят
+        # недописанный CSV, если консолидация идёт во время их работы)
         main_path = self.output_dir / "eve_consolidated_data_final.csv"
-        df.to_csv(main_path, index=False)
+        tmp_path = main_path.with_suffix('.csv.tmp')
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, main_path)
         self.log_message(f"\nОсновной датасет сохранён: {main_path}")
         
         # Сохраняем подробную статистику
         self.save_detailed_statistics(df)
+        self.logger.flush()
         
         return main_path
     
     def save_detailed_statistics(self, df):
         """Сохранение подробной статистики"""
         stats_path = self.output_dir / "dataset_statistics_final.txt"
+        tmp_path = stats_path.with_suffix('.txt.tmp')
         
-        with open(stats_path, 'w', encoding='utf-8') as f:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             f.write("СТАТИСТИКА ФИНАЛЬНОГО ДАТАСЕТА\n")
             f.write("=" * 50 + "\n\n")
             
@@ -440,26 +655,38 @@ class EveDataConsolidatorFinal:
                 
                 f.write("\n")
         
+        os.replace(tmp_path, stats_path)
         self.log_message(f"Статистика сохранена: {stats_path}")
     
-    def run_full_consolidation(self):
-        """Запуск полной консолидации"""
+    def run_full_consolidation(self, profile=False):
+        """Запуск полной консолидации
+        
+        profile : записывать профиль этапов (время по этапам и месяцам, прочитанные
+            байты и строки по типам файлов, пиковая память) в consolidation_profile.*
+        """
         print("=" * 70)
         print("ФИНАЛЬНАЯ КОНСОЛИДАЦИЯ ДАННЫХ EVE ONLINE")
         print("=" * 70)
         
+        self.profiler.enabled = profile
+        self.profiler.reset()
+        
         # Консолидируем данные
-        df = self.consolidate_all_months_fixed()
+        with self.profiler.stage('consolidate'):
+            df = self.consolidate_all_months_fixed()
         
         if df is not None and len(df) > 0:
             # Анализируем качество
-            self.analyze_data_quality(df)
+            with self.profiler.stage('quality'):
+                self.analyze_data_quality(df)
             
             # Добавляем индикатор войн
-            df = self.add_war_indicator(df, percentile=75)
+            with self.profiler.stage('war_indicator'):
+                df = self.add_war_indicator(df, percentile=75)
             
             # Сохраняем результаты
-            output_path = self.save_results_fixed(df)
+            with self.profiler.stage('save'):
+                output_path = self.save_results_fixed(df)
             
             print("\n" + "=" * 70)
             print("РЕЗУЛЬТАТЫ КОНСОЛИДАЦИИ:")
@@ -487,11 +714,34 @@ class EveDataConsolidatorFinal:
             print(f"📝 Лог консолидации: {self.log_file}")
             print(f"📊 Статистика: {self.output_dir / 'dataset_statistics_final.txt'}")
             
+            if profile:
+                self.report_profile()
+            
             return df
         else:
             print("❌ Не удалось получить данные. Проверьте лог-файл.")
             return None
     
+    def report_profile(self, top=10):
+        """Вывод самых долгих этапов и сохранение профиля (JSON, Chrome trace, свёрнутые стеки)"""
+        summary = self.profiler.summary()
+        print(f"\n⏱️ ПРОФИЛЬ ({summary['wall_seconds']:.2f} с):")
+        stages = sorted(summary['stages'].items(), key=lambda item: item[1]['seconds'], reverse=True)
+        for path, stage in stages[:top]:
+            print(f"  {path:45} {stage['seconds']:9.3f} с  x{stage['count']}")
+        for file_type, size in sorted(summary['bytes_read'].items()):
+            rows = summary['rows'].get(file_type)
+            rows_text = f", строк: {rows:,}" if rows is not None else ""
+            print(f"  прочитано {file_type:10} {size / 2**20:10.1f} МБ{rows_text}")
+        if summary['peak_rss_mb'] is not None:
+            print(f"  пиковая память: {summary['peak_rss_mb']:.1f} МБ")
+        
+        paths = self.profiler.export(self.output_dir)
+        self.log_message(f"\nПрофиль этапов сохранён: {', '.join(p.name for p in paths)}")
+        self.logger.flush()
+        print(f"📈 Профиль: {paths[0]}")
+        return paths
+    
     def analyze_data_quality(self, df):
         """Анализ качества данных"""
         self.log_message("\n" + "="*60)
@@ -515,10 +765,16 @@ class EveDataConsolidatorFinal:
             else:
                 self.log_message(f"  {col}: ОТСУТСТВУЕТ В ДАТАСЕТЕ")
 
+def _process_month_in_worker(consolidator, folder_path, date_str):
+    """Обработка одного месяца в дочернем процессе с перехватом лога"""
+    consolidator.logger.start_capture()
+    month_data = consolidator.process_month_fixed(folder_path, date_str)
+    return month_data, consolidator.logger.stop_capture(), consolidator.profiler.collect()
+
 def main():
-    """Основная функция"""
+    """Основная функция (флаг --profile включает профиль этапов)"""
     consolidator = EveDataConsolidatorFinal()
-    consolidator.run_full_consolidation()
+    consolidator.run_full_consolidation(profile='--profile' in sys.argv)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
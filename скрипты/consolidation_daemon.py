@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import threading
+import traceback
+from datetime import datetime
+from consolidate_eve_data import EveDataConsolidatorFinal
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # без watchdog директория только опрашивается
+    Observer = None
+    FileSystemEventHandler = object
+
+# Период опроса директории, с
+POLL_INTERVAL = 5.0
+# Папка считается дописанной, если её файлы не менялись столько секунд
+SETTLE_SECONDS = 2.0
+
+
+def folder_signature(folder_path):
+    """
+    Дешёвая подпись папки месяца: имя, размер и время изменения каждого CSV
+
+    Содержимое не читается; изменилась ли папка на самом деле, решает
+    кэш месяцев по хэшам файлов.
+    """
+    signature = []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith('.csv'):
+                stat = entry.stat()
+                signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(signature))
+
+
+class _WakeHandler(FileSystemEventHandler):
+    """Событие файловой системы будит цикл опроса раньше срока"""
+
+    def __init__(self, wake):
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+
+class ConsolidationDaemon:
+    """
+    Служба консолидации: следит за archives_dir и обрабатывает только изменения
+
+    Результаты всех месяцев хранятся в памяти. На каждом цикле папки
+    сравниваются с прошлым состоянием по подписи (размеры и времена
+    изменения CSV); новые и изменённые месяцы обрабатываются через
+    process_months (с кэшем месяцев), пропавшие - удаляются. После
+    изменений датасет и статистика перезаписываются атомарно.
+
+    Если установлен watchdog, события файловой системы (inotify и т.п.)
+    запускают цикл сразу; иначе директория опрашивается раз в interval секунд.
+    """
+
+    def __init__(self, consolidator, interval=POLL_INTERVAL, settle_seconds=SETTLE_SECONDS, use_watchdog=True):
+        """
+        Parameters:
+        -----------
+        consolidator : EveDataConsolidatorFinal
+            Настроенный консолидатор (директории, кэш, число процессов, метод войн)
+        interval : float
+            Период опроса, с
+        settle_seconds : float
+            Сколько секунд файлы папки не должны меняться, чтобы её обработать
+            (папки, которые ещё копируются, откладываются до следующего цикла)
+        use_watchdog : bool
+            Подписаться на события файловой системы, если watchdog доступен
+        """
+        if consolidator.archive is not None:
+            raise ValueError("Служба следит только за распакованными папками (archives_dir), не за архивом")
+
+        self.consolidator = consolidator
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.use_watchdog = use_watchdog and Observer is not None
+        self.months = {}
+        self.signatures = {}
+        self.tasks = {}
+        self.cycles = 0
+        self.last_update = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def scan(self):
+        """
+        Сравнение папок с состоянием в памяти
+
+        Returns:
+        --------
+        tuple
+            (изменённые: dict имя -> (путь, дата, подпись), пропавшие: list имён)
+        """
+        folders = self.consolidator.list_mer_folders()
+        now_ns = time.time_ns()
+        changed = {}
+        for folder_name in sorted(folders):
+            folder_path = folders[folder_name]
+            date_str = self.consolidator.parse_date_from_folder(folder_name)
+            if not date_str or not folder_path.is_dir():
+                continue
+            try:
+                signature = folder_signature(folder_path)
+            except OSError:
+                continue  # папку удалили или переименовали во время обхода
+            if signature == self.signatures.get(folder_name):
+                continue
+            newest = max((mtime for _, _, mtime in signature), default=0)
+            if (now_ns - newest) / 1e9 < self.settle_seconds:
+                # Файлы ещё пишутся: вернёмся к папке на следующем цикле
+                self._wake.set()
+                continue
+            changed[folder_name] = (folder_path, date_str, signature)
+
+        removed = [name for name in self.signatures if name not in folders]
+        return changed, removed
+
+    def apply(self, changed, removed):
+        """
+        Обработка изменённых месяцев и удаление пропавших
+
+        В общем режиме истории производства новая папка может изменить
+        результаты всех месяцев, поэтому пересчитываются все папки
+        (неизменные месяцы берутся из кэша, если их история не сменилась).
+        Если обработка упала, изменённые папки сохраняют прежние подписи
+        и будут обработаны снова на следующем цикле.
+        """
+        previous = {name: (self.signatures.get(name), self.tasks.get(name)) for name in changed}
+        for folder_name, (folder_path, date_str, signature) in changed.items():
+            self.signatures[folder_name] = signature
+            self.tasks[folder_name] = (folder_path, date_str)
+        for folder_name in removed:
+            self.signatures.pop(folder_name, None)
+            self.tasks.pop(folder_name, None)
+            self.months.pop(folder_name, None)
+            self.consolidator.log_message(f"Папка удалена: {folder_name}")
+
+        names = sorted(self.tasks) if self.consolidator.production_history == 'shared' else list(changed)
+        try:
+            results = self.consolidator.process_months([self.tasks[name] for name in names],
+                                                       self.consolidator.workers)
+            for folder_name, month_data in zip(names, results):
+                if month_data and len(month_data) > 1:
+                    self.months[folder_name] = month_data
+                else:
+                    self.months.pop(folder_name, None)
+                    self.consolidator.log_message(f"Пропускаю: {folder_name} (нет данных)")
+        except Exception:
+            for folder_name, (signature, task) in previous.items():
+                if signature is None:
+                    self.signatures.pop(folder_name, None)
+                    self.tasks.pop(folder_name, None)
+                else:
+                    self.signatures[folder_name], self.tasks[folder_name] = signature, task
+            raise
+
+    def publish(self):
+        """Атомарная перезапись датасета, статистики и файла состояния службы"""
+        if not self.months:
+            self.consolidator.log_message("Нет данных ни за один месяц: результаты не обновлены", 'WARNING')
+            self.consolidator.logger.flush()
+            return None
+
+        consolidator = self.consolidator
+        df = consolidator.months_to_frame(list(self.months.values()))
+        df = consolidator.add_war_indicator(df, percentile=75)
+        output_path = consolidator.save_results_fixed(df)
+        self.last_update = datetime.now().isoformat(timespec='seconds')
+        self.write_status(df)
+        return output_path
+
+    def write_status(self, df):
+        """daemon_status.json: время последнего обновления и охват данных (для дашбордов)"""
+        status = {
+            'updated': self.last_update,
+            'cycles': self.cycles,
+            'months': len(df),
+            'period': [str(df['history_date'].min().date()), str(df['history_date'].max().date())],
+            'folders': sorted(self.months),
+        }
+        path = self.consolidator.output_dir / "daemon_status.json"
+        tmp_path = path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def run_once(self):
+        """
+        Один цикл: поиск изменений, обработка и публикация
+
+        Returns:
+        --------
+        bool
+            True, если результаты были перезаписаны
+        """
+        self.cycles += 1
+        start = time.perf_counter()
+        changed, removed = self.scan()
+        if not changed and not removed:
+            return False
+
+        self.apply(changed, removed)
+        output_path = self.publish()
+        elapsed = time.perf_counter() - start
+        print(f"[{datetime.now():%H:%M:%S}] Обновлено месяцев: {len(changed)}, удалено: {len(removed)}, "
+              f"всего: {len(self.months)} ({elapsed:.2f} с)")
+        return output_path is not None
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self, max_cycles=None):
+        """
+        Основной цикл службы (до stop(), Ctrl+C или max_cycles циклов)
+        """
+        observer = None
+        if self.use_watchdog:
+            observer = Observer()
+            observer.schedule(_WakeHandler(self._wake), str(self.consolidator.archives_dir), recursive=True)
+            observer.start()
+
+        mode = "события файловой системы + опрос" if observer else "опрос"
+        print(f"Слежу за {self.consolidator.archives_dir} ({mode}, каждые {self.interval:g} с)")
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    self.run_once()
+                except Exception as e:
+                    # Сбой одного цикла (например, недокопированная папка) не останавливает службу
+                    self.consolidator.log_message(f"ОШИБКА цикла {self.cycles}: {e}", 'ERROR')
+                    self.consolidator.log_message(f"Трассировка: {traceback.format_exc()}", 'ERROR')
+                    self.consolidator.logger.flush()
+                if max_cycles is not None and self.cycles >= max_cycles:
+                    break
+                self._wake.wait(self.interval)
+                if self._wake.is_set() and not self._stop.is_set():
+                    # Пачка событий (копирование папки) - даём ей завершиться
+                    time.sleep(min(self.settle_seconds, self.interval))
+        except KeyboardInterrupt:
+            print("\nОстановка службы")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self.consolidator.logger.flush()
+
+
+def main():
+    """Служба консолидации: python consolidation_daemon.py [период_опроса_с]"""
+    interval = float(sys.argv[1]) if len(sys.argv) > 1 else POLL_INTERVAL
+
+    print("=" * 70)
+    print("СЛУЖБА КОНСОЛИДАЦИИ ДАННЫХ EVE ONLINE")
+    print("=" * 70)
+    consolidator = EveDataConsolidatorFinal(log_level='WARNING')
+    ConsolidationDaemon(consolidator, interval=interval).run()
+
+
+if __name__ == "__main__":
+    main()
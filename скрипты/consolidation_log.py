@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+
+class ConsolidationLogger:
+    """
+    Буферизованный журнал консолидации с уровнями сообщений
+
+    Сообщения копятся в памяти и дописываются в файл одним открытием
+    при вызове flush() (консолидатор делает это на границе месяцев)
+    или при переполнении буфера. Поддерживается обычный текст
+    и JSON Lines (одна JSON-запись на строку).
+    """
+
+    def __init__(self, log_file, level='INFO', fmt='text', echo=True, buffer_limit=1000, header=None):
+        """
+        Parameters:
+        -----------
+        log_file : Path
+            Файл журнала (перезаписывается при создании)
+        level : str
+            Минимальный уровень: DEBUG, INFO, WARNING или ERROR
+        fmt : str
+            'text' или 'jsonl'
+        echo : bool
+            Дублировать сообщения в консоль
+        buffer_limit : int
+            Число записей, после которого буфер сбрасывается принудительно
+        header : list of str, optional
+            Заголовок текстового журнала
+        """
+        if level not in LEVELS:
+            raise ValueError(f"Неизвестный уровень журнала: {level}")
+        if fmt not in ('text', 'jsonl'):
+            raise ValueError(f"Неизвестный формат журнала: {fmt}")
+
+        self.log_file = log_file
+        self.level = level
+        self.fmt = fmt
+        self.echo = echo
+        self.buffer_limit = buffer_limit
+        self.context = {}
+        self._buffer = []
+        self._capture = None
+
+        with open(self.log_file, 'w', encoding='utf-8') as f:
+            if header and fmt == 'text':
+                f.write('\n'.join(header) + '\n')
+
+    def __getstate__(self):
+        # В дочерний процесс журнал передаётся без накопленного буфера
+        state = self.__dict__.copy()
+        state['_buffer'] = []
+        state['_capture'] = None
+        return state
+
+    def enabled(self, level):
+        return LEVELS[level] >= LEVELS[self.level]
+
+    def log(self, message, level='INFO', **fields):
+        if not self.enabled(level):
+            return
+
+        if self._capture is not None:
+            self._capture.append((message, level, {**self.context, **fields}))
+            return
+
+        if self.echo:
+            print(message)
+
+        if self.fmt == 'jsonl':
+            record = {'time': datetime.now().isoformat(timespec='milliseconds'), 'level': level}
+            record.update(self.context)
+            record.update(fields)
+            record['message'] = message.strip('\n')
+            self._buffer.append(json.dumps(record, ensure_ascii=False))
+        else:
+            self._buffer.append(message)
+
+        if len(self._buffer) >= self.buffer_limit:
+            self.flush()
+
+    def flush(self):
+        """Запись накопленных сообщений в файл за одно открытие"""
+        if not self._buffer:
+            return
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(self._buffer) + '\n')
+        self._buffer = []
+
+    def start_capture(self):
+        """Перехват записей вместо вывода (для дочерних процессов)"""
+        self._capture = []
+
+    def stop_capture(self):
+        """Окончание перехвата; возвращает записи (message, level, fields)"""
+        records, self._capture = self._capture, None
+        return records
+
+    def replay(self, records):
+        """Вывод записей, перехваченных в другом процессе"""
+        for message, level, fields in records:
+            self.log(message, level, **fields)
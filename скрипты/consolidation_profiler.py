@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import contextlib
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: пиковая память берётся из psutil, если он установлен
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def peak_rss_mb(children=False):
+    """Пиковый RSS процесса (или завершённых дочерних процессов) в МБ"""
+    if resource is not None:
+        who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+        peak = resource.getrusage(who).ru_maxrss
+        # ru_maxrss - в байтах на macOS и в килобайтах на Linux
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None and not children:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 2**20
+    return None
+
+
+def file_size(file_path):
+    """Размер файла на диске или в архиве (ArchiveMember)"""
+    if hasattr(file_path, 'fingerprint'):
+        return file_path.fingerprint()['size']
+    return os.path.getsize(file_path)
+
+
+class StageProfiler:
+    """
+    Профиль консолидации по этапам
+
+    Этапы вкладываются друг в друга (stage внутри stage); для каждого
+    записывается время начала и длительность. Дополнительно считаются
+    прочитанные байты и строки по типам файлов и пиковая память.
+    Выключенный профайлер (enabled=False) ничего не записывает.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.origin = time.perf_counter_ns()
+        self.events = []
+        self.bytes_read = {}
+        self.rows = {}
+        self.files = {}
+        self.peak_rss_mb = None
+        self._stack = []
+
+    def __getstate__(self):
+        # В дочерний процесс профайлер уходит пустым; origin сохраняется,
+        # чтобы время событий всех процессов было на одной шкале
+        state = self.__dict__.copy()
+        state.update(events=[], bytes_read={}, rows={}, files={}, peak_rss_mb=None, _stack=[])
+        return state
+
+    @contextlib.contextmanager
+    def stage(self, name, **args):
+        """Замер этапа; args попадают в трассу (например, month='2020-01')"""
+        if not self.enabled:
+            yield
+            return
+
+        self._stack.append(name)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.events.append({
+                'name': name,
+                'path': list(self._stack),
+                'start_us': (start - self.origin) / 1000,
+                'dur_us': (end - start) / 1000,
+                'pid': os.getpid(),
+                'args': args,
+            })
+            self._stack.pop()
+            peak = peak_rss_mb()
+            if peak is not None:
+                self.peak_rss_mb = max(self.peak_rss_mb or 0, peak)
+
+    def count_file(self, file_type, file_path, rows=None):
+        """Учёт прочитанного файла: байты, число файлов и (если известно) строки"""
+        if not self.enabled:
+            return
+        self.bytes_read[file_type] = self.bytes_read.get(file_type, 0) + file_size(file_path)
+        self.files[file_type] = self.files.get(file_type, 0) + 1
+        if rows is not None:
+            self.rows[file_type] = self.rows.get(file_type, 0) + rows
+
+    def collect(self):
+        """Данные профиля для передачи из дочернего процесса"""
+        return {'events': self.events, 'bytes_read': self.bytes_read, 'rows': self.rows,
+                'files': self.files, 'peak_rss_mb': self.peak_rss_mb}
+
+    def merge(self, collected):
+        """Добавление профиля дочернего процесса; его этапы вкладываются в текущий этап"""
+        if not self.enabled or not collected:
+            return
+        for event in collected['events']:
+            self.events.append({**event, 'path': self._stack + event['path']})
+        for field in ('bytes_read', 'rows', 'files'):
+            counters = getattr(self, field)
+            for key, value in collected[field].items():
+                counters[key] = counters.get(key, 0) + value
+        if collected['peak_rss_mb'] is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, collected['peak_rss_mb'])
+
+    def stage_totals(self):
+        """Суммарное время и число вызовов по пути этапа ('consolidate/month/kill')"""
+        totals = {}
+        for event in self.events:
+            key = '/'.join(event['path'])
+            total = totals.setdefault(key, {'count': 0, 'seconds': 0.0})
+            total['count'] += 1
+            total['seconds'] += event['dur_us'] / 1e6
+        return totals
+
+    def summary(self):
+        months = {}
+        for event in self.events:
+            if event['name'] == 'month':
+                months[event['args'].get('month', '?')] = round(event['dur_us'] / 1e6, 4)
+        top_level = [event for event in self.events if len(event['path']) == 1]
+        return {
+            'wall_seconds': round(sum(event['dur_us'] for event in top_level) / 1e6, 4),
+            'stages': {key: {'count': value['count'], 'seconds': round(value['seconds'], 4)}
+                       for key, value in sorted(self.stage_totals().items())},
+            'months': months,
+            'bytes_read': self.bytes_read,
+            'files': self.files,
+            'rows': self.rows,
+            'peak_rss_mb': self.peak_rss_mb,
+            'peak_rss_children_mb': peak_rss_mb(children=True),
+        }
+
+    def to_json(self, path):
+        """Сводка и все события в JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'events': self.events}, f, ensure_ascii=False, indent=2)
+        return Path(path)
+
+    def to_chrome_trace(self, path):
+        """Трасса в формате Chrome Trace Event (chrome://tracing, Perfetto, speedscope)"""
+        trace = [{'name': event['name'], 'cat': 'consolidation', 'ph': 'X',
+                  'ts': event['start_us'], 'dur': event['dur_us'],
+                  'pid': event['pid'], 'tid': event['pid'], 'args': event['args']}
+                 for event in self.events]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        return Path(path)
+
+    def to_collapsed(self, path):
+        """
+        Свёрнутые стеки для flamegraph.pl / speedscope: 'a;b;c <мкс>'
+
+        Вес стека - собственное время этапа (без вложенных этапов).
+        """
+        totals = {}
+        for event in self.events:
+            key = tuple(event['path'])
+            totals[key] = totals.get(key, 0.0) + event['dur_us']
+        lines = []
+        for key, total in sorted(totals.items()):
+            children = sum(value for child, value in totals.items()
+                           if len(child) == len(key) + 1 and child[:len(key)] == key)
+            self_time = max(total - children, 0)
+            if self_time >= 1:
+                lines.append(f"{';'.join(key)} {int(self_time)}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return Path(path)
+
+    def export(self, output_dir, stem='consolidation_profile'):
+        """Все форматы сразу; возвращает пути файлов"""
+        output_dir = Path(output_dir)
+        return [self.to_json(output_dir / f"{stem}.json"),
+                self.to_chrome_trace(output_dir / f"{stem}.trace.json"),
+                self.to_collapsed(output_dir / f"{stem}.folded")]
+
+
+# Выключенный профайлер для кода, которому профайлер не передан
+DISABLED = StageProfiler(enabled=False)
@@ -0,0 +1,233 @@
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+STRONG_CORRELATION = 0.7
+
+
+def grouped_spearman(df, group_keys, columns, group_name='group'):
+    """
+    Корреляции Спирмена между парами столбцов внутри каждой группы
+
+    Для каждой пары берутся строки, где известны оба значения (как в
+    DataFrame.corr), ранги считаются внутри групп одной группировкой,
+    а коэффициент - как корреляция Пирсона рангов.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Данные
+    group_keys : pd.Series или np.ndarray
+        Ключ группы для каждой строки df (регион, номер окна и т.д.)
+    columns : list of str
+        Показатели
+    group_name : str
+        Имя уровня индекса с ключом группы
+
+    Returns:
+    --------
+    pd.DataFrame
+        Индекс (группа, metric_a, metric_b); столбцы spearman и months
+    """
+    group_keys = pd.Series(np.asarray(group_keys), index=df.index)
+    frames = []
+    for col_a, col_b in combinations(columns, 2):
+        complete = df[col_a].notna() & df[col_b].notna()
+        pair_groups = group_keys[complete]
+        ranks = df.loc[complete, [col_a, col_b]].groupby(pair_groups, observed=True).rank()
+        centered = ranks - ranks.groupby(pair_groups, observed=True).transform('mean')
+        sums = pd.DataFrame({
+            'cov': centered[col_a] * centered[col_b],
+            'var_a': centered[col_a] ** 2,
+            'var_b': centered[col_b] ** 2,
+            'months': 1,
+        }).groupby(pair_groups, observed=True).sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rho = sums['cov'] / np.sqrt(sums['var_a'] * sums['var_b'])
+        frames.append(pd.DataFrame({
+            'metric_a': col_a,
+            'metric_b': col_b,
+            'spearman': rho.replace([np.inf, -np.inf], np.nan),
+            'months': sums['months'],
+        }))
+
+    if not frames:
+        return None
+    return pd.concat(frames).rename_axis(group_name).set_index(['metric_a', 'metric_b'], append=True)
+
+
+def pairs_to_matrices(pairs, columns):
+    """Длинная таблица пар (результат grouped_spearman) -> {группа: матрица k x k}"""
+    matrices = {}
+    for group, block in pairs['spearman'].groupby(level=0, sort=False):
+        matrix = pd.DataFrame(np.eye(len(columns)), index=columns, columns=columns)
+        for (_, col_a, col_b), value in block.items():
+            matrix.loc[col_a, col_b] = matrix.loc[col_b, col_a] = value
+        matrices[group] = matrix
+    return matrices
+
+
+def strong_pairs(corr_matrix, threshold=STRONG_CORRELATION):
+    """
+    Пары с |r| > threshold из верхнего треугольника матрицы (без циклов)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Столбцы metric_a, metric_b, r в порядке обхода матрицы
+    """
+    values = corr_matrix.to_numpy()
+    rows, cols = np.triu_indices(len(values), k=1)
+    upper = values[rows, cols]
+    strong = np.abs(upper) > threshold
+    columns = np.asarray(corr_matrix.columns)
+    return pd.DataFrame({'metric_a': columns[rows[strong]], 'metric_b': columns[cols[strong]],
+                         'r': upper[strong]})
+
+
+def _average_ranks(values):
+    """Средние ранги (как pandas rank(method='average'))"""
+    return pd.Series(values).rank().to_numpy()
+
+
+class PairRanks:
+    """
+    Ранги пары показателей по строкам, где известны оба значения
+
+    При добавлении наблюдения ранги не пересчитываются сортировкой:
+    значения больше нового сдвигаются на 1, равные ему - на 0.5
+    (средний ранг группы совпадений растёт на половину).
+    """
+
+    def __init__(self, x, y):
+        complete = ~(np.isnan(x) | np.isnan(y))
+        self.x = x[complete].astype(np.float64)
+        self.y = y[complete].astype(np.float64)
+        self.rank_x = _average_ranks(self.x)
+        self.rank_y = _average_ranks(self.y)
+
+    def __len__(self):
+        return len(self.x)
+
+    @staticmethod
+    def _append_rank(values, ranks, value):
+        greater = values > value
+        equal = values == value
+        ranks = ranks + greater + 0.5 * equal
+        new_rank = (values < value).sum() + (equal.sum() + 2) / 2
+        return np.append(values, value), np.append(ranks, new_rank)
+
+    def append(self, x, y):
+        if np.isnan(x) or np.isnan(y):
+            return
+        self.x, self.rank_x = self._append_rank(self.x, self.rank_x, x)
+        self.y, self.rank_y = self._append_rank(self.y, self.rank_y, y)
+
+    def spearman(self):
+        if len(self) < 2:
+            return np.nan
+        dx = self.rank_x - self.rank_x.mean()
+        dy = self.rank_y - self.rank_y.mean()
+        denominator = np.sqrt((dx * dx).sum() * (dy * dy).sum())
+        return (dx * dy).sum() / denominator if denominator > 0 else np.nan
+
+
+class CorrelationService:
+    """
+    Кэшируемые корреляции Спирмена для набора показателей
+
+    Ранги каждой пары и итоговая матрица хранятся для текущей версии
+    данных. Добавление месяца (append) обновляет ранги пар инкрементально
+    и сбрасывает только матрицу; скользящие и региональные матрицы
+    считаются пакетно и кэшируются по (версия, параметры).
+    """
+
+    def __init__(self, df, columns):
+        self.columns = [col for col in columns if col in df.columns]
+        self.df = df.reset_index(drop=True)
+        self.version = int(pd.util.hash_pandas_object(self.df[self.columns], index=False).sum())
+        self._pairs = {}
+        self._cache = {}
+
+    def _pair(self, col_a, col_b):
+        key = (col_a, col_b)
+        if key not in self._pairs:
+            self._pairs[key] = PairRanks(self.df[col_a].to_numpy(dtype=np.float64),
+                                         self.df[col_b].to_numpy(dtype=np.float64))
+        return self._pairs[key]
+
+    def _cached(self, name, params, compute):
+        key = (self.version, name, params)
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def matrix(self):
+        """Матрица Спирмена k x k по всем данным (как DataFrame.corr(method='spearman'))"""
+        def compute():
+            matrix = pd.DataFrame(np.eye(len(self.columns)), index=self.columns, columns=self.columns)
+            for col_a, col_b in combinations(self.columns, 2):
+                matrix.loc[col_a, col_b] = matrix.loc[col_b, col_a] = self._pair(col_a, col_b).spearman()
+            return matrix
+        return self._cached('matrix', None, compute)
+
+    def strong_pairs(self, threshold=STRONG_CORRELATION):
+        return strong_pairs(self.matrix(), threshold)
+
+    def append(self, row):
+        """
+        Добавление наблюдения (месяца)
+
+        Parameters:
+        -----------
+        row : dict или pd.Series
+            Значения показателей (и прочих столбцов) нового месяца
+        """
+        row = dict(row)
+        # Пропуски (None, pd.NA, пустые строки) становятся NaN, как при чтении CSV
+        for col in self.columns:
+            row[col] = float(pd.to_numeric(row.get(col), errors='coerce'))
+        self.df = pd.concat([self.df, pd.DataFrame([row])], ignore_index=True)
+        for (col_a, col_b), pair in self._pairs.items():
+            pair.append(row[col_a], row[col_b])
+        # Новая версия: старые матрицы в кэше больше не используются
+        self.version = hash((self.version, len(self.df)))
+        self._cache = {}
+
+    def rolling(self, window, min_periods=3):
+        """
+        Скользящие матрицы Спирмена по окнам из window наблюдений
+
+        Все окна обрабатываются одной группировкой: строки каждого окна
+        собираются в общую таблицу с номером окна как ключом группы.
+
+        Returns:
+        --------
+        pd.DataFrame
+            Индекс (window_end, metric_a, metric_b); столбцы spearman и months
+            (window_end - номер последней строки окна)
+        """
+        def compute():
+            n = len(self.df)
+            if n < window:
+                return None
+            ends = np.arange(window - 1, n)
+            index = (ends[:, None] - np.arange(window)[::-1]).ravel()
+            frame = self.df.iloc[index][self.columns].reset_index(drop=True)
+            pairs = grouped_spearman(frame, np.repeat(ends, window), self.columns, group_name='window_end')
+            if pairs is not None:
+                pairs.loc[pairs['months'] < min_periods, 'spearman'] = np.nan
+            return pairs
+        return self._cached('rolling', (window, min_periods), compute)
+
+    def by_group(self, group_col):
+        """
+        Матрицы Спирмена для каждой группы (например, региона)
+
+        Returns:
+        --------
+        pd.DataFrame
+            Индекс (группа, metric_a, metric_b); столбцы spearman и months
+        """
+        return self._cached('group', group_col, lambda: grouped_spearman(
+            self.df, self.df[group_col], self.columns, group_name=group_col))
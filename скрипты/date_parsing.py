@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # без pyarrow строки берутся через numpy (медленнее)
+    pa = None
+
+# Форматы дат, встречавшиеся в выгрузках MER (порядок важен: первый подходящий выигрывает)
+MER_DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y/%m/%d',
+    '%d.%m.%Y',
+    '%m/%d/%Y',
+    '%Y-%m',
+]
+# Число значений, по которым определяется формат
+SAMPLE_SIZE = 200
+# Доля значений выборки, которые должны разобраться форматом (допускает единичный мусор)
+MIN_MATCH_SHARE = 0.9
+# Форматы с таким началом разбираются в коды месяцев прямо по байтам строки
+ISO_PREFIX = '%Y-%m-%d'
+INVALID_PERIOD = -1
+# Число дней в месяцах невисокосного года
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def period_code(year, month):
+    """Целочисленный код месяца (год * 12 + номер месяца - 1)"""
+    return year * 12 + month - 1
+
+
+def period_label(code):
+    """Код месяца в виде строки 'YYYY-MM'"""
+    return f"{code // 12}-{code % 12 + 1:02d}"
+
+
+def detect_date_format(values, sample_size=SAMPLE_SIZE):
+    """
+    Определение формата дат по первым непустым значениям
+
+    Returns:
+    --------
+    str или None
+        Формат из MER_DATE_FORMATS, которым разбирается наибольшая доля
+        выборки (не меньше MIN_MATCH_SHARE); None, если ни один не подошёл
+        или выборка пуста
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return None
+    sample = values.dropna().head(sample_size).astype(str)
+    if sample.empty:
+        return None
+    best_fmt, best_share = None, MIN_MATCH_SHARE
+    for fmt in MER_DATE_FORMATS:
+        share = pd.to_datetime(sample, format=fmt, errors='coerce').notna().mean()
+        if share == 1:
+            return fmt
+        if share >= best_share:
+            best_fmt, best_share = fmt, share
+    return best_fmt
+
+
+def parse_dates(values, fmt=None):
+    """
+    Разбор дат с явным форматом (без угадывания для каждого значения)
+
+    Если fmt не задан и не определился, используется обычный разбор pandas.
+    Нераспознанные значения становятся NaT.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if fmt is None:
+        return pd.to_datetime(values, errors='coerce')
+    return pd.to_datetime(values, format=fmt, errors='coerce')
+
+
+def _arrow_prefixes(values, width):
+    """
+    Первые width байт каждой строки Arrow-столбца прямо из буферов Arrow
+
+    Строки не превращаются в объекты Python: берутся смещения строк
+    и байты из общего буфера данных. Короткие строки и пропуски дают нули.
+    """
+    blocks = []
+    for chunk in values.array.__arrow_array__().chunks:
+        offsets_type = np.int64 if pa.types.is_large_string(chunk.type) else np.int32
+        _, offsets_buffer, data_buffer = chunk.buffers()
+        offsets = np.frombuffer(offsets_buffer, dtype=offsets_type)[chunk.offset:chunk.offset + len(chunk) + 1]
+        data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.zeros(0, np.uint8)
+        if len(data) < width:
+            data = np.zeros(width, dtype=np.uint8)  # полных строк нет - читаем нули
+        starts = offsets[:-1].astype(np.int64)
+        complete = ((offsets[1:] - starts) >= width) & np.asarray(chunk.is_valid())
+        starts[~complete] = 0
+        block = np.empty((len(chunk), width), dtype=np.uint8)
+        for i in range(width):
+            block[:, i] = data[starts + i]
+        block[~complete] = 0
+        blocks.append(block)
+    if not blocks:
+        return np.zeros((0, width), dtype=np.uint8)
+    return np.concatenate(blocks)
+
+
+def _string_prefixes(values, width):
+    """Первые width байт каждой строки: матрица (n, width) из uint8"""
+    dtype = values.dtype
+    if pa is not None and isinstance(dtype, pd.StringDtype) and dtype.storage == 'pyarrow':
+        return _arrow_prefixes(values, width)
+    strings = values.to_numpy(dtype=object)
+    strings = np.where(pd.isna(strings), '', strings)
+    return np.asarray(strings, dtype=f'S{width}').view(np.uint8).reshape(len(strings), width)
+
+
+def _iso_period_codes(values):
+    """
+    Коды месяцев из строк 'YYYY-MM-DD...' без создания дат
+
+    Берутся первые 10 байт каждой строки; год и месяц собираются из
+    цифр векторно. День проверяется по длине месяца с учётом високосных
+    лет, так что несуществующие даты ('2021-02-30') отбрасываются, как
+    и при разборе pandas.
+    """
+    raw = _string_prefixes(values, 10)
+    digit = lambda i: raw[:, i].astype(np.int64) - ord('0')
+    year = digit(0) * 1000 + digit(1) * 100 + digit(2) * 10 + digit(3)
+    month = digit(5) * 10 + digit(6)
+    day = digit(8) * 10 + digit(9)
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    month_days = DAYS_IN_MONTH[np.clip(month - 1, 0, 11)] + ((month == 2) & leap)
+
+    number_positions = [0, 1, 2, 3, 5, 6, 8, 9]
+    valid = (((raw[:, number_positions] - np.uint8(ord('0'))) <= 9).all(axis=1)
+             & (raw[:, 4] == ord('-')) & (raw[:, 7] == ord('-'))
+             & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days))
+    return np.where(valid, period_code(year, month), INVALID_PERIOD)
+
+
+def period_codes(values, fmt=None):
+    """
+    Коды месяцев (period_code) для столбца дат
+
+    Для ISO-форматов ('%Y-%m-%d' и дата со временем) строки разбираются
+    по байтам, без pd.to_datetime (для строк Arrow - прямо из буферов);
+    для остальных - разбор с явным форматом.
+
+    Returns:
+    --------
+    np.ndarray of int64
+        Код месяца или INVALID_PERIOD для нераспознанных значений
+    """
+    values = pd.Series(values)
+    if fmt is not None and fmt.startswith(ISO_PREFIX) and not pd.api.types.is_datetime64_any_dtype(values):
+        try:
+            return _iso_period_codes(values)
+        except (UnicodeEncodeError, ValueError, TypeError):
+            pass  # не ASCII или не строки - общий путь ниже
+
+    dates = parse_dates(values, fmt)
+    valid = dates.notna().to_numpy()
+    codes = np.full(len(dates), INVALID_PERIOD, dtype=np.int64)
+    codes[valid] = period_code(dates.dt.year.to_numpy()[valid].astype(np.int64),
+                               dates.dt.month.to_numpy()[valid].astype(np.int64))
+    return codes
+
+
+class DateParser:
+    """
+    Разбор дат одного файла: формат определяется по первой порции значений
+    и используется для всех следующих (например, частей потокового чтения)
+    """
+
+    def __init__(self, fmt=None):
+        self.fmt = fmt
+        self.detected = fmt is not None
+
+    def _detect(self, values):
+        if not self.detected:
+            self.fmt = detect_date_format(values)
+            # Пустая порция ничего не говорит о формате - пробуем на следующей
+            self.detected = self.fmt is not None or pd.Series(values).notna().any()
+
+    def parse(self, values):
+        self._detect(values)
+        return parse_dates(values, self.fmt)
+
+    def period_codes(self, values):
+        self._detect(values)
+        return period_codes(values, self.fmt)
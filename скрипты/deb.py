@@ -1,6 +1,6 @@
 import pandas as pd
-import numpy as np
 from pathlib import Path
+from velocity_formulas import VelocityFormulaEngine, VELOCITY_FORMULAS
 
 def check_money_supply_files():
     """Проверка исходных файлов money_supply.csv за 2022-2025 годы"""
@@ -132,28 +132,22 @@ def recalculate_velocity_uniform():
     print("ПЕРЕСЧЁТ СКОРОСТИ ОБРАЩЕНИЯ ПО ЕДИНОЙ ФОРМУЛЕ")
     print("="*70)
     
-    # Варианты формул
-    formulas = {
-        'formula1': lambda row: row['trade_value'] / row['total_isk'] if row['total_isk'] > 0 else np.nan,
-        'formula2': lambda row: (row['trade_value'] + row['destruction_isk']) / row['total_isk'] if row['total_isk'] > 0 else np.nan,
-        'formula3': lambda row: row['trade_value'] / (row['total_isk'] * 0.85) if row['total_isk'] > 0 else np.nan,  # Коэффициент коррекции
-    }
-    
+    # Варианты формул (см. VELOCITY_FORMULAS) считаются векторно одним проходом
+    engine = VelocityFormulaEngine(VELOCITY_FORMULAS)
+    velocities = engine.evaluate(df)
+    df = df.join(velocities)
+
     # Тестируем формулы
-    for name, formula in formulas.items():
-        df[f'velocity_{name}'] = df.apply(formula, axis=1)
-        valid = df[f'velocity_{name}'].notna().sum()
-        mean_val = df[f'velocity_{name}'].mean()
-        std_val = df[f'velocity_{name}'].std()
-        
+    comparison = engine.comparison_table(df)
+    for name, stats in comparison.iterrows():
         print(f"\n{name}:")
-        print(f"  Доступно месяцев: {valid}")
-        print(f"  Среднее: {mean_val:.4f}")
-        print(f"  Стандартное отклонение: {std_val:.4f}")
-        print(f"  Диапазон: {df[f'velocity_{name}'].min():.4f} - {df[f'velocity_{name}'].max():.4f}")
-    
+        print(f"  Доступно месяцев: {int(stats['count'])}")
+        print(f"  Среднее: {stats['mean']:.4f}")
+        print(f"  Стандартное отклонение: {stats['std']:.4f}")
+        print(f"  Диапазон: {stats['min']:.4f} - {stats['max']:.4f}")
+
     # Выбираем лучшую формулу (формула 2 - официальная)
-    df['isk_velocity_uniform'] = df.apply(formulas['formula2'], axis=1)
+    df['isk_velocity_uniform'] = velocities['velocity_formula2']
     
     print(f"\nСравнение с исходными данными:")
     print(f"  Корреляция: {df['isk_velocity'].corr(df['isk_velocity_uniform']):.3f}")
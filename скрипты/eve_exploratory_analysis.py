@@ -1,8 +1,13 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection
 import seaborn as sns
 from pathlib import Path
+from resampling import ResamplingEngine, DEFAULT_RESAMPLES, significance_label
+from correlation_service import CorrelationService
+from kill_cube import open_kill_cube
 
 # Настройки для визуализации
 plt.style.use('seaborn-v0_8-darkgrid')
@@ -10,6 +15,59 @@ plt.rcParams['figure.figsize'] = (12, 8)
 plt.rcParams['font.size'] = 12
 sns.set_palette("husl")
 
+def merge_war_spans(dates, flags, period=pd.DateOffset(months=1)):
+    """
+    Объединение военных периодов в непрерывные интервалы
+    
+    Каждое наблюдение покрывает [дата, дата + period); соседние военные
+    наблюдения без разрыва между ними сливаются в один интервал.
+    
+    Parameters:
+    -----------
+    dates : pd.Series
+        Даты наблюдений (отсортированные)
+    flags : pd.Series
+        Признак военного периода (1/True - война)
+    period : DateOffset или Timedelta
+        Длительность одного наблюдения (месяц, день и т.д.)
+    
+    Returns:
+    --------
+    pd.DataFrame
+        Столбцы start и end, по строке на интервал
+    """
+    starts = pd.Series(pd.to_datetime(dates[flags.astype(bool)]).to_numpy())
+    if starts.empty:
+        return pd.DataFrame({'start': starts, 'end': starts})
+    ends = starts + period
+    # Новый интервал начинается там, где наблюдение не примыкает к предыдущему
+    span_id = (starts > ends.cummax().shift()).cumsum()
+    spans = pd.DataFrame({'start': starts, 'end': ends}).groupby(span_id.to_numpy())
+    return pd.DataFrame({'start': spans['start'].min(), 'end': spans['end'].max()}).reset_index(drop=True)
+
+
+def draw_war_spans(ax, spans, color='red', alpha=0.3):
+    """
+    Заливка интервалов одной коллекцией на всю высоту оси
+    
+    Вместо отдельного axvspan на каждый интервал рисуется одна
+    PolyCollection в смешанных координатах (x - данные, y - доли оси).
+    """
+    if spans.empty:
+        return None
+    x0 = mdates.date2num(spans['start'].to_numpy())
+    x1 = mdates.date2num(spans['end'].to_numpy())
+    verts = np.stack([np.column_stack([x0, np.zeros_like(x0)]), np.column_stack([x0, np.ones_like(x0)]),
+                      np.column_stack([x1, np.ones_like(x1)]), np.column_stack([x1, np.zeros_like(x1)])], axis=1)
+    collection = PolyCollection(verts, transform=ax.get_xaxis_transform(), facecolors=color,
+                                edgecolors='none', alpha=alpha, zorder=0)
+    ax.add_collection(collection, autolim=False)
+    # Границы оси X расширяются так же, как это делал axvspan
+    ax.update_datalim(np.column_stack([np.concatenate([x0, x1]), np.zeros(2 * len(x0))]), updatey=False)
+    ax.autoscale_view(scaley=False)
+    return collection
+
+
 class EveExploratoryAnalysis:
     """
     Класс для проведения разведочного анализа данных EVE Online
@@ -27,6 +85,14 @@ class EveExploratoryAnalysis:
         self.data_path = Path(data_path)
         self.df = None
         self.results = {}
+        # Фигуры для повторного использования в пакетном режиме (по размеру)
+        self._figures = {}
+        # Непрерывные военные интервалы (считаются один раз на все графики)
+        self._war_spans = None
+        # Кэш корреляций Спирмена
+        self.correlation_service = None
+        # Куб потерь по дампу убийств (открывается при первом срезе)
+        self.kill_cube = None
         
     def load_and_prepare_data(self):
         """
@@ -40,6 +106,8 @@ class EveExploratoryAnalysis:
         
         # Сортировка по дате
         self.df = self.df.sort_values('history_date')
+        self._war_spans = None
+        self.correlation_service = None
         
         # Проверка наличия необходимых столбцов
         required_columns = ['history_date', 'total_isk_destroyed', 'production_isk', 
@@ -88,7 +156,40 @@ class EveExploratoryAnalysis:
         self.results['basic_statistics'] = stats_df
         return stats_df
     
-    def plot_time_series_with_war_periods(self, save_path=None):
+    def war_spans(self):
+        """Военные периоды, объединённые в непрерывные интервалы"""
+        if self._war_spans is None:
+            self._war_spans = merge_war_spans(self.df['history_date'], self.df['is_war_period'] == 1)
+        return self._war_spans
+    
+    def _create_axes(self, figsize, show):
+        """
+        Фигура и оси для очередного графика
+        
+        В пакетном режиме (show=False) фигура каждого размера создаётся
+        один раз и дальше только очищается.
+        """
+        if show:
+            return plt.subplots(figsize=figsize)
+        
+        fig = self._figures.get(figsize)
+        if fig is None:
+            fig = self._figures[figsize] = plt.figure(figsize=figsize)
+        else:
+            fig.clear()
+        return fig, fig.add_subplot()
+    
+    def _finish_figure(self, fig, output_path, dpi, show):
+        """Компоновка, сохранение и (в интерактивном режиме) показ фигуры"""
+        fig.tight_layout()
+        
+        if output_path:
+            fig.savefig(output_path, dpi=dpi, bbox_inches='tight')
+        
+        if show:
+            plt.show()
+    
+    def plot_time_series_with_war_periods(self, save_path=None, show=True, dpi=300, fmt='png', indicators=None):
         """
         Построение временных рядов ключевых показателей с выделением военных периодов
         
@@ -96,6 +197,14 @@ class EveExploratoryAnalysis:
         -----------
         save_path : str или Path, optional
             Путь для сохранения графиков
+        show : bool
+            Показывать окна графиков (False - пакетный режим без GUI)
+        dpi : int
+            Разрешение сохраняемых файлов
+        fmt : str
+            Формат файлов: png, svg, pdf и др.
+        indicators : list of str, optional
+            Построить только эти показатели (по умолчанию - все)
         """
         print("\nПостроение временных рядов ключевых показателей...")
         
@@ -110,22 +219,20 @@ class EveExploratoryAnalysis:
         
         # Создание отдельных окон для каждого графика
         for col_name, title, ylabel in key_indicators:
+            if indicators is not None and col_name not in indicators:
+                continue
             if col_name not in self.df.columns:
                 print(f"Показатель {col_name} отсутствует в данных")
                 continue
             
-            fig, ax = plt.subplots(figsize=(14, 6))
+            fig, ax = self._create_axes((14, 6), show)
             
             # Построение графика
             ax.plot(self.df['history_date'], self.df[col_name], 
                    linewidth=2, color='steelblue', alpha=0.8, label=title)
             
             # Выделение военных периодов
-            war_periods = self.df[self.df['is_war_period'] == 1]
-            for _, row in war_periods.iterrows():
-                ax.axvspan(row['history_date'], 
-                          row['history_date'] + pd.DateOffset(months=1),
-                          alpha=0.3, color='red', zorder=0)
+            draw_war_spans(ax, self.war_spans())
             
             # Настройки графика
             ax.set_title(f'{title} ({col_name})', fontsize=14, fontweight='bold', pad=12)
@@ -143,19 +250,15 @@ class EveExploratoryAnalysis:
             war_patch = Patch(facecolor='red', alpha=0.3, label='Военный период')
             ax.legend(handles=[war_patch], loc='upper left', fontsize=10)
             
-            plt.tight_layout()
-            
-            if save_path:
-                output_path = Path(save_path) / f'time_series_{col_name}.png'
-                plt.savefig(output_path, dpi=300, bbox_inches='tight')
+            output_path = Path(save_path) / f'time_series_{col_name}.{fmt}' if save_path else None
+            self._finish_figure(fig, output_path, dpi, show)
+            if output_path:
                 print(f"График {title} сохранен в: {output_path}")
-            
-            plt.show()
         
         self.results['time_series_plots'] = key_indicators
         return None
     
-    def plot_comparison_boxplots(self, save_path=None):
+    def plot_comparison_boxplots(self, save_path=None, show=True, dpi=300, fmt='png', indicators=None):
         """
         Построение боксплотов для сравнения показателей в военные и мирные периоды
         
@@ -163,6 +266,14 @@ class EveExploratoryAnalysis:
         -----------
         save_path : str или Path, optional
             Путь для сохранения графиков
+        show : bool
+            Показывать окна графиков (False - пакетный режим без GUI)
+        dpi : int
+            Разрешение сохраняемых файлов
+        fmt : str
+            Формат файлов: png, svg, pdf и др.
+        indicators : list of str, optional
+            Построить только эти показатели (по умолчанию - все)
         """
         print("\nСравнение распределений показателей в военные и мирные периоды...")
         
@@ -176,11 +287,13 @@ class EveExploratoryAnalysis:
         
         # Создание отдельных окон для каждого графика
         for col_name, title, ylabel in comparison_metrics:
+            if indicators is not None and col_name not in indicators:
+                continue
             if col_name not in self.df.columns:
                 print(f"Показатель {col_name} отсутствует в данных")
                 continue
             
-            fig, ax = plt.subplots(figsize=(10, 6))
+            fig, ax = self._create_axes((10, 6), show)
             
             # Разделение данных на войну и мир с удалением NaN
             war_data_raw = self.df[self.df['is_war_period'] == 1][col_name]
@@ -238,19 +351,15 @@ class EveExploratoryAnalysis:
                        fontsize=9, verticalalignment='top',
                        bbox=dict(boxstyle='round', facecolor='lightyellow', alpha=0.5))
             
-            plt.tight_layout()
-            
-            if save_path:
-                output_path = Path(save_path) / f'boxplot_{col_name}.png'
-                plt.savefig(output_path, dpi=300, bbox_inches='tight')
+            output_path = Path(save_path) / f'boxplot_{col_name}.{fmt}' if save_path else None
+            self._finish_figure(fig, output_path, dpi, show)
+            if output_path:
                 print(f"Боксплот {title} сохранен в: {output_path}")
-            
-            plt.show()
         
         self.results['boxplot_comparison'] = comparison_metrics
         return None
     
-    def plot_correlation_matrix(self, save_path=None):
+    def plot_correlation_matrix(self, save_path=None, show=True, dpi=300, fmt='png'):
         """
         Построение тепловой карты корреляций между показателями
         
@@ -258,6 +367,12 @@ class EveExploratoryAnalysis:
         -----------
         save_path : str или Path, optional
             Путь для сохранения графиков
+        show : bool
+            Показывать окно графика (False - пакетный режим без GUI)
+        dpi : int
+            Разрешение сохраняемого файла
+        fmt : str
+            Формат файла: png, svg, pdf и др.
         """
         print("\nАнализ корреляционных взаимосвязей между показателями...")
         
@@ -274,8 +389,10 @@ class EveExploratoryAnalysis:
             print("Недостаточно данных для корреляционного анализа")
             return None
         
-        # Расчет корреляционной матрицы
-        corr_matrix = self.df[available_cols].corr(method='spearman')
+        # Расчет корреляционной матрицы (ранги и матрица кэшируются для текущей версии данных)
+        if self.correlation_service is None or self.correlation_service.columns != available_cols:
+            self.correlation_service = CorrelationService(self.df, available_cols)
+        corr_matrix = self.correlation_service.matrix()
         
         # Перевод названий на русский для графика
         russian_names = {
@@ -289,7 +406,7 @@ class EveExploratoryAnalysis:
         display_names = [russian_names.get(col, col) for col in available_cols]
         
         # Создание тепловой карты
-        fig, ax = plt.subplots(figsize=(12, 10))
+        fig, ax = self._create_axes((12, 10), show)
         
         # Маска для верхнего треугольника
         mask = np.triu(np.ones_like(corr_matrix, dtype=bool))
@@ -303,15 +420,11 @@ class EveExploratoryAnalysis:
         ax.set_title('Матрица корреляций Спирмена между ключевыми показателями', 
                     fontsize=16, fontweight='bold', pad=20)
         
-        plt.tight_layout()
-        
-        if save_path:
-            output_path = Path(save_path) / 'correlation_matrix.png'
-            plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        output_path = Path(save_path) / f'correlation_matrix.{fmt}' if save_path else None
+        self._finish_figure(fig, output_path, dpi, show)
+        if output_path:
             print(f"Корреляционная матрица сохранена в: {output_path}")
         
-        plt.show()
-        
         # Детальный вывод корреляций
         print("\n" + "="*60)
         print("ДЕТАЛЬНЫЙ АНАЛИЗ КОРРЕЛЯЦИЙ")
@@ -330,14 +443,9 @@ class EveExploratoryAnalysis:
         
         # Анализ сильных корреляций
         print("\nСильные корреляции (|r| > 0.7):")
-        strong_corrs = []
-        for i in range(len(corr_matrix.columns)):
-            for j in range(i+1, len(corr_matrix.columns)):
-                corr = corr_matrix.iloc[i, j]
-                if abs(corr) > 0.7:
-                    col1 = russian_names.get(corr_matrix.columns[i], corr_matrix.columns[i])
-                    col2 = russian_names.get(corr_matrix.columns[j], corr_matrix.columns[j])
-                    strong_corrs.append((col1, col2, corr))
+        strong = self.correlation_service.strong_pairs(0.7)
+        strong_corrs = [(russian_names.get(col1, col1), russian_names.get(col2, col2), corr)
+                        for col1, col2, corr in strong.itertuples(index=False)]
         
         if strong_corrs:
             for idx, (col1, col2, corr) in enumerate(strong_corrs, 1):
@@ -348,9 +456,83 @@ class EveExploratoryAnalysis:
         self.results['correlation_matrix'] = corr_matrix
         return corr_matrix
     
-    def analyze_war_peace_statistics(self):
+    def war_peace_tests(self, metrics=None, n_resamples=DEFAULT_RESAMPLES, seed=0, workers=1):
+        """
+        Перестановочные тесты и бутстреп-интервалы разницы война/мир
+        
+        Parameters:
+        -----------
+        metrics : list of str, optional
+            Показатели (по умолчанию - сравниваемые в analyze_war_peace_statistics)
+        n_resamples : int
+            Число перестановок и бутстреп-выборок
+        seed : int
+            Начальное значение генератора (результат воспроизводим)
+        workers : int
+            Число процессов
+        
+        Returns:
+        --------
+        pd.DataFrame
+            Индекс - показатель; p_value, ci_low_pct, ci_high_pct и др.
+        """
+        metrics = metrics or ['production_isk', 'trade_value', 'isk_velocity', 'mining_isk']
+        engine = ResamplingEngine(n_resamples=n_resamples, seed=seed, workers=workers)
+        tests = engine.compare(self.df, metrics)
+        if not tests.empty:
+            tests = tests.set_index('metric')
+            print(f"\nПроверка значимости: {n_resamples:,} перестановок и бутстреп-выборок "
+                  f"за {engine.elapsed:.2f} с")
+        self.results['war_peace_tests'] = tests
+        return tests
+    
+    def destruction_breakdown(self, by='region', top=10, kill_dump_path=None, **filters):
+        """
+        Потери в разрезе месяца, дня, региона и/или группы кораблей
+        
+        Срез считается по кубу потерь (kill_cube): куб строится по дампу
+        убийств один раз, дальше любой срез не перечитывает дамп.
+        
+        Parameters:
+        -----------
+        by : str или list of str
+            Измерения: month, day, region, ship_group
+        top : int
+            Сколько строк с наибольшими потерями вывести
+        kill_dump_path : str или Path, optional
+            Путь к combined_kill_dump.csv (по умолчанию - в сводных таблицах)
+        **filters
+            months, regions, ship_groups, start, end (см. KillCube.select)
+        
+        Returns:
+        --------
+        pd.DataFrame
+            total_isk_destroyed, kill_count, mean_isk, процентили и др.
+        """
+        if self.kill_cube is None:
+            self.kill_cube = open_kill_cube(kill_dump_path) if kill_dump_path else open_kill_cube()
+        breakdown = self.kill_cube.slice(by, **filters)
+        
+        print(f"\nПотери по {by if isinstance(by, str) else ' x '.join(by)} (трлн ISK):")
+        for label, row in breakdown.nlargest(top, 'total_isk_destroyed').iterrows():
+            print(f"  {str(label):40} {row['total_isk_destroyed'] / 1e12:10.2f}  "
+                  f"убийств: {int(row['kill_count']):,}")
+        
+        self.results['destruction_breakdown'] = breakdown
+        return breakdown
+    
+    def analyze_war_peace_statistics(self, n_resamples=DEFAULT_RESAMPLES, seed=0, workers=1):
         """
         Детальный статистический анализ различий между военными и мирными периодами
+        
+        Parameters:
+        -----------
+        n_resamples : int
+            Число перестановок и бутстреп-выборок для проверки значимости (0 - без проверки)
+        seed : int
+            Начальное значение генератора
+        workers : int
+            Число процессов для проверки значимости
         """
         print("\n" + "="*60)
         print("СТАТИСТИЧЕСКОЕ СРАВНЕНИЕ ВОЕННЫХ И МИРНЫХ ПЕРИОДОВ")
@@ -367,6 +549,10 @@ class EveExploratoryAnalysis:
         # Показатели для сравнения
         comparison_metrics = ['production_isk', 'trade_value', 'isk_velocity', 'mining_isk']
         
+        tests = pd.DataFrame()
+        if n_resamples:
+            tests = self.war_peace_tests(comparison_metrics, n_resamples, seed, workers)
+        
         comparison_results = []
         
         for metric in comparison_metrics:
@@ -410,6 +596,10 @@ class EveExploratoryAnalysis:
                 'σ (война)': war_std_fmt,
                 'σ (мир)': peace_std_fmt
             }
+            if metric in tests.index:
+                test = tests.loc[metric]
+                result['95% ДИ, %'] = f"[{test['ci_low_pct']:+.1f}%; {test['ci_high_pct']:+.1f}%]"
+                result['p-value'] = f"{test['p_value']:.4f}"
             comparison_results.append(result)
         
         # Вывод результатов
@@ -438,7 +628,11 @@ class EveExploratoryAnalysis:
             
             if abs(relative_diff) > 10:
                 direction = "выше" if relative_diff > 0 else "ниже"
-                print(f"• В военные периоды {russian_name} в среднем на {abs(relative_diff):.1f}% {direction}, чем в мирные")
+                significance = ""
+                if metric in tests.index:
+                    p_value = tests.loc[metric, 'p_value']
+                    significance = f" (p = {p_value:.4f}, {significance_label(p_value)})"
+                print(f"• В военные периоды {russian_name} в среднем на {abs(relative_diff):.1f}% {direction}, чем в мирные{significance}")
         
         self.results['war_peace_comparison'] = comparison_df
         return comparison_df
@@ -479,20 +673,31 @@ class EveExploratoryAnalysis:
         # 3. Предварительные выводы
         report_lines.append("\n3. ПРЕДВАРИТЕЛЬНЫЕ ВЫВОДЫ")
         
+        tests = self.results.get('war_peace_tests')
+        if tests is None:
+            tests = self.war_peace_tests()
+        
+        def test_note(metric):
+            if metric not in tests.index:
+                return ""
+            test = tests.loc[metric]
+            return (f" (p = {test['p_value']:.4f}, {significance_label(test['p_value'])}; "
+                    f"95% ДИ: {test['ci_low_pct']:+.1f}%..{test['ci_high_pct']:+.1f}%)")
+        
         # Проверка визуальных различий
         if 'production_isk' in self.df.columns:
             war_production = self.df[self.df['is_war_period'] == 1]['production_isk'].mean()
             peace_production = self.df[self.df['is_war_period'] == 0]['production_isk'].mean()
             if war_production > peace_production:
                 diff = ((war_production - peace_production) / peace_production * 100)
-                report_lines.append(f"   • Производство в военные периоды выше на {diff:.1f}% (требует статистической проверки)")
+                report_lines.append(f"   • Производство в военные периоды выше на {diff:.1f}%{test_note('production_isk')}")
         
         if 'trade_value' in self.df.columns:
             war_trade = self.df[self.df['is_war_period'] == 1]['trade_value'].mean()
             peace_trade = self.df[self.df['is_war_period'] == 0]['trade_value'].mean()
             if war_trade > peace_trade:
                 diff = ((war_trade - peace_trade) / peace_trade * 100)
-                report_lines.append(f"   • Объем торговли в военные периоды выше на {diff:.1f}%")
+                report_lines.append(f"   • Объем торговли в военные периоды выше на {diff:.1f}%{test_note('trade_value')}")
         
         # Сохранение отчета
         if output_dir:
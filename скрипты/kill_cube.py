@@ -0,0 +1,471 @@
+import os
+import sys
+import json
+import time
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from month_cache import file_fingerprint
+from schema_registry import SchemaRegistry
+from columnar_cache import SUMMARY_TABLES_DIR, COLUMNAR_SUBDIR
+from kill_dump_image import CategoryEncoder, codes_dtype
+from date_parsing import DateParser, period_label
+
+CUBE_VERSION = 1
+
+# Логарифмическая гистограмма ISK в каждой ячейке: BINS_PER_DECADE корзин на порядок
+# (ширина корзины ~7.5%), значения ниже MIN_ISK и выше MAX_ISK - в крайних корзинах
+BINS_PER_DECADE = 32
+MIN_ISK = 1e2
+MAX_ISK = 1e14
+N_BINS = int(round(np.log10(MAX_ISK / MIN_ISK) * BINS_PER_DECADE)) + 2
+
+# Строк промежуточных агрегатов, после которых они сворачиваются повторно
+COMPACT_ROWS = 5_000_000
+DIMENSIONS = ['month', 'day', 'region', 'ship_group']
+# Столбцы дампа, которые читает куб
+CUBE_COLUMNS = ['isk_destroyed', 'kill_time', 'region', 'ship_type']
+PERCENTILES = (50, 90, 99)
+UNKNOWN_REGION = '(неизвестно)'
+# Ключ ячейки: день << 24 | регион << 8 | группа; больше кодов в ключ не помещается
+REGION_BITS = 16
+GROUP_BITS = 8
+MAX_REGIONS = 1 << REGION_BITS
+# Коды групп хранятся в int8
+MAX_SHIP_GROUPS = min(1 << GROUP_BITS, np.iinfo(np.int8).max + 1)
+
+# Группы кораблей по названию корпуса; всё остальное - 'other'
+SHIP_GROUPS = {
+    'capsule': ['Capsule'],
+    'frigate': ['Rifter', 'Merlin', 'Incursus', 'Tristan', 'Punisher', 'Kestrel', 'Atron', 'Condor',
+                'Slasher', 'Executioner', 'Heron', 'Imicus', 'Magnate', 'Probe', 'Breacher', 'Tormentor'],
+    'destroyer': ['Catalyst', 'Thrasher', 'Cormorant', 'Coercer', 'Algos', 'Talwar', 'Corax', 'Dragoon'],
+    'cruiser': ['Vexor', 'Caracal', 'Rupture', 'Omen', 'Stabber', 'Thorax', 'Moa', 'Maller', 'Arbitrator',
+                'Bellicose', 'Blackbird', 'Celestis', 'Tengu', 'Loki', 'Legion', 'Proteus'],
+    'battlecruiser': ['Drake', 'Hurricane', 'Brutix', 'Harbinger', 'Myrmidon', 'Ferox', 'Prophecy', 'Cyclone'],
+    'battleship': ['Raven', 'Megathron', 'Apocalypse', 'Tempest', 'Dominix', 'Scorpion', 'Armageddon',
+                   'Typhoon', 'Rokh', 'Maelstrom', 'Hyperion', 'Abaddon'],
+    'capital': ['Naglfar', 'Revelation', 'Moros', 'Phoenix', 'Archon', 'Thanatos', 'Chimera',
+                'Nidhoggur', 'Apostle', 'Minokawa', 'Lif', 'Ninazu'],
+    'supercapital': ['Nyx', 'Aeon', 'Wyvern', 'Hel'],
+    'titan': ['Avatar', 'Erebus', 'Leviathan', 'Ragnarok'],
+    'mining': ['Venture', 'Retriever', 'Procurer', 'Covetor', 'Hulk', 'Skiff', 'Mackinaw', 'Orca', 'Rorqual'],
+    'industrial': ['Badger', 'Tayra', 'Nereus', 'Iteron Mark V', 'Bestower', 'Sigil', 'Wreathe',
+                   'Mammoth', 'Charon', 'Fenrir', 'Obelisk', 'Providence'],
+}
+OTHER_GROUP = 'other'
+
+
+def default_cube_dir(csv_path):
+    csv_path = Path(csv_path)
+    return csv_path.parent / COLUMNAR_SUBDIR / f"{csv_path.stem}.cube"
+
+
+def isk_bins(isk):
+    """Номер корзины логарифмической гистограммы для каждого значения ISK"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        position = np.floor(np.log10(isk / MIN_ISK) * BINS_PER_DECADE) + 1
+    return np.clip(np.nan_to_num(position, nan=0, neginf=0), 0, N_BINS - 1).astype(np.int16)
+
+
+def bin_lower_edge(bins):
+    """Нижняя граница корзины (для корзины 0 - ноль)"""
+    bins = np.asarray(bins)
+    return np.where(bins > 0, MIN_ISK * 10.0 ** ((bins - 1) / BINS_PER_DECADE), 0.0)
+
+
+class ShipGroupMapper:
+    """Тип корабля -> код группы (без учёта регистра)"""
+
+    def __init__(self, ship_groups=None):
+        ship_groups = ship_groups or SHIP_GROUPS
+        self.groups = list(ship_groups) + [OTHER_GROUP]
+        if len(self.groups) > MAX_SHIP_GROUPS:
+            raise ValueError(f"Групп кораблей {len(self.groups)}, в ключ ячейки куба помещается {MAX_SHIP_GROUPS}")
+        self.lookup = {name.lower(): i for i, group in enumerate(ship_groups) for name in ship_groups[group]}
+        self.other = len(self.groups) - 1
+
+    def encode(self, values):
+        codes, uniques = pd.factorize(values)
+        mapping = np.array([self.lookup.get(str(value).strip().lower(), self.other) for value in uniques]
+                           + [self.other], dtype=np.int8)
+        # Пропуски (код -1) попадают в последний элемент mapping - группу 'other'
+        return mapping[codes]
+
+
+def _compact(cells, hists):
+    """Сворачивание накопленных по частям агрегатов ячеек и гистограмм"""
+    cells = pd.concat(cells).groupby(level=0).agg(
+        {'kills': 'sum', 'isk_sum': 'sum', 'isk_min': 'min', 'isk_max': 'max'})
+    hists = pd.concat(hists).groupby(level=[0, 1]).sum()
+    return [cells], [hists]
+
+
+def build_cube(csv_path, cube_dir=None, chunk_size=1_000_000, ship_groups=None):
+    """
+    Построение куба потерь за один потоковый проход по дампу убийств
+
+    Ячейка куба - день x регион x группа кораблей (месяц выводится из дня).
+    Для каждой ячейки хранятся число убийств, сумма, минимум и максимум ISK
+    и разреженная логарифмическая гистограмма ISK, по которой считаются
+    процентили любого среза.
+
+    Parameters:
+    -----------
+    csv_path : str или Path
+        Путь к combined_kill_dump.csv
+    cube_dir : str или Path, optional
+        Директория куба (по умолчанию columnar/<имя>.cube рядом с CSV)
+    chunk_size : int
+        Число строк в одной части при чтении CSV
+    ship_groups : dict, optional
+        Группа -> список названий корпусов (по умолчанию SHIP_GROUPS)
+
+    Returns:
+    --------
+    Path
+        Директория куба
+    """
+    csv_path = Path(csv_path)
+    cube_dir = Path(cube_dir) if cube_dir else default_cube_dir(csv_path)
+    tmp_dir = cube_dir.with_name(cube_dir.name + '.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    source = file_fingerprint(csv_path)
+    plan = SchemaRegistry().plan('combined_kill', csv_path)
+    columns = plan.columns
+    missing = [key for key in ('isk_destroyed', 'kill_time') if key not in columns]
+    if missing:
+        raise ValueError(f"В {csv_path.name} не найдены столбцы: {missing}")
+
+    regions = CategoryEncoder()
+    groups = ShipGroupMapper(ship_groups)
+    dates = DateParser()
+    cells, hists = [], []
+    pending_rows = rows = skipped = 0
+
+    with open(csv_path, 'rb') as f:
+        reader = pd.read_csv(f, sep=plan.sep, usecols=plan.usecols_for(CUBE_COLUMNS), chunksize=chunk_size,
+                             on_bad_lines='skip')
+        for chunk in reader:
+            rows += len(chunk)
+            times = dates.parse(chunk[columns['kill_time']]).to_numpy('datetime64[ns]')
+            valid = ~np.isnat(times)
+            skipped += int((~valid).sum())
+            day = times[valid].astype('datetime64[D]').astype(np.int64)
+
+            if 'region' in columns:
+                region = regions.encode(chunk[columns['region']].fillna(UNKNOWN_REGION).to_numpy()[valid])
+            else:
+                region = regions.encode(np.full(valid.sum(), UNKNOWN_REGION, dtype=object))
+            if len(regions.categories) > MAX_REGIONS:
+                # Иначе коды регионов наложились бы друг на друга в ключе ячейки
+                raise ValueError(f"Регионов больше {MAX_REGIONS}: куб не поддерживает столько кодов")
+            if 'ship_type' in columns:
+                group = groups.encode(chunk[columns['ship_type']].to_numpy()[valid])
+            else:
+                group = np.full(valid.sum(), groups.other, dtype=np.int8)
+            isk = pd.to_numeric(chunk[columns['isk_destroyed']], errors='coerce').to_numpy(np.float64)[valid]
+
+            # Ключ ячейки: день << 24 | регион << 8 | группа
+            key = ((day << (REGION_BITS + GROUP_BITS)) | (region.astype(np.int64) << GROUP_BITS)
+                   | group.astype(np.int64))
+            frame = pd.DataFrame({'cell': key, 'isk': isk})
+            cells.append(frame.groupby('cell')['isk'].agg(
+                kills='size', isk_sum='sum', isk_min='min', isk_max='max'))
+            priced = ~np.isnan(isk)
+            hists.append(pd.Series(1, index=pd.MultiIndex.from_arrays(
+                [key[priced], isk_bins(isk[priced])], names=['cell', 'bin'])).groupby(level=[0, 1]).sum())
+
+            pending_rows += len(cells[-1]) + len(hists[-1])
+            if pending_rows > COMPACT_ROWS:
+                cells, hists = _compact(cells, hists)
+                pending_rows = len(cells[0]) + len(hists[0])
+
+    if cells:
+        cells, hists = _compact(cells, hists)
+        cell_table, hist_table = cells[0], hists[0]
+    else:
+        cell_table = pd.DataFrame(columns=['kills', 'isk_sum', 'isk_min', 'isk_max'], index=pd.Index([], dtype=np.int64))
+        hist_table = pd.Series(dtype=np.int64, index=pd.MultiIndex.from_arrays([[], []], names=['cell', 'bin']))
+
+    keys = cell_table.index.to_numpy(np.int64)
+    region_dtype = codes_dtype(len(regions.categories))
+    arrays = {
+        'day': (keys >> (REGION_BITS + GROUP_BITS)).astype(np.int32),
+        'region': ((keys >> GROUP_BITS) & (MAX_REGIONS - 1)).astype(region_dtype),
+        'ship_group': (keys & ((1 << GROUP_BITS) - 1)).astype(np.int8),
+        'kills': cell_table['kills'].to_numpy(np.int64),
+        'isk_sum': cell_table['isk_sum'].to_numpy(np.float64),
+        'isk_min': cell_table['isk_min'].to_numpy(np.float64),
+        'isk_max': cell_table['isk_max'].to_numpy(np.float64),
+        # Гистограммы: номер ячейки (строки массивов выше), корзина, число убийств
+        'hist_cell': np.searchsorted(keys, hist_table.index.get_level_values('cell').to_numpy(np.int64)).astype(np.int32),
+        'hist_bin': hist_table.index.get_level_values('bin').to_numpy(np.int16),
+        'hist_count': hist_table.to_numpy(np.int32),
+    }
+    for name, array in arrays.items():
+        np.save(tmp_dir / f"{name}.npy", array)
+
+    manifest = {
+        'version': CUBE_VERSION,
+        'source': source,
+        'rows': rows,
+        'skipped_rows': skipped,
+        'cells': len(keys),
+        'bins_per_decade': BINS_PER_DECADE,
+        'min_isk': MIN_ISK,
+        'n_bins': N_BINS,
+        'regions': [str(c) for c in regions.categories],
+        'ship_groups': groups.groups,
+        'source_columns': {key: columns[key] for key in CUBE_COLUMNS if key in columns},
+    }
+    with open(tmp_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    if cube_dir.exists():
+        shutil.rmtree(cube_dir)
+    os.replace(tmp_dir, cube_dir)
+    return cube_dir
+
+
+class KillCube:
+    """
+    Открытый куб потерь
+
+    Массивы ячеек отображаются в память; срез (фильтр по месяцам, дням,
+    регионам и группам кораблей + группировка по любым измерениям)
+    считается векторно по ячейкам, без обращения к исходному дампу.
+    """
+
+    def __init__(self, cube_dir):
+        self.cube_dir = Path(cube_dir)
+        with open(self.cube_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.regions = np.asarray(self.manifest['regions'], dtype=object)
+        self.ship_groups = np.asarray(self.manifest['ship_groups'], dtype=object)
+        self._arrays = {}
+
+    def __len__(self):
+        return self.manifest['cells']
+
+    def array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.cube_dir / f"{name}.npy", mmap_mode='r')
+        return self._arrays[name]
+
+    def month_codes(self):
+        """Код месяца (period_code) каждой ячейки"""
+        months = self.array('day').astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        return months + 1970 * 12
+
+    def select(self, months=None, regions=None, ship_groups=None, start=None, end=None):
+        """
+        Маска ячеек по фильтрам
+
+        Parameters:
+        -----------
+        months : list of str, optional
+            Месяцы 'YYYY-MM'
+        regions : list of str, optional
+            Названия регионов
+        ship_groups : list of str, optional
+            Группы кораблей (см. SHIP_GROUPS)
+        start, end : str или datetime, optional
+            Границы по дню включительно
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if months is not None:
+            codes = [pd.Period(month, freq='M') for month in months]
+            mask &= np.isin(self.month_codes(), [p.year * 12 + p.month - 1 for p in codes])
+        if regions is not None:
+            mask &= np.isin(self.array('region'), np.flatnonzero(np.isin(self.regions, list(regions))))
+        if ship_groups is not None:
+            mask &= np.isin(self.array('ship_group'), np.flatnonzero(np.isin(self.ship_groups, list(ship_groups))))
+        day = self.array('day')
+        if start is not None:
+            mask &= day >= np.datetime64(pd.Timestamp(start).date(), 'D').astype(np.int64)
+        if end is not None:
+            mask &= day <= np.datetime64(pd.Timestamp(end).date(), 'D').astype(np.int64)
+        return mask
+
+    def _dimension(self, name, mask):
+        """Значения измерения для выбранных ячеек: (целые коды, функция коды -> подписи)"""
+        if name == 'month':
+            return self.month_codes()[mask], lambda codes: [period_label(int(c)) for c in codes]
+        if name == 'day':
+            return self.array('day')[mask].astype(np.int64), lambda codes: codes.astype('datetime64[D]')
+        if name == 'region':
+            return self.array('region')[mask].astype(np.int64), lambda codes: self.regions[codes]
+        if name == 'ship_group':
+            return self.array('ship_group')[mask].astype(np.int64), lambda codes: self.ship_groups[codes]
+        raise ValueError(f"Неизвестное измерение: {name}; доступны {DIMENSIONS}")
+
+    def slice(self, by=('month',), percentiles=PERCENTILES, **filters):
+        """
+        Срез куба: потери и процентили ISK по группам измерений
+
+        Parameters:
+        -----------
+        by : str или list of str
+            Измерения группировки (month, day, region, ship_group); пустой - итог
+        percentiles : sequence of float
+            Процентили стоимости одного убийства
+        **filters
+            Фильтры select (months, regions, ship_groups, start, end)
+
+        Returns:
+        --------
+        pd.DataFrame
+            Индекс - измерения by; столбцы total_isk_destroyed, kill_count,
+            mean_isk, min_isk, max_isk и p<процентиль>
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        mask = self.select(**filters)
+        selected = np.flatnonzero(mask)
+
+        # Номер группы для каждой выбранной ячейки: коды измерений сводятся
+        # в один целый ключ (смешанная система счисления) и нумеруются через unique
+        dims = [self._dimension(name, mask) for name in by]
+        key = np.zeros(len(selected), dtype=np.int64)
+        bases = []
+        for codes, _ in dims:
+            low_code = codes.min() if len(codes) else 0
+            base = int(codes.max() - low_code + 1) if len(codes) else 1
+            key = key * base + (codes - low_code)
+            bases.append((low_code, base))
+        group_keys, group_index = np.unique(key, return_inverse=True)
+        group_index = group_index.ravel()
+        n_groups = len(group_keys)
+
+        kills = np.bincount(group_index, weights=self.array('kills')[mask], minlength=n_groups)
+        total = np.bincount(group_index, weights=self.array('isk_sum')[mask], minlength=n_groups)
+        order = np.argsort(group_index, kind='stable')
+        starts = np.searchsorted(group_index[order], np.arange(n_groups))
+        if n_groups:
+            # fmin/fmax пропускают ячейки, где у всех убийств нет стоимости
+            low = np.fmin.reduceat(self.array('isk_min')[mask][order], starts)
+            high = np.fmax.reduceat(self.array('isk_max')[mask][order], starts)
+        else:
+            low = high = np.zeros(0)
+
+        result = pd.DataFrame({
+            'total_isk_destroyed': total,
+            'kill_count': kills.astype(np.int64),
+            'min_isk': low,
+            'max_isk': high,
+        })
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['mean_isk'] = total / np.where(kills > 0, kills, np.nan)
+
+        if percentiles:
+            histogram = self._group_histograms(mask, group_index, n_groups)
+            for q in percentiles:
+                result[f"p{q:g}"] = self._histogram_quantile(histogram, q / 100, result['min_isk'].to_numpy(),
+                                                             result['max_isk'].to_numpy())
+
+        if by:
+            # Разбор общего ключа обратно на коды измерений
+            levels = []
+            rest = group_keys
+            for (low_code, base), (_, labels) in zip(reversed(bases), reversed(dims)):
+                levels.append(labels(rest % base + low_code))
+                rest = rest // base
+            result.index = pd.MultiIndex.from_arrays(levels[::-1], names=by)
+            if len(by) == 1:
+                result.index = result.index.get_level_values(0)
+        else:
+            result.index = pd.Index(['all'] * n_groups)
+        return result
+
+    def _group_histograms(self, mask, group_index, n_groups):
+        """Сумма гистограмм ячеек каждой группы: матрица (группы x корзины)"""
+        cell_group = np.full(len(self), -1, dtype=np.int64)
+        cell_group[mask] = group_index
+        hist_group = cell_group[self.array('hist_cell')]
+        used = hist_group >= 0
+        n_bins = self.manifest['n_bins']
+        flat = np.bincount(hist_group[used] * n_bins + self.array('hist_bin')[used],
+                           weights=self.array('hist_count')[used], minlength=n_groups * n_bins)
+        return flat.reshape(n_groups, n_bins)
+
+    def _histogram_quantile(self, histogram, q, low, high):
+        """
+        Квантиль по гистограмме
+
+        Ранг q * (n - 1) считается, как в pandas; корзина с этим рангом
+        находится по накопленным счётчикам, внутри корзины значения считаются
+        равномерно распределёнными в логарифмической шкале. Результат
+        ограничивается минимумом и максимумом группы.
+        """
+        counts = histogram.sum(axis=1)
+        cumulative = np.cumsum(histogram, axis=1)
+        rank = q * np.maximum(counts - 1, 0)
+        bins = np.minimum((cumulative <= rank[:, None]).sum(axis=1), histogram.shape[1] - 1)
+        rows = np.arange(len(histogram))
+        before = np.where(bins > 0, cumulative[rows, np.maximum(bins - 1, 0)], 0)
+        in_bin = histogram[rows, bins]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.clip((rank - before + 0.5) / in_bin, 0, 1)
+        values = bin_lower_edge(bins) * 10.0 ** (fraction / self.manifest['bins_per_decade'])
+        values = np.clip(values, low, high)
+        return np.where(counts > 0, values, np.nan)
+
+
+def is_cube_fresh(csv_path, cube_dir=None):
+    cube_dir = Path(cube_dir) if cube_dir else default_cube_dir(csv_path)
+    try:
+        with open(cube_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get('version') != CUBE_VERSION:
+        return False
+    return file_fingerprint(csv_path, manifest['source'])['hash'] == manifest['source']['hash']
+
+
+def open_kill_cube(csv_path=SUMMARY_TABLES_DIR / "combined_kill_dump.csv", cube_dir=None, rebuild=False):
+    """
+    Открытие куба потерь; куб строится, если его нет или дамп изменился
+
+    Returns:
+    --------
+    KillCube
+    """
+    cube_dir = Path(cube_dir) if cube_dir else default_cube_dir(csv_path)
+    if rebuild or not is_cube_fresh(csv_path, cube_dir):
+        print(f"Построение куба потерь {Path(csv_path).name} в {cube_dir}...")
+        build_cube(csv_path, cube_dir)
+    return KillCube(cube_dir)
+
+
+def main():
+    """Построение куба потерь и примеры срезов: python kill_cube.py [путь к дампу]"""
+    csv_path = Path(sys.argv[1]) if len(sys.argv) > 1 else SUMMARY_TABLES_DIR / "combined_kill_dump.csv"
+
+    print("=" * 70)
+    print("КУБ ПОТЕРЬ: МЕСЯЦ x РЕГИОН x ДЕНЬ x ГРУППА КОРАБЛЕЙ")
+    print("=" * 70)
+    start = time.perf_counter()
+    cube = open_kill_cube(csv_path)
+    print(f"Ячеек: {len(cube):,}, убийств: {cube.manifest['rows']:,} ({time.perf_counter() - start:.1f} с)")
+
+    start = time.perf_counter()
+    by_month = cube.slice('month')
+    by_group = cube.slice('ship_group')
+    elapsed = time.perf_counter() - start
+    print("\nПотери по месяцам (трлн ISK):")
+    for row in by_month.itertuples():
+        print(f"  {row.Index}: {row.total_isk_destroyed / 1e12:10.2f}  убийств {row.kill_count:>10,}  "
+              f"p90 {row.p90 / 1e6:10.1f} млн")
+    print("\nПотери по группам кораблей (трлн ISK):")
+    for row in by_group.sort_values('total_isk_destroyed', ascending=False).itertuples():
+        print(f"  {row.Index:15} {row.total_isk_destroyed / 1e12:10.2f}  убийств {row.kill_count:>10,}")
+    print(f"\nСрезы посчитаны за {elapsed * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
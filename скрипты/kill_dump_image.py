@@ -0,0 +1,219 @@
+import os
+import json
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from month_cache import file_fingerprint
+from schema_registry import SchemaRegistry
+from date_parsing import DateParser
+from columnar_cache import SUMMARY_TABLES_DIR, COLUMNAR_SUBDIR
+
+IMAGE_VERSION = 1
+
+# Тип хранения каждого столбца образа
+COLUMN_KINDS = {
+    'isk_destroyed': 'float',
+    'kill_time': 'datetime',
+    'region': 'categorical',
+    'ship_type': 'categorical',
+}
+
+
+def default_image_dir(csv_path):
+    csv_path = Path(csv_path)
+    return csv_path.parent / COLUMNAR_SUBDIR / f"{csv_path.stem}.image"
+
+
+def codes_dtype(n_categories):
+    """Наименьший целый тип кодов, который pandas использует для стольких категорий"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class CategoryEncoder:
+    """Сквозное кодирование строк в целые коды по всем частям файла"""
+
+    def __init__(self):
+        self.codes = {}
+        self.categories = []
+
+    def encode(self, values):
+        chunk_codes, uniques = pd.factorize(values)
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.categories)
+                self.categories.append(value)
+            mapping[i] = code
+        # Пропуски (код -1 после factorize) остаются -1
+        return np.where(chunk_codes >= 0, mapping[chunk_codes], -1).astype(np.int32)
+
+
+def build_image(csv_path, image_dir=None, chunk_size=1_000_000):
+    """
+    Построение бинарного колоночного образа дампа убийств
+
+    Дамп читается потоково; каждый столбец пишется в отдельный файл
+    фиксированной ширины: ISK - float64, время - int64 (нс),
+    регион и тип корабля - целые коды категорий.
+
+    Parameters:
+    -----------
+    csv_path : str или Path
+        Путь к combined_kill_dump.csv
+    image_dir : str или Path, optional
+        Директория образа (по умолчанию columnar/<имя>.image рядом с CSV)
+    chunk_size : int
+        Число строк в одной части при чтении CSV
+
+    Returns:
+    --------
+    Path
+        Директория образа
+    """
+    csv_path = Path(csv_path)
+    image_dir = Path(image_dir) if image_dir else default_image_dir(csv_path)
+    tmp_dir = image_dir.with_name(image_dir.name + '.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    source = file_fingerprint(csv_path)
+    plan = SchemaRegistry().plan('combined_kill', csv_path)
+    columns = {key: col for key, col in plan.columns.items() if key in COLUMN_KINDS}
+    if 'isk_destroyed' not in columns:
+        raise ValueError(f"В {csv_path.name} не найден столбец с уничтоженными ISK")
+
+    encoders = {key: CategoryEncoder() for key in columns if COLUMN_KINDS[key] == 'categorical'}
+    # Формат дат определяется по первой части файла и используется для остальных
+    date_parsers = {key: DateParser() for key in columns if COLUMN_KINDS[key] == 'datetime'}
+    handles = {key: open(tmp_dir / f"{key}.bin", 'wb') for key in columns}
+    rows = 0
+    try:
+        with open(csv_path, 'rb') as f:
+            reader = pd.read_csv(f, sep=plan.sep, usecols=plan.usecols_for(COLUMN_KINDS), chunksize=chunk_size,
+                                 on_bad_lines='skip')
+            for chunk in reader:
+                for key, col in columns.items():
+                    kind = COLUMN_KINDS[key]
+                    if kind == 'float':
+                        values = pd.to_numeric(chunk[col], errors='coerce').to_numpy(np.float64)
+                    elif kind == 'datetime':
+                        times = date_parsers[key].parse(chunk[col])
+                        values = times.to_numpy('datetime64[ns]').view(np.int64)
+                    else:
+                        values = encoders[key].encode(chunk[col].to_numpy())
+                    values.tofile(handles[key])
+                rows += len(chunk)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    manifest = {'version': IMAGE_VERSION, 'source': source, 'rows': rows, 'columns': {}}
+    for key, col in columns.items():
+        kind = COLUMN_KINDS[key]
+        info = {'source_column': col, 'kind': kind, 'file': f"{key}.bin"}
+        if kind == 'float':
+            info['dtype'] = 'float64'
+        elif kind == 'datetime':
+            info['dtype'] = 'int64'
+        else:
+            categories = encoders[key].categories
+            dtype = codes_dtype(len(categories))
+            # Коды ужимаются до типа, который pandas использует сам,
+            # чтобы при открытии Categorical не копировал массив
+            if dtype != np.int32:
+                codes = np.fromfile(tmp_dir / info['file'], dtype=np.int32)
+                codes.astype(dtype).tofile(tmp_dir / info['file'])
+            info['dtype'] = dtype.name
+            info['categories'] = [str(c) for c in categories]
+        manifest['columns'][key] = info
+
+    with open(tmp_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    if image_dir.exists():
+        shutil.rmtree(image_dir)
+    os.replace(tmp_dir, image_dir)
+    return image_dir
+
+
+class KillDumpImage:
+    """
+    Открытый образ дампа убийств
+
+    Столбцы отображаются в память (np.memmap, только чтение): открытие
+    почти мгновенное, а страницы файла разделяются между всеми процессами
+    на одной машине через страничный кэш ОС.
+    """
+
+    def __init__(self, image_dir):
+        self.image_dir = Path(image_dir)
+        with open(self.image_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.rows = self.manifest['rows']
+        self._arrays = {}
+
+    @property
+    def columns(self):
+        return list(self.manifest['columns'])
+
+    def raw(self, key):
+        """Отображённый в память массив столбца (без копирования)"""
+        if key not in self._arrays:
+            info = self.manifest['columns'][key]
+            if self.rows == 0:
+                self._arrays[key] = np.empty(0, dtype=info['dtype'])
+            else:
+                self._arrays[key] = np.memmap(self.image_dir / info['file'], dtype=info['dtype'],
+                                              mode='r', shape=(self.rows,))
+        return self._arrays[key]
+
+    def column(self, key):
+        """Столбец в типе pandas: float64, datetime64[ns] или Categorical"""
+        info = self.manifest['columns'][key]
+        array = self.raw(key)
+        if info['kind'] == 'datetime':
+            return array.view('datetime64[ns]')
+        if info['kind'] == 'categorical':
+            try:
+                return pd.Categorical.from_codes(array, categories=info['categories'], validate=False)
+            except TypeError:  # pandas < 2.1 не знает validate
+                return pd.Categorical.from_codes(array, categories=info['categories'])
+        return array
+
+    def to_frame(self, columns=None):
+        """DataFrame поверх отображённых столбцов (без копирования данных)"""
+        columns = columns or self.columns
+        return pd.DataFrame({key: self.column(key) for key in columns}, copy=False)
+
+
+def is_image_fresh(csv_path, image_dir=None):
+    image_dir = Path(image_dir) if image_dir else default_image_dir(csv_path)
+    try:
+        with open(image_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get('version') != IMAGE_VERSION:
+        return False
+    return file_fingerprint(csv_path, manifest['source'])['hash'] == manifest['source']['hash']
+
+
+def open_kill_dump(csv_path=SUMMARY_TABLES_DIR / "combined_kill_dump.csv", image_dir=None, rebuild=False):
+    """
+    Открытие дампа убийств через образ; образ строится, если его нет или он устарел
+
+    Returns:
+    --------
+    KillDumpImage
+    """
+    image_dir = Path(image_dir) if image_dir else default_image_dir(csv_path)
+    if rebuild or not is_image_fresh(csv_path, image_dir):
+        print(f"Построение образа {Path(csv_path).name} в {image_dir}...")
+        build_image(csv_path, image_dir)
+    return KillDumpImage(image_dir)
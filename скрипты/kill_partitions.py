@@ -0,0 +1,329 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from month_cache import file_fingerprint
+from schema_registry import SchemaRegistry
+from columnar_cache import SUMMARY_TABLES_DIR, COLUMNAR_SUBDIR
+from date_parsing import DateParser, period_label, INVALID_PERIOD
+
+PARTITION_VERSION = 1
+# Партиция для строк с нераспознанной датой
+UNKNOWN_MONTH = 'unknown'
+
+
+def default_partition_dir(csv_path):
+    csv_path = Path(csv_path)
+    return csv_path.parent / COLUMNAR_SUBDIR / f"{csv_path.stem}.parts"
+
+
+def _to_csv_bytes(frame, sep):
+    """Строки части без заголовка в байтах (значения прочитаны как строки и не меняются)"""
+    return frame.to_csv(sep=sep, header=False, index=False).encode('utf-8')
+
+
+def _month_labels(codes):
+    uniques, inverse = np.unique(codes, return_inverse=True)
+    labels = np.array([period_label(code) if code != INVALID_PERIOD else UNKNOWN_MONTH for code in uniques],
+                      dtype=object)
+    return labels[inverse]
+
+
+def _split_regions(shard_path, sep, header_bytes, region_column):
+    """
+    Переупорядочивание шарда месяца по регионам
+
+    Шард месяца - это ~1/число_месяцев дампа, поэтому он читается целиком.
+    Строки каждого региона становятся непрерывным блоком.
+
+    Returns:
+    --------
+    dict
+        Регион -> [смещение блока, длина в байтах, строк]
+    """
+    df = pd.read_csv(shard_path, sep=sep, dtype=str, keep_default_na=False)
+    df = df.iloc[np.argsort(df[region_column].to_numpy(dtype=object), kind='stable')]
+    regions = {}
+    tmp_path = shard_path.with_name(shard_path.name + '.tmp')
+    with open(shard_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        dst.write(src.read(header_bytes))
+        offset = header_bytes
+        for region, block in df.groupby(region_column, sort=False):
+            data = _to_csv_bytes(block, sep)
+            dst.write(data)
+            regions[str(region)] = [offset, len(data), len(block)]
+            offset += len(data)
+    os.replace(tmp_path, shard_path)
+    return regions
+
+
+def partition_kill_dump(csv_path, partition_dir=None, by_region=False, chunk_size=1_000_000):
+    """
+    Разбиение дампа убийств на шарды по месяцам за один потоковый проход
+
+    Каждый месяц записывается в отдельный CSV (с заголовком исходного
+    файла), так что запрос за один месяц читает только его шард.
+    Значения переносятся как строки, без преобразования типов.
+    В index.json для каждого месяца хранятся число строк и размер шарда,
+    а при by_region=True строки шарда упорядочены по регионам и для
+    каждого региона хранится байтовый диапазон блока.
+
+    Parameters:
+    -----------
+    csv_path : str или Path
+        Путь к combined_kill_dump.csv
+    partition_dir : str или Path, optional
+        Директория шардов (по умолчанию columnar/<имя>.parts рядом с CSV)
+    by_region : bool
+        Дополнительно упорядочить каждый месяц по регионам
+    chunk_size : int
+        Число строк в одной части при чтении CSV
+
+    Returns:
+    --------
+    Path
+        Директория шардов
+    """
+    csv_path = Path(csv_path)
+    partition_dir = Path(partition_dir) if partition_dir else default_partition_dir(csv_path)
+    tmp_dir = partition_dir.with_name(partition_dir.name + '.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    source = file_fingerprint(csv_path)
+    plan = SchemaRegistry().plan('combined_kill', csv_path)
+    columns = plan.columns
+    if 'kill_time' not in columns:
+        raise ValueError(f"В {csv_path.name} не найден столбец со временем убийства")
+    if by_region and 'region' not in columns:
+        raise ValueError(f"В {csv_path.name} не найден столбец с регионом")
+
+    header = (plan.sep.join(plan.header) + '\n').encode('utf-8')
+    dates = DateParser()
+    shards = {}
+    partitions = {}
+    rows = 0
+    try:
+        with open(csv_path, 'rb') as f:
+            reader = pd.read_csv(f, sep=plan.sep, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                                 on_bad_lines='skip')
+            for chunk in reader:
+                rows += len(chunk)
+                times = chunk[columns['kill_time']]
+                codes = dates.period_codes(times.where(times != ''))
+                order = np.argsort(codes, kind='stable')
+                bounds = np.flatnonzero(np.diff(codes[order])) + 1
+                for rows_of_month in np.split(order, bounds):
+                    if len(rows_of_month) == 0:
+                        continue
+                    label = _month_labels(codes[rows_of_month[:1]])[0]
+                    if label not in shards:
+                        shards[label] = open(tmp_dir / f"{label}.csv", 'wb')
+                        shards[label].write(header)
+                        partitions[label] = {'file': f"{label}.csv", 'rows': 0, 'bytes': len(header)}
+                    data = _to_csv_bytes(chunk.iloc[rows_of_month], plan.sep)
+                    shards[label].write(data)
+                    partitions[label]['rows'] += len(rows_of_month)
+                    partitions[label]['bytes'] += len(data)
+    finally:
+        for shard in shards.values():
+            shard.close()
+
+    if by_region:
+        for label, partition in partitions.items():
+            partition['regions'] = _split_regions(tmp_dir / partition['file'], plan.sep, len(header),
+                                                  columns['region'])
+
+    index = {
+        'version': PARTITION_VERSION,
+        'source': source,
+        'rows': rows,
+        'sep': plan.sep,
+        'header': list(plan.header),
+        'header_bytes': len(header),
+        'columns': columns,
+        'by_region': by_region,
+        'partitions': dict(sorted(partitions.items())),
+    }
+    with open(tmp_dir / 'index.json', 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+
+    if partition_dir.exists():
+        shutil.rmtree(partition_dir)
+    os.replace(tmp_dir, partition_dir)
+    return partition_dir
+
+
+class KillPartitions:
+    """
+    Дамп убийств, разбитый по месяцам
+
+    Запросы открывают только шарды нужных месяцев, а при разбиении по
+    регионам читают только байтовые диапазоны нужных регионов.
+    """
+
+    def __init__(self, partition_dir):
+        self.partition_dir = Path(partition_dir)
+        with open(self.partition_dir / 'index.json', 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.sep = self.index['sep']
+        self.columns = self.index['columns']
+
+    def months(self):
+        return [label for label in self.index['partitions'] if label != UNKNOWN_MONTH]
+
+    def month_path(self, month):
+        """Путь к шарду месяца 'YYYY-MM' (None, если убийств за месяц нет)"""
+        partition = self.index['partitions'].get(month)
+        return self.partition_dir / partition['file'] if partition else None
+
+    def _selected_months(self, months=None, start=None, end=None):
+        selected = self.months() if months is None else [str(month)[:7] for month in months]
+        start = str(start)[:7] if start is not None else None
+        end = str(end)[:7] if end is not None else None
+        return [month for month in selected if month in self.index['partitions']
+                and (start is None or month >= start) and (end is None or month <= end)]
+
+    def ranges(self, months=None, regions=None, start=None, end=None):
+        """
+        Что нужно прочитать для запроса
+
+        Parameters:
+        -----------
+        months : list of str, optional
+            Месяцы 'YYYY-MM' (по умолчанию все)
+        regions : list of str, optional
+            Регионы (только при разбиении по регионам)
+        start, end : str, optional
+            Границы периода 'YYYY-MM' включительно
+
+        Returns:
+        --------
+        list of tuple
+            (путь к шарду, список (смещение, длина) или None - весь шард)
+        """
+        if regions is not None and not self.index['by_region']:
+            raise ValueError("Шарды не разбиты по регионам: пересоберите с by_region=True")
+        selected = []
+        for month in self._selected_months(months, start, end):
+            partition = self.index['partitions'][month]
+            path = self.partition_dir / partition['file']
+            if regions is None:
+                selected.append((path, None))
+                continue
+            blocks = [tuple(partition['regions'][str(region)][:2]) for region in regions
+                      if str(region) in partition['regions']]
+            if blocks:
+                selected.append((path, sorted(blocks)))
+        return selected
+
+    def scanned_bytes(self, months=None, regions=None, start=None, end=None):
+        """Сколько байт прочитает запрос"""
+        total = 0
+        for path, blocks in self.ranges(months, regions, start, end):
+            if blocks is None:
+                total += self.index['partitions'][path.stem]['bytes']
+            else:
+                total += self.index['header_bytes'] + sum(length for _, length in blocks)
+        return total
+
+    def total_bytes(self):
+        return sum(partition['bytes'] for partition in self.index['partitions'].values())
+
+    def _open(self, path, blocks):
+        if blocks is None:
+            return open(path, 'rb')
+        with open(path, 'rb') as f:
+            parts = [f.read(self.index['header_bytes'])]
+            for offset, length in blocks:
+                f.seek(offset)
+                parts.append(f.read(length))
+        return io.BytesIO(b''.join(parts))
+
+    def iter_chunks(self, months=None, regions=None, columns=None, chunk_size=1_000_000, start=None, end=None):
+        """
+        Потоковое чтение выбранных шардов по частям
+
+        columns - ключи схемы combined_kill ('isk_destroyed', 'region', ...)
+        или имена столбцов файла; по умолчанию читаются все столбцы.
+        """
+        usecols = None
+        if columns is not None:
+            usecols = [self.columns.get(column, column) for column in columns]
+        for path, blocks in self.ranges(months, regions, start, end):
+            with self._open(path, blocks) as f:
+                yield from pd.read_csv(f, sep=self.sep, usecols=usecols, chunksize=chunk_size,
+                                       on_bad_lines='skip')
+
+    def read(self, months=None, regions=None, columns=None, start=None, end=None):
+        """Выбранные шарды одним DataFrame"""
+        chunks = list(self.iter_chunks(months, regions, columns, start=start, end=end))
+        if not chunks:
+            usecols = [self.columns.get(column, column) for column in columns] if columns is not None \
+                else self.index['header']
+            return pd.DataFrame(columns=usecols)
+        return pd.concat(chunks, ignore_index=True)
+
+
+def is_partitioned_fresh(csv_path, partition_dir=None, by_region=False):
+    partition_dir = Path(partition_dir) if partition_dir else default_partition_dir(csv_path)
+    try:
+        with open(partition_dir / 'index.json', 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if index.get('version') != PARTITION_VERSION or (by_region and not index.get('by_region')):
+        return False
+    return file_fingerprint(csv_path, index['source'])['hash'] == index['source']['hash']
+
+
+def open_kill_partitions(csv_path=SUMMARY_TABLES_DIR / "combined_kill_dump.csv", partition_dir=None,
+                         by_region=False, rebuild=False):
+    """
+    Открытие шардов дампа убийств; разбиение выполняется, если шардов нет или дамп изменился
+
+    Returns:
+    --------
+    KillPartitions
+    """
+    partition_dir = Path(partition_dir) if partition_dir else default_partition_dir(csv_path)
+    if rebuild or not is_partitioned_fresh(csv_path, partition_dir, by_region):
+        print(f"Разбиение {Path(csv_path).name} по месяцам в {partition_dir}...")
+        partition_kill_dump(csv_path, partition_dir, by_region=by_region)
+    return KillPartitions(partition_dir)
+
+
+def main():
+    """Разбиение дампа убийств по месяцам: python kill_partitions.py [путь к дампу] [--by-region]"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    csv_path = Path(args[0]) if args else SUMMARY_TABLES_DIR / "combined_kill_dump.csv"
+
+    print("=" * 70)
+    print("РАЗБИЕНИЕ ДАМПА УБИЙСТВ ПО МЕСЯЦАМ")
+    print("=" * 70)
+    start = time.perf_counter()
+    partitions = open_kill_partitions(csv_path, by_region='--by-region' in sys.argv)
+    months = partitions.months()
+    print(f"Месяцев: {len(months)}, строк: {partitions.index['rows']:,} "
+          f"({time.perf_counter() - start:.1f} с)")
+    if not months:
+        return
+
+    month = months[-1]
+    total = partitions.total_bytes()
+    start = time.perf_counter()
+    df = partitions.read(months=[month], columns=['isk_destroyed'])
+    elapsed = time.perf_counter() - start
+    isk = pd.to_numeric(df.iloc[:, 0], errors='coerce').sum()
+    print(f"\n{month}: убийств {len(df):,}, потери {isk / 1e12:.2f} трлн ISK ({elapsed * 1000:.0f} мс)")
+    print(f"Прочитано {partitions.scanned_bytes(months=[month]) / total:.1%} байт дампа")
+
+
+if __name__ == "__main__":
+    main()
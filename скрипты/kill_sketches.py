@@ -0,0 +1,462 @@
+import os
+import sys
+import json
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from month_cache import file_fingerprint
+from schema_registry import SchemaRegistry
+from columnar_cache import SUMMARY_TABLES_DIR, COLUMNAR_SUBDIR
+from date_parsing import DateParser, period_label
+
+SKETCH_VERSION = 1
+
+# Параметр точности KLL: ошибка ранга порядка 1.7 / KLL_K (~1% при 200)
+KLL_K = 200
+KLL_C = 2 / 3
+# HyperLogLog: 2**HLL_P регистров, относительная ошибка ~1.04 / sqrt(2**HLL_P) (~0.8% при 14)
+HLL_P = 14
+# Разрезы, для которых ведутся скетчи; 'month_region' - месяц x регион (заметно больше памяти)
+SKETCH_LEVELS = ('all', 'month', 'region')
+SKETCH_COLUMNS = ['isk_destroyed', 'kill_time', 'region', 'victim', 'killmail_id']
+
+
+class KllSketch:
+    """
+    Потоковый скетч квантилей KLL
+
+    Значения копятся в уровнях-компакторах; переполненный уровень
+    сортируется, и каждый второй элемент (со случайным сдвигом) уходит на
+    следующий уровень с удвоенным весом. Память - O(k) независимо от числа
+    значений; скетчи с одинаковым k объединяются без потери гарантий.
+    """
+
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * KLL_C ** depth)), 2)
+
+    def update(self, values):
+        """Добавление пачки значений (пропуски игнорируются)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Объединение с другим скетчем (на месте)"""
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # При нечётной длине один элемент остаётся на уровне
+                keep = items[:1] if len(items) % 2 else items[:0]
+                paired = items[len(keep):]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Квантиль (или массив квантилей) q из [0, 1]"""
+        q = np.asarray(q, dtype=np.float64)
+        if self.n == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        items, cumulative = self._weighted()
+        position = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        values = items[np.minimum(position, len(items) - 1)]
+        values = np.where(q <= 0, self.min, np.where(q >= 1, self.max, values))
+        return values if q.ndim else float(values)
+
+    def rank(self, value):
+        """Доля значений не больше value"""
+        if self.n == 0:
+            return np.nan
+        items, cumulative = self._weighted()
+        position = np.searchsorted(items, value, side='right')
+        return float(cumulative[position - 1] / cumulative[-1]) if position else 0.0
+
+    def size(self):
+        return sum(len(items) for items in self.levels)
+
+
+def _register_ranks(hashes, p):
+    """Номер регистра и ранг (позиция первой единицы) для 64-битных хэшей"""
+    index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - p)) - 1)
+    # rest < 2**50 точно представим в float64, поэтому frexp даёт точную длину в битах
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    ranks = (64 - p) - bit_length + 1
+    return index, ranks.astype(np.uint8)
+
+
+class HyperLogLog:
+    """
+    Скетч числа различных значений HyperLogLog
+
+    Значения хэшируются (pd.util.hash_array, 64 бита); в каждом из 2**p
+    регистров хранится максимальный ранг. Объединение - поэлементный максимум.
+    """
+
+    def __init__(self, p=HLL_P, registers=None):
+        self.p = p
+        self.registers = registers if registers is not None else np.zeros(2 ** p, dtype=np.uint8)
+
+    def update(self, values):
+        values = pd.Series(values).dropna()
+        if values.empty:
+            return self
+        # Числа хэшируются как float64 (5, 5.0 и '5' - одно значение, как бы pandas
+        # ни прочитал столбец в этой части), остальное - как строки
+        if not pd.api.types.is_numeric_dtype(values):
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.notna().all():
+                values = numeric
+        if pd.api.types.is_numeric_dtype(values):
+            hashes = pd.util.hash_array(values.to_numpy(dtype=np.float64))
+        else:
+            hashes = pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+        index, ranks = _register_ranks(hashes, self.p)
+        np.maximum.at(self.registers, index, ranks)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            # Малые значения: линейный подсчёт по пустым регистрам
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+
+class KillSketches:
+    """
+    Набор скетчей по разрезам: квантили ISK одного убийства (KLL)
+    и число различных жертв (HyperLogLog)
+
+    Ключ - (уровень, значение): ('all', 'all'), ('month', '2020-01'),
+    ('region', 'The Forge'), ('month_region', '2020-01|The Forge').
+    """
+
+    def __init__(self, levels=SKETCH_LEVELS, k=KLL_K, p=HLL_P):
+        self.levels = tuple(levels)
+        self.k = k
+        self.p = p
+        self.quantiles = {}
+        self.distinct = {}
+        self.meta = {}
+
+    def _sketches(self, key):
+        if key not in self.quantiles:
+            self.quantiles[key] = KllSketch(self.k, seed=len(self.quantiles))
+            self.distinct[key] = HyperLogLog(self.p)
+        return self.quantiles[key], self.distinct[key]
+
+    def update(self, isk, distinct_values, months=None, regions=None):
+        """
+        Добавление пачки убийств
+
+        Parameters:
+        -----------
+        isk : array-like
+            ISK каждого убийства
+        distinct_values : array-like
+            Значения для подсчёта различных (жертва или номер убийства)
+        months, regions : array-like, optional
+            Метки месяца ('YYYY-MM') и региона для каждого убийства
+        """
+        isk = np.asarray(isk, dtype=np.float64)
+        # Тип столбца сохраняется: HyperLogLog хэширует числа иначе, чем строки
+        distinct_values = pd.Series(distinct_values).reset_index(drop=True)
+        groups = {'all': None, 'month': months, 'region': regions}
+        if months is not None and regions is not None:
+            groups['month_region'] = pd.Series(months).astype(str).to_numpy(dtype=object) + '|' + \
+                pd.Series(regions).astype(str).to_numpy(dtype=object)
+
+        for level in self.levels:
+            labels = groups.get(level)
+            if level == 'all':
+                quantiles, distinct = self._sketches(('all', 'all'))
+                quantiles.update(isk)
+                distinct.update(distinct_values)
+                continue
+            if labels is None:
+                continue
+            codes, uniques = pd.factorize(np.asarray(labels, dtype=object))
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            for i, label in enumerate(uniques):
+                rows = order[bounds[i]:bounds[i + 1]]
+                quantiles, distinct = self._sketches((level, str(label)))
+                quantiles.update(isk[rows])
+                distinct.update(distinct_values.iloc[rows])
+
+    def keys(self, level):
+        return sorted(value for lvl, value in self.quantiles if lvl == level)
+
+    def merged(self, level, values=None):
+        """
+        Объединённые скетчи уровня (все или только values)
+
+        Returns:
+        --------
+        tuple (KllSketch, HyperLogLog)
+        """
+        quantiles, distinct = KllSketch(self.k), HyperLogLog(self.p)
+        for value in (values if values is not None else self.keys(level)):
+            key = (level, str(value))
+            if key in self.quantiles:
+                quantiles.merge(self.quantiles[key])
+                distinct.merge(self.distinct[key])
+        return quantiles, distinct
+
+    def quantile(self, q, level='all', values=None):
+        """Квантиль ISK одного убийства по объединению скетчей уровня"""
+        return self.merged(level, values)[0].quantile(q)
+
+    def distinct_count(self, level='all', values=None):
+        """Оценка числа различных жертв по объединению скетчей уровня"""
+        return self.merged(level, values)[1].count()
+
+    def table(self, level, percentiles=(50, 90, 95, 99)):
+        """
+        Сводка уровня: число убийств с известным ISK, различных жертв и процентили ISK
+
+        Returns:
+        --------
+        pd.DataFrame
+            Индекс - значения уровня (месяцы, регионы)
+        """
+        rows = []
+        for value in self.keys(level):
+            quantiles = self.quantiles[(level, value)]
+            row = {level: value, 'kills': quantiles.n, 'distinct': round(self.distinct[(level, value)].count())}
+            row.update({f"p{q:g}": v for q, v in zip(percentiles, quantiles.quantile(np.array(percentiles) / 100))})
+            rows.append(row)
+        return pd.DataFrame(rows).set_index(level) if rows else pd.DataFrame()
+
+    def loss_thresholds(self, percentile=75, level='region'):
+        """
+        Порог «дорогого» убийства для каждого значения уровня по его скетчу
+
+        Аналог порога add_war_indicator, но по отдельным убийствам и в
+        ограниченной памяти: процентиль считается по скетчу, а не по дампу.
+        """
+        return pd.Series({value: self.quantiles[(level, value)].quantile(percentile / 100)
+                          for value in self.keys(level)}, name=f"p{percentile:g}", dtype=float)
+
+    def save(self, path, source=None):
+        """
+        Сохранение в <path>.npz (массивы) и <path>.json (ключи и параметры)
+
+        Все уровни KLL всех скетчей записываются одним массивом со
+        смещениями, регистры HLL - матрицей (скетчи x регистры).
+        """
+        path = Path(path)
+        keys = list(self.quantiles)
+        depth = max((len(self.quantiles[key].levels) for key in keys), default=1)
+        level_sizes = np.zeros((len(keys), depth), dtype=np.int64)
+        items = []
+        for i, key in enumerate(keys):
+            for level, level_items in enumerate(self.quantiles[key].levels):
+                level_sizes[i, level] = len(level_items)
+                items.append(level_items)
+        arrays = {
+            'kll_items': np.concatenate(items) if items else np.empty(0),
+            'kll_level_sizes': level_sizes,
+            'kll_n': np.array([self.quantiles[key].n for key in keys], dtype=np.int64),
+            'kll_min': np.array([self.quantiles[key].min for key in keys], dtype=np.float64),
+            'kll_max': np.array([self.quantiles[key].max for key in keys], dtype=np.float64),
+            'hll_registers': (np.stack([self.distinct[key].registers for key in keys])
+                              if keys else np.zeros((0, 2 ** self.p), dtype=np.uint8)),
+        }
+        tmp_path = path.with_name(path.name + '.tmp.npz')
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path.with_suffix('.npz'))
+
+        manifest = {'version': SKETCH_VERSION, 'k': self.k, 'p': self.p, 'levels': list(self.levels),
+                    'keys': [list(key) for key in keys], 'source': source, **self.meta}
+        tmp_path = path.with_name(path.name + '.tmp.json')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path.with_suffix('.json'))
+        return path.with_suffix('.npz')
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        with open(path.with_suffix('.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != SKETCH_VERSION:
+            raise ValueError(f"Неподдерживаемая версия скетчей: {manifest.get('version')}")
+        # Обращение к массиву NpzFile каждый раз заново распаковывает его - читаем всё один раз
+        with np.load(path.with_suffix('.npz')) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+
+        sketches = cls(manifest['levels'], manifest['k'], manifest['p'])
+        sketches.meta = {key: value for key, value in manifest.items()
+                         if key not in ('version', 'k', 'p', 'levels', 'keys', 'source')}
+        offset = 0
+        items = arrays['kll_items']
+        for i, key in enumerate(manifest['keys']):
+            key = tuple(key)
+            quantiles = KllSketch(sketches.k, seed=i)
+            quantiles.levels = []
+            for size in arrays['kll_level_sizes'][i]:
+                quantiles.levels.append(items[offset:offset + size].copy())
+                offset += size
+            while len(quantiles.levels) > 1 and len(quantiles.levels[-1]) == 0:
+                quantiles.levels.pop()
+            quantiles.n = int(arrays['kll_n'][i])
+            quantiles.min = float(arrays['kll_min'][i])
+            quantiles.max = float(arrays['kll_max'][i])
+            sketches.quantiles[key] = quantiles
+            sketches.distinct[key] = HyperLogLog(sketches.p, arrays['hll_registers'][i].copy())
+        return sketches
+
+
+def default_sketch_path(csv_path):
+    csv_path = Path(csv_path)
+    return csv_path.parent / COLUMNAR_SUBDIR / f"{csv_path.stem}_sketches"
+
+
+def build_sketches(csv_path, output_path=None, levels=SKETCH_LEVELS, chunk_size=1_000_000):
+    """
+    Скетчи дампа убийств за один потоковый проход
+
+    Память ограничена размером части и числом скетчей, а не размером дампа.
+    Различные значения считаются по жертве, если такой столбец есть,
+    иначе по номеру убийства.
+
+    Parameters:
+    -----------
+    csv_path : str или Path
+        Путь к combined_kill_dump.csv
+    output_path : str или Path, optional
+        Путь без расширения (по умолчанию columnar/<дамп>_sketches рядом с дампом)
+    levels : tuple of str
+        Разрезы: 'all', 'month', 'region', 'month_region'
+    chunk_size : int
+        Число строк в одной части при чтении CSV
+
+    Returns:
+    --------
+    KillSketches
+    """
+    csv_path = Path(csv_path)
+    output_path = Path(output_path) if output_path else default_sketch_path(csv_path)
+    plan = SchemaRegistry().plan('combined_kill', csv_path)
+    columns = plan.columns
+    if 'isk_destroyed' not in columns:
+        raise ValueError(f"В {csv_path.name} не найден столбец с уничтоженными ISK")
+    distinct_key = 'victim' if 'victim' in columns else 'killmail_id' if 'killmail_id' in columns else None
+
+    sketches = KillSketches(levels)
+    dates = DateParser()
+    rows = 0
+    with open(csv_path, 'rb') as f:
+        reader = pd.read_csv(f, sep=plan.sep, usecols=plan.usecols_for(SKETCH_COLUMNS), chunksize=chunk_size,
+                             on_bad_lines='skip')
+        for chunk in reader:
+            rows += len(chunk)
+            months = _labels(dates.period_codes(chunk[columns['kill_time']])) if 'kill_time' in columns else None
+            regions = chunk[columns['region']].fillna('(неизвестно)').to_numpy(dtype=object) \
+                if 'region' in columns else None
+            # Без идентификаторов различными считаются строки (номер строки дампа)
+            distinct_values = chunk[columns[distinct_key]] if distinct_key else chunk.index.to_numpy()
+            sketches.update(pd.to_numeric(chunk[columns['isk_destroyed']], errors='coerce'),
+                            distinct_values, months, regions)
+
+    sketches.meta = {'rows': rows, 'distinct_column': columns.get(distinct_key)}
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    sketches.save(output_path, source=file_fingerprint(csv_path))
+    return sketches
+
+
+def _labels(codes):
+    """Коды месяцев -> подписи 'YYYY-MM' (подпись считается один раз на месяц)"""
+    uniques, inverse = np.unique(codes, return_inverse=True)
+    labels = np.array([period_label(code) if code >= 0 else 'unknown' for code in uniques], dtype=object)
+    return labels[inverse]
+
+
+def open_sketches(csv_path=SUMMARY_TABLES_DIR / "combined_kill_dump.csv", output_path=None, rebuild=False):
+    """Загрузка скетчей; пересчёт, если их нет или дамп изменился"""
+    output_path = Path(output_path) if output_path else default_sketch_path(csv_path)
+    if not rebuild:
+        try:
+            sketches = KillSketches.load(output_path)
+            with open(output_path.with_suffix('.json'), 'r', encoding='utf-8') as f:
+                source = json.load(f)['source']
+            if source and file_fingerprint(csv_path, source)['hash'] == source['hash']:
+                return sketches
+        except (OSError, ValueError, KeyError):
+            pass
+    print(f"Построение скетчей {Path(csv_path).name}...")
+    return build_sketches(csv_path, output_path)
+
+
+def main():
+    """Скетчи дампа убийств: python kill_sketches.py [путь к дампу]"""
+    csv_path = Path(sys.argv[1]) if len(sys.argv) > 1 else SUMMARY_TABLES_DIR / "combined_kill_dump.csv"
+
+    print("=" * 70)
+    print("СКЕТЧИ ДАМПА УБИЙСТВ: КВАНТИЛИ (KLL) И ЧИСЛО РАЗЛИЧНЫХ (HLL)")
+    print("=" * 70)
+    start = time.perf_counter()
+    sketches = open_sketches(csv_path)
+    print(f"Скетчей: {len(sketches.quantiles)} ({time.perf_counter() - start:.1f} с)")
+
+    table = sketches.table('month')
+    if not table.empty:
+        print("\nПо месяцам:")
+        print(table.to_string(float_format=lambda v: f"{v:,.0f}"))
+    print(f"\n95-й процентиль убийства за всё время: {sketches.quantile(0.95):,.0f} ISK")
+    print(f"Различных жертв за всё время: {sketches.distinct_count():,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+
+# Версия формата кэша: при изменении логики извлечения её нужно увеличить,
+# тогда все старые записи будут считаться устаревшими
+CACHE_VERSION = 2
+
+
+def file_fingerprint(file_path, previous=None):
+    """
+    Отпечаток файла: размер, время изменения и хэш содержимого
+
+    Parameters:
+    -----------
+    file_path : Path
+        Путь к файлу
+    previous : dict, optional
+        Ранее сохранённый отпечаток. Если размер и время изменения совпадают,
+        хэш берётся из него и файл повторно не читается
+    """
+    # Файлы внутри архива считают отпечаток сами, по оглавлению ZIP
+    if hasattr(file_path, 'fingerprint'):
+        return file_path.fingerprint(previous)
+
+    stat = os.stat(file_path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    if previous and previous.get('size') == fingerprint['size'] \
+            and previous.get('mtime_ns') == fingerprint['mtime_ns'] and previous.get('hash'):
+        fingerprint['hash'] = previous['hash']
+        return fingerprint
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    fingerprint['hash'] = digest.hexdigest()
+    return fingerprint
+
+
+class MonthResultCache:
+    """
+    Постоянный кэш результатов process_month_fixed
+
+    Каждая запись хранится в отдельном JSON-файле и привязана к месяцу,
+    отпечаткам всех CSV-файлов папки месяца и настройкам консолидатора,
+    от которых зависит результат. Если хотя бы один файл изменился,
+    появился или пропал или изменились настройки, запись считается устаревшей.
+    """
+
+    def __init__(self, cache_dir, force_rebuild=False):
+        """
+        Parameters:
+        -----------
+        cache_dir : str или Path
+            Директория для файлов кэша
+        force_rebuild : bool
+            Полностью очистить кэш перед использованием
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+        if force_rebuild:
+            self.clear()
+
+    def entry_path(self, folder_name):
+        return self.cache_dir / f"{folder_name}.json"
+
+    def read_entry(self, folder_name):
+        """Чтение записи кэша (None, если её нет или она повреждена)"""
+        path = self.entry_path(folder_name)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != CACHE_VERSION:
+            return None
+        return entry
+
+    def source_fingerprints(self, folder_path, previous=None, extra_files=None):
+        """Отпечатки всех CSV-файлов папки месяца (каталог или папка в архиве) и extra_files"""
+        previous = previous or {}
+        fingerprints = {}
+        for file_path in sorted(folder_path.glob('*.csv'), key=lambda p: p.name):
+            fingerprints[file_path.name] = file_fingerprint(file_path, previous.get(file_path.name))
+        for name, file_path in (extra_files or {}).items():
+            fingerprints[name] = file_fingerprint(file_path, previous.get(name))
+        return fingerprints
+
+    def lookup(self, folder_path, date_str, extra_files=None, settings=None):
+        """
+        Поиск результата месяца в кэше
+
+        extra_files - источники вне папки месяца (имя -> путь), от которых
+        тоже зависит результат (например, шард сводного дампа убийств);
+        settings - настройки, влияющие на результат (режим истории производства и т.п.)
+
+        Returns:
+        --------
+        tuple (month_data или None, fingerprints)
+            Отпечатки возвращаются всегда, чтобы после обработки
+            месяца не считать их повторно
+        """
+        entry = self.read_entry(folder_path.name)
+        previous = entry['sources'] if entry else None
+        fingerprints = self.source_fingerprints(folder_path, previous, extra_files)
+
+        if entry and entry.get('date') == date_str and entry['sources'] == fingerprints \
+                and entry.get('settings') == (settings or {}):
+            self.hits += 1
+            return entry['result'], fingerprints
+
+        self.misses += 1
+        return None, fingerprints
+
+    def store(self, folder_path, date_str, fingerprints, month_data, settings=None):
+        """Сохранение результата месяца (атомарная запись через временный файл)"""
+        folder_name = folder_path.name
+        entry = {
+            'version': CACHE_VERSION,
+            'date': date_str,
+            'sources': fingerprints,
+            'settings': settings or {},
+            'result': month_data,
+        }
+        path = self.entry_path(folder_name)
+        tmp_path = path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        """Полная инвалидация кэша"""
+        for path in self.cache_dir.glob('*.json'):
+            path.unlink()
@@ -0,0 +1,243 @@
+import io
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from schema_registry import SchemaRegistry
+from consolidation_profiler import DISABLED, file_size
+
+# Сколько следующих месяцев читается заранее
+PREFETCH_MONTHS = 2
+# Общий объём буферов предзагрузки; файлы больше него читаются как обычно
+PREFETCH_BUDGET = 512 << 20
+PREFETCH_THREADS = 4
+# Файлы папки месяца, которые читает process_month_fixed
+MONTH_KINDS = ('production', 'trade', 'kill', 'money')
+
+
+def _read_all(source):
+    with source.open('rb') as f:
+        return f.read()
+
+
+class PrefetchedFile:
+    """
+    Файл, заранее прочитанный в память, с интерфейсом исходного файла (Path или ArchiveMember)
+
+    open() отдаёт поток из буфера, остальные атрибуты берутся у исходного файла.
+    """
+
+    def __init__(self, source, data):
+        self.source = source
+        self.data = data
+        self._fingerprint = None
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('source', 'data'):
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def __fspath__(self):
+        return os.fspath(self.source)
+
+    def __str__(self):
+        return str(self.source)
+
+    def __repr__(self):
+        return f"PrefetchedFile({self.source!r}, {len(self.data)} байт)"
+
+    @property
+    def member_name(self):
+        return getattr(self.source, 'member_name', str(self.source))
+
+    def exists(self):
+        return True
+
+    def open(self, mode='rb'):
+        """Поток из буфера (без обращения к диску)"""
+        if mode != 'rb':
+            raise ValueError("Предзагруженные файлы открываются только в режиме 'rb'")
+        return io.BytesIO(self.data)
+
+    def fingerprint(self, previous=None):
+        """
+        Отпечаток, как у file_fingerprint
+
+        Для файла на диске хэш считается по буферу (без повторного чтения)
+        и только при первом запросе; при совпадении размера и времени
+        изменения с previous берётся из него. Ключи кэшей разбора
+        (schema_registry.file_key) строятся по os.stat и хэш не запрашивают.
+        """
+        if hasattr(self.source, 'fingerprint'):
+            return self.source.fingerprint(previous)
+        if self._fingerprint is None:
+            fingerprint = {'size': len(self.data), 'mtime_ns': os.stat(self.source).st_mtime_ns}
+            if previous and previous.get('size') == fingerprint['size'] \
+                    and previous.get('mtime_ns') == fingerprint['mtime_ns'] and previous.get('hash'):
+                fingerprint['hash'] = previous['hash']
+            else:
+                fingerprint['hash'] = hashlib.blake2b(self.data, digest_size=16).hexdigest()
+            self._fingerprint = fingerprint
+        return self._fingerprint
+
+
+class PrefetchedFolder:
+    """Папка месяца, часть файлов которой уже в памяти (интерфейс, как у Path)"""
+
+    def __init__(self, folder_path, files):
+        self.folder_path = folder_path
+        self.files = files
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('folder_path', 'files'):
+            raise AttributeError(name)
+        return getattr(self.folder_path, name)
+
+    def __truediv__(self, name):
+        return self.files.get(name) or self.folder_path / name
+
+    def __repr__(self):
+        return f"PrefetchedFolder({self.folder_path!r}, {sorted(self.files)})"
+
+    @property
+    def name(self):
+        return self.folder_path.name
+
+
+class MonthPrefetcher:
+    """
+    Конвейерное чтение папок месяцев
+
+    Пока разбирается текущий месяц, фоновые потоки читают в память файлы
+    следующих depth месяцев. Суммарный размер буферов не превышает budget:
+    чтение ждёт, пока разобранные месяцы освободят место, а файлы больше
+    бюджета не предзагружаются. Всё, что не успело прочитаться к началу
+    разбора месяца, читается обычным образом, поэтому разбор никогда не
+    ждёт планировщик, только уже начатые чтения.
+    """
+
+    def __init__(self, kinds=MONTH_KINDS, depth=PREFETCH_MONTHS, budget=PREFETCH_BUDGET,
+                 threads=PREFETCH_THREADS, schema_registry=None, profiler=DISABLED):
+        """
+        Parameters:
+        -----------
+        kinds : tuple или callable
+            Типы файлов схемы для предзагрузки или функция (папка, дата) -> типы
+        depth : int
+            Сколько месяцев вперёд читать
+        budget : int
+            Предел суммарного размера буферов, байт
+        threads : int
+            Число потоков чтения
+        schema_registry : SchemaRegistry, optional
+            Реестр для поиска файлов в папке
+        profiler : StageProfiler, optional
+            Ожидание буферов записывается этапом prefetch_wait
+        """
+        self.kinds = kinds
+        self.depth = depth
+        self.budget = budget
+        self.threads = threads
+        self.schema_registry = schema_registry or SchemaRegistry()
+        self.profiler = profiler
+        self.stats = {'files': 0, 'bytes': 0, 'over_budget': 0, 'failed': 0}
+        self._cond = threading.Condition()
+        self._months = {}
+        self._reserved = 0
+        self._current = -1
+        self._closed = False
+
+    def month_files(self, folder_path, date_str):
+        kinds = self.kinds(folder_path, date_str) if callable(self.kinds) else self.kinds
+        files = []
+        for kind in kinds:
+            file_path = self.schema_registry.find_file(folder_path, kind)
+            if file_path is not None:
+                files.append(file_path)
+        return files
+
+    def _schedule(self, tasks, executor):
+        """Фоновый планировщик: месяцы по порядку, не дальше depth от текущего"""
+        for index, (folder_path, date_str) in enumerate(tasks):
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or index <= self._current + self.depth)
+                if self._closed:
+                    return
+                if index <= self._current:
+                    continue
+            try:
+                sources = [(source, file_size(source)) for source in self.month_files(folder_path, date_str)]
+            except OSError:
+                continue  # папка недоступна - месяц прочитается обычным образом
+
+            for source, size in sources:
+                with self._cond:
+                    if size > self.budget:
+                        self.stats['over_budget'] += 1
+                        continue
+                    self._cond.wait_for(lambda: self._closed or index <= self._current
+                                        or self._reserved + size <= self.budget)
+                    if self._closed:
+                        return
+                    if index <= self._current:
+                        break
+                    self._reserved += size
+                    future = executor.submit(_read_all, source)
+                    self._months.setdefault(index, {})[source.name] = (source, future, size)
+
+    def _release(self, index):
+        for _, future, size in self._months.pop(index, {}).values():
+            future.cancel()
+            self._reserved -= size
+        self._cond.notify_all()
+
+    def iterate(self, tasks):
+        """
+        Месяцы по порядку задач
+
+        Parameters:
+        -----------
+        tasks : list of tuple
+            (папка месяца, дата)
+
+        Yields:
+        -------
+        tuple (PrefetchedFolder, дата)
+        """
+        tasks = list(tasks)
+        executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='month_prefetch')
+        scheduler = threading.Thread(target=self._schedule, args=(tasks, executor), daemon=True)
+        scheduler.start()
+        try:
+            for index, (folder_path, date_str) in enumerate(tasks):
+                with self._cond:
+                    self._release(index - 1)
+                    self._current = index
+                    pending = dict(self._months.get(index, {}))
+                    self._cond.notify_all()
+
+                files = {}
+                with self.profiler.stage('prefetch_wait'):
+                    for name, (source, future, _) in pending.items():
+                        try:
+                            files[name] = PrefetchedFile(source, future.result())
+                        except Exception:
+                            self.stats['failed'] += 1  # файл прочитается обычным образом
+                            continue
+                        self.stats['files'] += 1
+                        self.stats['bytes'] += len(files[name].data)
+                yield PrefetchedFolder(folder_path, files), date_str
+                # Буферы разобранного месяца не должны дожить до следующего
+                files = pending = None
+        finally:
+            with self._cond:
+                self._closed = True
+                for index in list(self._months):
+                    self._release(index)
+            scheduler.join()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def summary(self):
+        return (f"Предзагрузка: файлов из памяти {self.stats['files']} "
+                f"({self.stats['bytes'] / 2**20:.1f} МБ), больше бюджета {self.stats['over_budget']}, "
+                f"ошибок чтения {self.stats['failed']}")
@@ -0,0 +1,159 @@
+import pandas as pd
+from schema_registry import file_key
+from consolidation_profiler import DISABLED
+from date_parsing import detect_date_format, parse_dates, period_codes
+
+PREVIEW_ROWS = 3
+
+
+class MonthlyHistory:
+    """
+    Разобранный файл истории производства, сгруппированный по месяцам
+
+    Хранит только месячные суммы и несколько первых строк каждого месяца
+    для отладочного вывода, поэтому занимает мало памяти.
+    """
+
+    def __init__(self, label, rows, columns, date_column, source_columns, sums, counts, previews,
+                 date_format=None):
+        self.label = label
+        self.rows = rows
+        self.columns = columns
+        self.date_column = date_column
+        # Ключ результата (production_isk и т.д.) -> фактическое имя столбца в файле
+        self.source_columns = source_columns
+        self.sums = sums
+        self.counts = counts
+        self.previews = previews
+        # Формат дат, определённый по файлу (None - разбор pandas без формата)
+        self.date_format = date_format
+        # Ключ файла: путь, размер и время изменения (заполняет ProductionHistoryIndex.load)
+        self.source_key = None
+
+    def covers(self, period):
+        return period in self.counts.index
+
+    def record_count(self, period):
+        return int(self.counts.get(period, 0))
+
+    def month_sums(self, period):
+        """Суммы показателей за месяц: ключ результата -> значение"""
+        if not self.covers(period):
+            return {}
+        row = self.sums.loc[period]
+        return {key: float(row[key]) for key in self.source_columns}
+
+
+def summarize_history(plan, label=None, profiler=DISABLED):
+    """
+    Однократный разбор файла истории: даты переводятся в коды месяцев
+    (см. date_parsing), суммы всех показателей считаются одной группировкой
+
+    Parameters:
+    -----------
+    plan : ColumnPlan
+        План чтения файла ProducedDestroyedMined.csv из реестра схем;
+        читаются только дата и найденные столбцы показателей
+    label : str, optional
+        Подпись файла для лога
+    profiler : StageProfiler, optional
+        Профайлер консолидации (чтение, разбор дат и группировка - отдельные этапы)
+
+    Returns:
+    --------
+    MonthlyHistory
+    """
+    file_path = plan.file_path
+    with profiler.stage('read_csv', file='production'):
+        with file_path.open('rb') as f:
+            df = pd.read_csv(f, sep=plan.sep, usecols=plan.usecols)
+    profiler.count_file('production', file_path, rows=len(df))
+
+    columns = plan.header
+    date_column = plan.columns.get('date')
+    source_columns = {key: col for key, col in plan.columns.items() if key != 'date'}
+
+    empty = pd.Series(dtype='int64')
+    if date_column is None:
+        return MonthlyHistory(label or file_path.name, len(df), columns, None,
+                              source_columns, pd.DataFrame(), empty, {})
+
+    # Формат определяется один раз по началу файла; для ISO-дат коды месяцев
+    # считаются прямо по строкам, без создания дат
+    with profiler.stage('parse_dates'):
+        date_format = detect_date_format(df[date_column])
+        codes = period_codes(df[date_column], date_format)
+        valid = codes >= 0
+        periods = pd.Series(codes[valid], index=df.index[valid])
+
+    with profiler.stage('group_by_month'):
+        metrics = pd.DataFrame({key: df.loc[valid, col] for key, col in source_columns.items()},
+                               index=periods.index)
+        grouped = metrics.groupby(periods.values)
+        sums = grouped.sum()
+        counts = grouped.size()
+
+    # Первые строки каждого месяца (для отладочного вывода); даты разбираются только для них
+    previews = {}
+    production_col = source_columns.get('production_isk')
+    head = periods.groupby(periods.values).head(PREVIEW_ROWS)
+    head_dates = parse_dates(df.loc[head.index, date_column], date_format)
+    for idx in head.index:
+        value = df.at[idx, production_col] if production_col else 'N/A'
+        date = head_dates[idx]
+        previews.setdefault(int(periods[idx]), []).append((date.date() if pd.notna(date) else date, value))
+
+    return MonthlyHistory(label or file_path.name, len(df), columns, date_column,
+                          source_columns, sums, counts, previews, date_format)
+
+
+class ProductionHistoryIndex:
+    """
+    Индекс разобранных файлов истории производства
+
+    Каждый файл разбирается один раз; ключ - путь, размер и время изменения
+    (см. schema_registry.file_key), так что содержимое до разбора не читается.
+    В общем режиме (assign_shared) одна история обслуживает все месяцы,
+    которые она покрывает, и файлы остальных месяцев вообще не читаются.
+    """
+
+    def __init__(self, profiler=None):
+        self._histories = {}
+        self._shared = {}
+        self.profiler = profiler or DISABLED
+
+    def load(self, plan, label=None):
+        key = '|'.join(map(str, file_key(plan.file_path)))
+        if key not in self._histories:
+            self._histories[key] = summarize_history(plan, label, self.profiler)
+            self._histories[key].source_key = key
+        return self._histories[key]
+
+    def assign_shared(self, history_files):
+        """
+        Подбор общей истории для каждого месяца
+
+        Parameters:
+        -----------
+        history_files : list of (period, plan, label)
+            Файлы истории по месяцам (plan - None, если своего файла нет или
+            он не читается). Разбор идёт от новых месяцев к старым: месяц,
+            покрытый уже разобранной (более свежей) историей, свой файл не читает
+        """
+        self._shared = {}
+        parsed = []
+        for period, plan, label in sorted(history_files, key=lambda item: item[0], reverse=True):
+            history = next((h for h in parsed if h.covers(period)), None)
+            if history is None:
+                if plan is None:
+                    continue
+                try:
+                    history = self.load(plan, label)
+                except Exception:
+                    continue  # месяц прочитает свой файл и запишет ошибку в лог
+                parsed.append(history)
+            if history.covers(period):
+                self._shared[period] = history
+
+    def shared_history(self, period):
+        return self._shared.get(period)
@@ -0,0 +1,275 @@
+import sys
+import json
+import time
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+from month_cache import file_fingerprint
+from schema_registry import SchemaRegistry
+from columnar_cache import (SUMMARY_TABLES_DIR, SUMMARY_TABLES, COLUMNAR_SUBDIR, columnar_paths, convert_table,
+                           is_fresh, read_meta, pa)
+
+try:
+    import duckdb
+except ImportError:  # без duckdb таблицы импортируются в постоянную базу SQLite
+    duckdb = None
+
+PREPARED_DATA_DIR = Path(__file__).resolve().parent.parent / "данные" / "Подготовленные данные"
+CONSOLIDATED_PATH = PREPARED_DATA_DIR / "eve_consolidated_data_final.csv"
+CONSOLIDATED_TABLE = "consolidated"
+# В SQLite индексируются столбцы, в имени которых есть эти части (фильтры по периоду и региону)
+INDEXED_NAME_PARTS = ('date', 'time', 'month', 'region')
+IMPORT_CHUNK_SIZE = 200_000
+
+
+def default_catalog_path(backend):
+    suffix = '.duckdb' if backend == 'duckdb' else '.sqlite'
+    return SUMMARY_TABLES_DIR / COLUMNAR_SUBDIR / f"eve_catalog{suffix}"
+
+
+def _quote(name):
+    """Имя таблицы или столбца в SQL"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _literal(value):
+    """Строковая константа SQL (пути к файлам)"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class QueryCatalog:
+    """
+    Постоянный SQL-каталог консолидированных данных и сводных таблиц
+
+    Таблицы: consolidated (eve_consolidated_data_final.csv) и сводные
+    таблицы из SUMMARY_TABLES под своими именами (combined_kill_dump и др.).
+    Запрос выполняется внутри движка, в Python попадает только результат.
+
+    С duckdb таблицы - представления над файлами: над свежей колоночной
+    копией Parquet (см. columnar_cache), если есть pyarrow, иначе над CSV.
+    Движок читает только нужные столбцы, а фильтры проверяет по
+    статистикам групп строк Parquet, пропуская лишние.
+
+    Без duckdb таблицы один раз импортируются в файл SQLite и
+    переимпортируются только при изменении исходного CSV; по столбцам
+    дат и регионов строятся индексы, так что фильтры по периоду и региону
+    не просматривают всю таблицу.
+    """
+
+    def __init__(self, db_path=None, tables_dir=SUMMARY_TABLES_DIR, consolidated_path=CONSOLIDATED_PATH,
+                 backend=None):
+        """
+        Parameters:
+        -----------
+        db_path : str или Path, optional
+            Файл базы (по умолчанию columnar/eve_catalog.duckdb / .sqlite в директории сводных таблиц)
+        tables_dir : str или Path
+            Директория сводных таблиц
+        consolidated_path : str или Path
+            Путь к eve_consolidated_data_final.csv
+        backend : str, optional
+            'duckdb' или 'sqlite'; по умолчанию duckdb, если он установлен
+        """
+        if backend is None:
+            backend = 'duckdb' if duckdb is not None else 'sqlite'
+        if backend not in ('duckdb', 'sqlite'):
+            raise ValueError(f"Неизвестный движок: {backend}")
+        if backend == 'duckdb' and duckdb is None:
+            raise ImportError("Для backend='duckdb' нужен пакет duckdb")
+
+        self.backend = backend
+        self.db_path = Path(db_path) if db_path else default_catalog_path(backend)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.sources = {CONSOLIDATED_TABLE: Path(consolidated_path)}
+        self.sources.update({name: Path(tables_dir) / f"{name}.csv" for name in SUMMARY_TABLES})
+        self.schema_registry = SchemaRegistry()
+
+        if backend == 'duckdb':
+            self.connection = duckdb.connect(str(self.db_path))
+        else:
+            self.connection = sqlite3.connect(self.db_path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS _catalog (name TEXT PRIMARY KEY, source TEXT, "
+                                "fingerprint TEXT, storage TEXT, row_count BIGINT, updated TEXT)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _entry(self, name):
+        row = self.connection.execute("SELECT fingerprint, storage FROM _catalog WHERE name = ?", [name]).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def _set_entry(self, name, source, fingerprint, storage, rows):
+        self.connection.execute("DELETE FROM _catalog WHERE name = ?", [name])
+        self.connection.execute("INSERT INTO _catalog VALUES (?, ?, ?, ?, ?, ?)",
+                                [name, str(source), json.dumps(fingerprint), storage, rows,
+                                 datetime.now().isoformat(timespec='seconds')])
+        if self.backend == 'sqlite':
+            self.connection.commit()
+
+    def _drop(self, name):
+        kind = 'VIEW' if self.backend == 'duckdb' else 'TABLE'
+        self.connection.execute(f"DROP {kind} IF EXISTS {_quote(name)}")
+        self.connection.execute("DELETE FROM _catalog WHERE name = ?", [name])
+        if self.backend == 'sqlite':
+            self.connection.commit()
+
+    def refresh(self, convert=True):
+        """
+        Регистрация таблиц: новые и изменённые файлы подключаются заново,
+        пропавшие удаляются из каталога
+
+        Parameters:
+        -----------
+        convert : bool
+            (duckdb) создать или обновить колоночную копию Parquet перед регистрацией
+
+        Returns:
+        --------
+        dict
+            Имя таблицы -> состояние ('обновлена', 'актуальна', 'нет файла')
+        """
+        status = {}
+        for name, csv_path in self.sources.items():
+            entry = self._entry(name)
+            if not csv_path.exists():
+                if entry is not None:
+                    self._drop(name)
+                status[name] = 'нет файла'
+                continue
+
+            fingerprint = file_fingerprint(csv_path, entry[0] if entry else None)
+            if self.backend == 'duckdb':
+                if convert and pa is not None and not is_fresh(csv_path):
+                    convert_table(csv_path)
+                storage, rows = self._register_view(name, csv_path)
+                changed = entry is None or entry[0]['hash'] != fingerprint['hash'] or entry[1] != storage
+            else:
+                changed = entry is None or entry[0]['hash'] != fingerprint['hash']
+                if changed:
+                    storage, rows = self._import_table(name, csv_path)
+            if changed:
+                self._set_entry(name, csv_path, fingerprint, storage, rows)
+            status[name] = 'обновлена' if changed else 'актуальна'
+        return status
+
+    def _register_view(self, name, csv_path):
+        """Представление duckdb над колоночной копией или над CSV"""
+        if pa is not None and is_fresh(csv_path):
+            parquet_path, meta_path = columnar_paths(csv_path)
+            source, storage, rows = f"read_parquet({_literal(parquet_path)})", 'parquet', read_meta(meta_path)['rows']
+        else:
+            sep, _ = self.schema_registry.read_header(csv_path, True)
+            source, storage, rows = f"read_csv_auto({_literal(csv_path)}, delim={_literal(sep)})", 'csv', None
+        self.connection.execute(f"CREATE OR REPLACE VIEW {_quote(name)} AS SELECT * FROM {source}")
+        return storage, rows
+
+    def _import_table(self, name, csv_path):
+        """
+        Потоковый импорт CSV в таблицу SQLite
+
+        Данные пишутся во временную таблицу, которая заменяет прежнюю
+        только после успешного импорта.
+        """
+        sep, header = self.schema_registry.read_header(csv_path, True)
+        tmp_name = f"{name}__import"
+        self.connection.execute(f"DROP TABLE IF EXISTS {_quote(tmp_name)}")
+        rows = 0
+        for chunk in pd.read_csv(csv_path, sep=sep, chunksize=IMPORT_CHUNK_SIZE, low_memory=False):
+            chunk.to_sql(tmp_name, self.connection, if_exists='append', index=False)
+            rows += len(chunk)
+        if rows == 0:
+            pd.read_csv(csv_path, sep=sep, nrows=0).to_sql(tmp_name, self.connection, index=False)
+
+        self.connection.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+        self.connection.execute(f"ALTER TABLE {_quote(tmp_name)} RENAME TO {_quote(name)}")
+        for column in header:
+            if any(part in str(column).lower() for part in INDEXED_NAME_PARTS):
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {_quote(f'ix_{name}_{column}')} "
+                                        f"ON {_quote(name)} ({_quote(column)})")
+        self.connection.execute(f"ANALYZE {_quote(name)}")
+        self.connection.commit()
+        return 'table', rows
+
+    def tables(self):
+        """Зарегистрированные таблицы: способ хранения, число строк, время обновления, источник"""
+        return self.query("SELECT name, storage, row_count, updated, source FROM _catalog ORDER BY name")
+
+    def query(self, sql, params=None):
+        """
+        Выполнение SQL-запроса
+
+        Parameters:
+        -----------
+        sql : str
+            Запрос (таблицы - по именам из каталога)
+        params : list, optional
+            Значения для параметров '?'
+
+        Returns:
+        --------
+        pd.DataFrame
+        """
+        if self.backend == 'duckdb':
+            return self.connection.execute(sql, params or []).df()
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def explain(self, sql):
+        """План запроса (видно, какие столбцы читаются и какие фильтры проталкиваются)"""
+        prefix = 'EXPLAIN' if self.backend == 'duckdb' else 'EXPLAIN QUERY PLAN'
+        plan = self.query(f"{prefix} {sql}")
+        return '\n'.join(plan.iloc[:, -1].astype(str))
+
+
+def open_catalog(db_path=None, backend=None, **kwargs):
+    """Открытие каталога с обновлением изменившихся таблиц"""
+    catalog = QueryCatalog(db_path, backend=backend, **kwargs)
+    catalog.refresh()
+    return catalog
+
+
+def kills_by_month_sql(catalog):
+    """Пример запроса: убийства и потери по месяцам из дампа убийств (None, если дампа нет)"""
+    csv_path = catalog.sources['combined_kill_dump']
+    if not csv_path.exists():
+        return None
+    columns = catalog.schema_registry.plan('combined_kill', csv_path).columns
+    if 'kill_time' not in columns or 'isk_destroyed' not in columns:
+        return None
+    month = f"substr(CAST({_quote(columns['kill_time'])} AS VARCHAR), 1, 7)"
+    return (f"SELECT {month} AS month, count(*) AS kills, sum({_quote(columns['isk_destroyed'])}) AS isk_destroyed "
+            f"FROM combined_kill_dump GROUP BY 1 ORDER BY 1")
+
+
+def main():
+    """SQL по данным проекта: python query_layer.py ["SELECT ..."]"""
+    print("=" * 70)
+    print("SQL-КАТАЛОГ ДАННЫХ EVE ONLINE")
+    print("=" * 70)
+    start = time.perf_counter()
+    with QueryCatalog() as catalog:
+        status = catalog.refresh()
+        print(f"Движок: {catalog.backend}, база: {catalog.db_path} ({time.perf_counter() - start:.1f} с)")
+        for name, state in status.items():
+            print(f"  {name}: {state}")
+
+        sql = sys.argv[1] if len(sys.argv) > 1 else kills_by_month_sql(catalog)
+        if sql is None:
+            print("\nДамп убийств не найден; передайте запрос аргументом")
+            return
+        start = time.perf_counter()
+        result = catalog.query(sql)
+        print(f"\n{sql}\n")
+        print(result.to_string(index=False))
+        print(f"\nСтрок: {len(result)} ({time.perf_counter() - start:.2f} с)")
+
+
+if __name__ == "__main__":
+    main()
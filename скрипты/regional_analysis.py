@@ -0,0 +1,209 @@
+import time
+from pathlib import Path
+import pandas as pd
+from columnar_cache import SUMMARY_TABLES_DIR, load_table
+from schema_registry import SchemaRegistry
+from correlation_service import grouped_spearman
+from date_parsing import detect_date_format, parse_dates
+
+# Показатели регионального анализа (используются те, что есть в таблице)
+REGION_METRICS = ['total_isk_destroyed', 'production_isk', 'trade_value',
+                  'mining_isk', 'isk_velocity', 'kill_count']
+STATISTICS = ['mean', 'median', 'std', 'min', 'max', 'nunique']
+WAR_PERCENTILE = 75
+RESULTS_DIR = Path(__file__).resolve().parent.parent / "Результаты анализа"
+
+
+def load_region_month(csv_path=SUMMARY_TABLES_DIR / "summary_by_region_month.csv", war_percentile=WAR_PERCENTILE):
+    """
+    Загрузка помесячной таблицы по регионам
+
+    Столбцы находятся через реестр схем ('region_month') и приводятся
+    к стандартным именам. Если в таблице нет признака войны, он
+    вычисляется для каждого региона по его собственному порогу потерь
+    (как add_war_indicator, но внутри региона).
+
+    Returns:
+    --------
+    pd.DataFrame
+        region (category), month (datetime) и найденные показатели
+    """
+    csv_path = Path(csv_path)
+    plan = SchemaRegistry().plan('region_month', csv_path)
+    missing = [key for key in ('region', 'month') if key not in plan.columns]
+    if missing:
+        raise ValueError(f"В {csv_path.name} не найдены столбцы: {missing}")
+
+    raw = load_table(csv_path, columns=plan.usecols)
+    df = pd.DataFrame({key: raw[col] for key, col in plan.columns.items()})
+    df['region'] = df['region'].astype('category')
+    df['month'] = parse_dates(df['month'], detect_date_format(df['month']))
+    df = df.dropna(subset=['month']).sort_values(['region', 'month'], kind='stable').reset_index(drop=True)
+
+    if 'is_war_period' not in df.columns and 'total_isk_destroyed' in df.columns:
+        threshold = df.groupby('region', observed=True)['total_isk_destroyed'].transform(
+            'quantile', war_percentile / 100)
+        df['is_war_period'] = (df['total_isk_destroyed'] >= threshold).astype(int)
+    return df
+
+
+class RegionalAnalysis:
+    """
+    Разведочный анализ по всем регионам сразу
+
+    Те же показатели, что в EveExploratoryAnalysis (описательные
+    статистики, сравнение войны и мира, корреляции Спирмена), но для
+    каждого региона. Все регионы обрабатываются одной группировкой,
+    без цикла по регионам.
+    """
+
+    def __init__(self, df, metrics=None):
+        """
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            Результат load_region_month
+        metrics : list of str, optional
+            Показатели для анализа (по умолчанию REGION_METRICS)
+        """
+        self.df = df
+        self.metrics = [col for col in (metrics or REGION_METRICS) if col in df.columns]
+        self.results = {}
+
+    def _long(self, extra=()):
+        """Длинный формат: region, [extra], metric, value"""
+        return self.df.melt(id_vars=['region', *extra], value_vars=self.metrics,
+                            var_name='metric', value_name='value')
+
+    def basic_statistics(self):
+        """Описательные статистики каждого показателя в каждом регионе"""
+        stats = self._long().groupby(['region', 'metric'], observed=True)['value'].agg(STATISTICS)
+        self.results['basic_statistics'] = stats
+        return stats
+
+    def war_peace_comparison(self):
+        """Средние и разброс показателей в военные и мирные месяцы по регионам"""
+        if 'is_war_period' not in self.df.columns:
+            print("Нет признака военных периодов: сравнение война/мир пропущено")
+            return None
+
+        grouped = (self._long(['is_war_period'])
+                   .groupby(['region', 'metric', 'is_war_period'], observed=True)['value']
+                   .agg(['count', 'mean', 'std'])
+                   .unstack('is_war_period'))
+        grouped = grouped.reindex(columns=pd.MultiIndex.from_product([['count', 'mean', 'std'], [1, 0]]))
+
+        comparison = pd.DataFrame({
+            'war_months': grouped[('count', 1)].fillna(0).astype(int),
+            'peace_months': grouped[('count', 0)].fillna(0).astype(int),
+            'war_mean': grouped[('mean', 1)],
+            'peace_mean': grouped[('mean', 0)],
+            'war_std': grouped[('std', 1)],
+            'peace_std': grouped[('std', 0)],
+        })
+        peace_mean = comparison['peace_mean'].where(comparison['peace_mean'] != 0)
+        comparison['relative_diff_pct'] = (comparison['war_mean'] - peace_mean) / peace_mean * 100
+        self.results['war_peace_comparison'] = comparison
+        return comparison
+
+    def spearman_correlations(self):
+        """
+        Корреляции Спирмена между парами показателей в каждом регионе
+
+        Все регионы считаются одной группировкой (см. grouped_spearman).
+        """
+        correlations = grouped_spearman(self.df, self.df['region'], self.metrics, group_name='region')
+        if correlations is None:
+            return None
+        self.results['spearman_correlations'] = correlations
+        return correlations
+
+    def results_table(self):
+        """
+        Все результаты в одной «длинной» таблице
+
+        Returns:
+        --------
+        pd.DataFrame
+            Столбцы region, analysis, metric, statistic, value
+        """
+        frames = []
+        basic = self.results.get('basic_statistics')
+        if basic is not None:
+            frames.append(basic.reset_index().melt(id_vars=['region', 'metric'], var_name='statistic')
+                          .assign(analysis='basic_statistics'))
+
+        comparison = self.results.get('war_peace_comparison')
+        if comparison is not None:
+            frames.append(comparison.reset_index().melt(id_vars=['region', 'metric'], var_name='statistic')
+                          .assign(analysis='war_peace_comparison'))
+
+        correlations = self.results.get('spearman_correlations')
+        if correlations is not None:
+            table = correlations.reset_index()
+            table['metric'] = table['metric_a'] + '~' + table['metric_b']
+            frames.append(table.drop(columns=['metric_a', 'metric_b'])
+                          .melt(id_vars=['region', 'metric'], var_name='statistic')
+                          .assign(analysis='spearman'))
+
+        columns = ['region', 'analysis', 'metric', 'statistic', 'value']
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        table = pd.concat(frames, ignore_index=True)[columns]
+        table['region'] = table['region'].astype(str)
+        return table
+
+    def run(self):
+        """Полный региональный анализ; возвращает итоговую таблицу"""
+        print("\n" + "=" * 60)
+        print("РЕГИОНАЛЬНЫЙ АНАЛИЗ")
+        print("=" * 60)
+
+        start = time.perf_counter()
+        self.basic_statistics()
+        self.war_peace_comparison()
+        self.spearman_correlations()
+        table = self.results_table()
+        elapsed = time.perf_counter() - start
+
+        print(f"Регионов: {self.df['region'].nunique()}, месяцев: {self.df['month'].nunique()}, "
+              f"показателей: {len(self.metrics)}")
+        print(f"Строк в итоговой таблице: {len(table):,} (расчёт за {elapsed:.3f} с)")
+
+        comparison = self.results.get('war_peace_comparison')
+        if comparison is not None and 'trade_value' in self.metrics:
+            trade = comparison.xs('trade_value', level='metric')['relative_diff_pct'].dropna()
+            if not trade.empty:
+                print("\nРегионы с наибольшим ростом торговли в военные месяцы:")
+                for region, diff in trade.nlargest(5).items():
+                    print(f"  {region:25} {diff:+.1f}%")
+
+        self.results['table'] = table
+        return table
+
+    def save(self, output_dir=RESULTS_DIR):
+        """Сохранение итоговой таблицы в regional_analysis.csv"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / 'regional_analysis.csv'
+        table = self.results.get('table')
+        if table is None:
+            table = self.results_table()
+        table.to_csv(output_path, index=False)
+        print(f"Региональный анализ сохранен в: {output_path}")
+        return output_path
+
+
+def main():
+    """Региональный анализ по summary_by_region_month.csv"""
+    print("=" * 70)
+    print("РЕГИОНАЛЬНЫЙ АНАЛИЗ ДАННЫХ EVE ONLINE")
+    print("=" * 70)
+
+    analysis = RegionalAnalysis(load_region_month())
+    analysis.run()
+    analysis.save()
+
+
+if __name__ == "__main__":
+    main()
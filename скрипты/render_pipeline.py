@@ -0,0 +1,98 @@
+import os
+import time
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')  # неинтерактивный бэкенд: без GUI и без блокировок на plt.show()
+
+from eve_exploratory_analysis import EveExploratoryAnalysis
+
+# Задания пакетной отрисовки: метод анализатора и показатели одного графика
+TIME_SERIES_INDICATORS = ['total_isk_destroyed', 'production_isk', 'trade_value', 'isk_velocity', 'mining_isk']
+BOXPLOT_INDICATORS = ['production_isk', 'trade_value', 'isk_velocity', 'mining_isk']
+
+# Анализатор рабочего процесса: данные загружаются один раз на процесс,
+# а его фигуры переиспользуются всеми заданиями процесса
+_worker_analyzer = None
+
+
+def render_jobs():
+    """Список заданий (метод, показатели); каждое задание - один файл"""
+    jobs = [('plot_time_series_with_war_periods', [col]) for col in TIME_SERIES_INDICATORS]
+    jobs += [('plot_comparison_boxplots', [col]) for col in BOXPLOT_INDICATORS]
+    jobs.append(('plot_correlation_matrix', None))
+    return jobs
+
+
+def _init_worker(data_path):
+    global _worker_analyzer
+    _worker_analyzer = EveExploratoryAnalysis(data_path)
+    _worker_analyzer.load_and_prepare_data()
+
+
+def _render_job(method_name, indicators, output_dir, dpi, fmt):
+    kwargs = {'save_path': output_dir, 'show': False, 'dpi': dpi, 'fmt': fmt}
+    if indicators is not None:
+        kwargs['indicators'] = indicators
+    getattr(_worker_analyzer, method_name)(**kwargs)
+    return method_name, indicators
+
+
+def render_all(data_path, output_dir, fmt='png', dpi=150, workers=None):
+    """
+    Пакетная отрисовка всех графиков разведочного анализа без GUI
+
+    Parameters:
+    -----------
+    data_path : str или Path
+        Консолидированные данные (как для EveExploratoryAnalysis)
+    output_dir : str или Path
+        Директория для графиков ('Результаты анализа')
+    fmt : str
+        Формат файлов: png, svg, pdf и др.
+    dpi : int
+        Разрешение растровых файлов
+    workers : int, optional
+        Число рабочих процессов (по умолчанию - число ядер, не больше числа заданий);
+        1 - отрисовка в текущем процессе
+
+    Returns:
+    --------
+    list
+        Выполненные задания (метод, показатели)
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = render_jobs()
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(data_path)
+        done = [_render_job(method, indicators, output_dir, dpi, fmt) for method, indicators in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(data_path,)) as executor:
+            futures = [executor.submit(_render_job, method, indicators, output_dir, dpi, fmt)
+                       for method, indicators in jobs]
+            done = [future.result() for future in futures]
+
+    print(f"\nОтрисовано графиков: {len(done)} за {time.perf_counter() - start:.1f} с "
+          f"({workers} процесс(ов), {fmt}, {dpi} dpi)")
+    return done
+
+
+def main():
+    """Пакетная перегенерация графиков в 'Результаты анализа'"""
+    print("=" * 70)
+    print("ПАКЕТНАЯ ОТРИСОВКА ГРАФИКОВ РАЗВЕДОЧНОГО АНАЛИЗА")
+    print("=" * 70)
+
+    data_path = Path(r"C:\Users\Yapupalo\Desktop\Учёба\Мага\Курсовая\v2\данные\Подготовленные данные\eve_fixed_velocity.csv")
+    output_dir = Path(r"C:\Users\Yapupalo\Desktop\Учёба\Мага\Курсовая\v2\данные\Результаты анализа")
+    render_all(data_path, output_dir)
+
+
+if __name__ == "__main__":
+    main()
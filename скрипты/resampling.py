@@ -0,0 +1,216 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESAMPLES = 10_000
+BATCH_SIZE = 2_000
+CONFIDENCE = 0.95
+
+
+def _group_means(weights, values, valid):
+    """Средние по группам для каждой строки весов: (выборки x наблюдения) @ (наблюдения x показатели)"""
+    sums = weights @ values
+    counts = weights @ valid
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def permutation_batch(values, valid, is_war, seed, size):
+    """
+    Пачка перестановочных выборок
+
+    Матрица индексов (size x n) - независимые перестановки наблюдений
+    (сортировка случайных ключей по строкам); метки войны переставляются
+    вместе с ними, а средние всех показателей считаются двумя матричными
+    умножениями.
+
+    Returns:
+    --------
+    np.ndarray
+        Разности средних (война - мир), size x показатели
+    """
+    rng = np.random.default_rng(seed)
+    n = len(is_war)
+    index = np.argsort(rng.random((size, n)), axis=1)
+    war = is_war[index].astype(np.float64)
+    return _group_means(war, values, valid) - _group_means(1.0 - war, values, valid)
+
+
+def bootstrap_batch(values, valid, is_war, seed, size):
+    """
+    Пачка стратифицированных бутстреп-выборок
+
+    Матрица индексов (size x n): позиции военных месяцев заполняются
+    выборкой с возвращением из военных месяцев, мирных - из мирных.
+    Индексы переводятся в матрицу кратностей, по которой считаются средние.
+
+    Returns:
+    --------
+    tuple
+        (средние войны, средние мира), каждое size x показатели
+    """
+    rng = np.random.default_rng(seed)
+    n = len(is_war)
+    war_idx = np.flatnonzero(is_war)
+    peace_idx = np.flatnonzero(~is_war)
+    index = np.empty((size, n), dtype=np.int64)
+    index[:, :len(war_idx)] = rng.choice(war_idx, size=(size, len(war_idx)))
+    index[:, len(war_idx):] = rng.choice(peace_idx, size=(size, len(peace_idx)))
+
+    offsets = (np.arange(size) * n)[:, None]
+    counts = np.bincount((index + offsets).ravel(), minlength=size * n).reshape(size, n).astype(np.float64)
+    return (_group_means(counts * is_war, values, valid),
+            _group_means(counts * ~is_war, values, valid))
+
+
+def _run_task(task):
+    kind, values, valid, is_war, seed, size = task
+    batch = permutation_batch if kind == 'permutation' else bootstrap_batch
+    return batch(values, valid, is_war, seed, size)
+
+
+class ResamplingEngine:
+    """
+    Перестановочные тесты и бутстреп-интервалы для сравнения войны и мира
+
+    Все показатели обрабатываются одновременно: каждая пачка выборок -
+    одна матрица индексов и несколько матричных умножений. Пачки получают
+    независимые потоки случайных чисел от одного SeedSequence, поэтому
+    результат зависит только от seed и не зависит от числа процессов.
+    """
+
+    def __init__(self, n_resamples=DEFAULT_RESAMPLES, seed=0, workers=1,
+                 batch_size=BATCH_SIZE, confidence=CONFIDENCE):
+        """
+        Parameters:
+        -----------
+        n_resamples : int
+            Число перестановок и бутстреп-выборок
+        seed : int
+            Начальное значение генератора
+        workers : int
+            Число процессов (1 - в текущем процессе)
+        batch_size : int
+            Число выборок в одной пачке (ограничивает память)
+        confidence : float
+            Уровень доверительного интервала
+        """
+        self.n_resamples = n_resamples
+        self.seed = seed
+        self.workers = workers
+        self.batch_size = batch_size
+        self.confidence = confidence
+
+    def _tasks(self, values, valid, is_war, seed_seq):
+        n_batches = math.ceil(self.n_resamples / self.batch_size)
+        sizes = [min(self.batch_size, self.n_resamples - i * self.batch_size) for i in range(n_batches)]
+        seeds = seed_seq.spawn(2 * n_batches)
+        tasks = [('permutation', values, valid, is_war, seeds[i], size) for i, size in enumerate(sizes)]
+        tasks += [('bootstrap', values, valid, is_war, seeds[n_batches + i], size)
+                  for i, size in enumerate(sizes)]
+        return tasks
+
+    def _execute(self, tasks):
+        if self.workers == 1:
+            return [_run_task(task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            return list(executor.map(_run_task, tasks, chunksize=chunksize))
+
+    def _summarize(self, values, valid, is_war, results, metrics):
+        n_batches = len(results) // 2
+        perm_diffs = np.concatenate(results[:n_batches])
+        boot_war = np.concatenate([war for war, _ in results[n_batches:]])
+        boot_peace = np.concatenate([peace for _, peace in results[n_batches:]])
+
+        war = is_war.astype(np.float64)[None, :]
+        war_mean = _group_means(war, values, valid)[0]
+        peace_mean = _group_means(1.0 - war, values, valid)[0]
+        diff = war_mean - peace_mean
+
+        # Двусторонний p-value с поправкой +1 (наблюдаемая разметка - тоже перестановка)
+        extreme = (np.abs(perm_diffs) >= np.abs(diff) - 1e-12 * np.abs(diff)).sum(axis=0)
+        p_value = np.where(np.isnan(diff), np.nan, (extreme + 1) / (len(perm_diffs) + 1))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = np.where(peace_mean != 0, diff / peace_mean * 100, np.nan)
+            boot_relative = np.where(boot_peace != 0, (boot_war - boot_peace) / boot_peace * 100, np.nan)
+        tail = (1 - self.confidence) / 2 * 100
+        ci_low, ci_high = np.nanpercentile(boot_relative, [tail, 100 - tail], axis=0)
+
+        return pd.DataFrame({
+            'metric': metrics,
+            'war_months': (valid * is_war[:, None]).sum(axis=0).astype(int),
+            'peace_months': (valid * ~is_war[:, None]).sum(axis=0).astype(int),
+            'war_mean': war_mean,
+            'peace_mean': peace_mean,
+            'relative_diff_pct': relative,
+            'ci_low_pct': ci_low,
+            'ci_high_pct': ci_high,
+            'p_value': p_value,
+        })
+
+    def compare(self, df, metrics, group_col='is_war_period', by=None):
+        """
+        Проверка различий войны и мира для всех показателей (и групп)
+
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            Наблюдения (месяцы; для регионов - месяцы регионов)
+        metrics : list of str
+            Показатели
+        group_col : str
+            Признак войны (1 - война, 0 - мир)
+        by : str, optional
+            Столбец группировки (например, регион): тест в каждой группе
+
+        Returns:
+        --------
+        pd.DataFrame
+            По строке на показатель (и группу): средние, относительная
+            разница в %, доверительный интервал разницы и p-value
+        """
+        metrics = [col for col in metrics if col in df.columns]
+        groups = [(None, df)] if by is None else list(df.groupby(by, observed=True, sort=True))
+        root = np.random.SeedSequence(self.seed)
+        group_seeds = root.spawn(len(groups))
+
+        start = time.perf_counter()
+        prepared = []
+        tasks = []
+        for (key, group), seed_seq in zip(groups, group_seeds):
+            is_war = (group[group_col] == 1).to_numpy()
+            if is_war.all() or not is_war.any():
+                continue
+            raw = group[metrics].to_numpy(dtype=np.float64)
+            valid = ~np.isnan(raw)
+            values = np.where(valid, raw, 0.0)
+            valid = valid.astype(np.float64)
+            group_tasks = self._tasks(values, valid, is_war, seed_seq)
+            prepared.append((key, values, valid, is_war, len(tasks), len(group_tasks)))
+            tasks.extend(group_tasks)
+
+        # Пачки всех групп выполняются одним пулом
+        results = self._execute(tasks)
+
+        frames = []
+        for key, values, valid, is_war, offset, count in prepared:
+            table = self._summarize(values, valid, is_war, results[offset:offset + count], metrics)
+            if by is not None:
+                table.insert(0, by, key)
+            frames.append(table)
+
+        self.elapsed = time.perf_counter() - start
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+def significance_label(p_value, alpha=0.05):
+    """Словесная оценка значимости для отчётов"""
+    if np.isnan(p_value):
+        return "нет данных"
+    return "значимо" if p_value < alpha else "не значимо"
@@ -0,0 +1,216 @@
+import io
+import os
+import pandas as pd
+
+
+def match_kill_isk(columns):
+    """Столбец с уничтоженными ISK в дампе убийств"""
+    for col in columns:
+        col_lower = col.lower()
+        if 'isk' in col_lower and ('destroyed' in col_lower or 'lost' in col_lower):
+            return col
+    return None
+
+
+def match_kill_time(columns):
+    """Время убийства"""
+    return next((col for col in columns if 'time' in col.lower() or 'date' in col.lower()), None)
+
+
+def match_named(*keywords):
+    """Столбец, содержащий все ключевые слова; текстовое имя предпочтительнее идентификатора"""
+    def matcher(columns):
+        candidates = [col for col in columns if all(word in col.lower() for word in keywords)]
+        named = [col for col in candidates if not col.lower().endswith('id')]
+        return (named or candidates or [None])[0]
+    matcher.__name__ = f"match_{'_'.join(keywords)}"
+    return matcher
+
+
+def match_velocity(columns):
+    """Столбец скорости обращения денег"""
+    return next((col for col in columns if 'velocity' in col.lower()), None)
+
+
+def match_plain_total(columns):
+    """Столбец 'total' принимается за денежную массу, только если в файле есть столбцы про ISK"""
+    if 'total' in columns and any('isk' in col.lower() for col in columns):
+        return 'total'
+    return None
+
+
+# Декларативное описание файлов MER: возможные имена файлов и псевдонимы
+# столбцов. Псевдоним - точное имя столбца или функция, которая ищет его
+# среди заголовков; побеждает первый найденный.
+SCHEMAS = {
+    'production': {
+        'files': ["ProducedDestroyedMined.csv", "produced_destroyed_mined.csv"],
+        'columns': {
+            'date': ['history_date', 'date'],
+            'production_isk': ['production_isk', 'produced'],
+            'destruction_isk': ['destruction_isk', 'destroyed'],
+            'mining_isk': ['mining_isk', 'mining.value', 'mining'],
+        },
+    },
+    'trade': {
+        'files': ["RegionalStats.csv", "regional_stats.csv"],
+        'aggregate': 'sum',
+        'columns': {
+            'trade_value': ['trade_value', 'trade.value', 'trade'],
+            'total_exports': ['exports', 'export'],
+            'total_imports': ['imports', 'import'],
+        },
+    },
+    'kill': {
+        'files': ["kill_dump.csv", "Killdump.csv", "kills.csv", "Kills.csv"],
+        'sniff_separator': True,
+        'aggregate': 'sum',
+        'columns': {
+            'total_isk_destroyed': [match_kill_isk],
+        },
+    },
+    'combined_kill': {
+        'files': ["combined_kill_dump.csv"],
+        'sniff_separator': True,
+        'columns': {
+            'isk_destroyed': [match_kill_isk],
+            'kill_time': [match_kill_time],
+            'region': [match_named('region')],
+            'ship_type': [match_named('ship', 'type'), match_named('ship')],
+            'victim': ['victim_id', 'character_id', match_named('victim')],
+            'killmail_id': ['killmail_id', 'kill_id', match_named('killmail')],
+        },
+    },
+    'money': {
+        'files': ["MoneySupply.csv", "money_supply.csv"],
+        'aggregate': 'mean',
+        'columns': {
+            'isk_velocity': [match_velocity],
+            'total_isk': ['total_isk', match_plain_total],
+        },
+    },
+    'region_month': {
+        'files': ["summary_by_region_month.csv"],
+        'columns': {
+            'region': [match_named('region')],
+            'month': ['month', 'history_date', 'date', match_kill_time],
+            'total_isk_destroyed': ['total_isk_destroyed', match_kill_isk],
+            'production_isk': ['production_isk', 'produced'],
+            'trade_value': ['trade_value', 'trade.value', 'trade'],
+            'mining_isk': ['mining_isk', 'mining.value', 'mining'],
+            'isk_velocity': [match_velocity],
+            'kill_count': ['kill_count', 'kills'],
+            'is_war_period': ['is_war_period'],
+        },
+    },
+}
+
+SNIFF_BYTES = 5000
+
+
+class ColumnPlan:
+    """Результат сопоставления заголовка файла со схемой"""
+
+    def __init__(self, kind, file_path, sep, header, columns):
+        self.kind = kind
+        self.file_path = file_path
+        self.sep = sep
+        self.header = header
+        # Ключ схемы -> фактическое имя столбца в файле
+        self.columns = columns
+
+    @property
+    def usecols(self):
+        """Столбцы, которые нужно прочитать (без повторов, в порядке заголовка)"""
+        needed = set(self.columns.values())
+        return [col for col in self.header if col in needed]
+
+    def usecols_for(self, keys):
+        """Столбцы только для указанных ключей схемы (те, что найдены в файле)"""
+        needed = {self.columns[key] for key in keys if key in self.columns}
+        return [col for col in self.header if col in needed]
+
+    @property
+    def aggregate(self):
+        return SCHEMAS[self.kind].get('aggregate')
+
+
+def file_key(file_path):
+    """Дешёвый ключ файла для кэшей разбора (без чтения содержимого)"""
+    # Предзагруженный файл (month_prefetch) - ключ исходного, буфер не хэшируется
+    file_path = getattr(file_path, 'source', file_path)
+    if hasattr(file_path, 'fingerprint'):
+        fingerprint = file_path.fingerprint()
+        return (file_path.member_name, fingerprint['size'], fingerprint['hash'])
+    stat = os.stat(file_path)
+    return (str(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def resolve_columns(kind, header):
+    """Сопоставление заголовка с псевдонимами схемы"""
+    columns = {}
+    for key, aliases in SCHEMAS[kind]['columns'].items():
+        for alias in aliases:
+            found = alias(header) if callable(alias) else (alias if alias in header else None)
+            if found:
+                columns[key] = found
+                break
+    return columns
+
+
+class SchemaRegistry:
+    """
+    Реестр схем с кэшированием
+
+    Заголовок каждого файла читается один раз (и там же определяется
+    разделитель), а сопоставление столбцов кэшируется по сигнатуре
+    заголовка: для десятков месяцев с одинаковой структурой файлов
+    логика псевдонимов выполняется один раз на тип файла.
+    """
+
+    def __init__(self):
+        self._headers = {}
+        self._plans = {}
+
+    def find_file(self, folder_path, kind):
+        """Файл нужного типа в папке месяца (None, если его нет)"""
+        for name in SCHEMAS[kind]['files']:
+            file_path = folder_path / name
+            if file_path.exists():
+                return file_path
+        return None
+
+    def read_header(self, file_path, sniff_separator):
+        """Разделитель и заголовок файла по первым байтам"""
+        key = (file_key(file_path), sniff_separator)
+        if key not in self._headers:
+            with file_path.open('rb') as f:
+                sample = f.read(SNIFF_BYTES)
+                while b'\n' not in sample:
+                    block = f.read(SNIFF_BYTES)
+                    if not block:
+                        break
+                    sample += block
+
+            sep = ','
+            if sniff_separator and ';' in sample[:SNIFF_BYTES].decode('utf-8', errors='ignore'):
+                sep = ';'
+            header_line = sample.split(b'\n', 1)[0]
+            header = tuple(pd.read_csv(io.BytesIO(header_line), sep=sep, nrows=0).columns)
+            self._headers[key] = (sep, header)
+        return self._headers[key]
+
+    def plan(self, kind, file_path):
+        """План чтения конкретного файла"""
+        sep, header = self.read_header(file_path, SCHEMAS[kind].get('sniff_separator', False))
+        signature = (kind, sep, header)
+        if signature not in self._plans:
+            self._plans[signature] = resolve_columns(kind, header)
+        return ColumnPlan(kind, file_path, sep, list(header), self._plans[signature])
+
+    def resolve(self, kind, folder_path):
+        """Поиск файла нужного типа и построение плана (None, если файла нет)"""
+        file_path = self.find_file(folder_path, kind)
+        if file_path is None:
+            return None
+        return self.plan(kind, file_path)
@@ -0,0 +1,187 @@
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Готовые масштабы: от одного месяца до 20 лет и многогигабайтных дампов убийств
+SCALES = {
+    'month': {'months': 1, 'kills_per_month': 20_000},
+    'year': {'months': 12, 'kills_per_month': 100_000},
+    'decade': {'months': 120, 'kills_per_month': 100_000},
+    'twenty_years': {'months': 240, 'kills_per_month': 200_000},
+    # ~12 млн убийств в месяц - около 1 ГБ kill_dump.csv на папку
+    'huge_kills': {'months': 3, 'kills_per_month': 12_000_000},
+}
+
+SHIP_TYPES = ['Rifter', 'Merlin', 'Catalyst', 'Vexor', 'Drake', 'Hurricane', 'Raven', 'Megathron',
+              'Tengu', 'Loki', 'Naglfar', 'Revelation', 'Nyx', 'Avatar', 'Venture', 'Retriever']
+
+
+def folder_name(year, month):
+    """Имя папки отчёта, например EVEOnline_MER_Jan2020"""
+    return f"EVEOnline_MER_{MONTH_NAMES[month - 1]}{year}"
+
+
+def region_names(count):
+    return [f"Region-{i:03d}" for i in range(count)]
+
+
+class SyntheticMerGenerator:
+    """
+    Генератор папок EVEOnline_MER_* с правдоподобными CSV
+
+    Показатели следуют общему тренду с сезонностью и случайными
+    «войнами» (месяцы с многократно выросшими потерями). Файлы пишутся
+    по частям, поэтому размер дампа убийств ограничен только диском.
+    """
+
+    def __init__(self, root, months=12, start='2020-01', kills_per_month=100_000,
+                 regions=60, history_months=13, chunk_size=1_000_000, seed=0):
+        """
+        Parameters:
+        -----------
+        root : str или Path
+            Директория, в которой создаются папки месяцев
+        months : int
+            Число месяцев (папок)
+        start : str
+            Первый месяц 'YYYY-MM'
+        kills_per_month : int
+            Строк в kill_dump.csv каждой папки
+        regions : int
+            Число регионов в RegionalStats.csv и дампе убийств
+        history_months : int
+            Глубина дневной истории в ProducedDestroyedMined.csv
+        chunk_size : int
+            Строк в одной порции записи дампа убийств
+        seed : int
+            Начальное значение генератора
+        """
+        self.root = Path(root)
+        self.months = months
+        self.start = pd.Period(start, freq='M')
+        self.kills_per_month = kills_per_month
+        self.regions = region_names(regions)
+        self.history_months = history_months
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        total = months + history_months
+        t = np.arange(total)
+        # Месячные уровни показателей: тренд, сезонность и шум
+        self.level = 1e12 * (1 + 0.01 * t) * (1 + 0.1 * np.sin(2 * np.pi * t / 12)) * rng.lognormal(0, 0.1, total)
+        self.war = rng.random(total) < 0.25
+
+    def _month_index(self, period):
+        return (period - self.start).n + self.history_months
+
+    def production_history(self, period, rng):
+        """Дневная история производства, потерь и добычи за history_months месяцев до period"""
+        first = (period - self.history_months + 1).start_time
+        days = pd.date_range(first, period.end_time.normalize(), freq='D')
+        month_index = (days.year - self.start.year) * 12 + days.month - self.start.month + self.history_months
+        level = self.level[month_index] / 30
+        war_factor = np.where(self.war[month_index], 2.5, 1.0)
+        return pd.DataFrame({
+            'history_date': days.strftime('%Y-%m-%d'),
+            'production_isk': level * 8 * rng.lognormal(0, 0.2, len(days)),
+            'destruction_isk': level * 2 * war_factor * rng.lognormal(0, 0.3, len(days)),
+            'mining_isk': level * 3 * rng.lognormal(0, 0.2, len(days)),
+        })
+
+    def regional_stats(self, period, rng):
+        level = self.level[self._month_index(period)]
+        weights = rng.dirichlet(np.ones(len(self.regions)))
+        trade = level * 20 * weights
+        return pd.DataFrame({
+            'region_name': self.regions,
+            'trade_value': trade,
+            'exports': trade * rng.uniform(0.3, 0.6, len(self.regions)),
+            'imports': trade * rng.uniform(0.3, 0.6, len(self.regions)),
+        })
+
+    def money_supply(self, period, rng):
+        days = pd.date_range(period.start_time, period.end_time.normalize(), freq='D')
+        level = self.level[self._month_index(period)]
+        total_isk = level * 900 * rng.lognormal(0, 0.01, len(days))
+        return pd.DataFrame({
+            'history_date': days.strftime('%Y-%m-%d'),
+            'total_isk': total_isk,
+            'isk_velocity': rng.normal(0.5, 0.05, len(days)),
+        })
+
+    def write_kill_dump(self, period, path, rng):
+        """Дамп убийств месяца, записываемый порциями по chunk_size строк"""
+        month_index = self._month_index(period)
+        # Сумма по дампу близка к месячным потерям из истории производства
+        mean_isk = self.level[month_index] * 2 / self.kills_per_month * (2.5 if self.war[month_index] else 1)
+        start_ns = period.start_time.value
+        span_ns = period.end_time.value - start_ns
+        ship_costs = np.geomspace(1, 2000, len(SHIP_TYPES))
+
+        written = 0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write('killmail_id,killmail_time,region_name,ship_type,isk_destroyed\n')
+            while written < self.kills_per_month:
+                size = min(self.chunk_size, self.kills_per_month - written)
+                ships = rng.integers(0, len(SHIP_TYPES), size)
+                isk = mean_isk * ship_costs[ships] / ship_costs.mean() * rng.lognormal(0, 0.5, size)
+                chunk = pd.DataFrame({
+                    'killmail_id': np.arange(written, written + size) + month_index * 10**9,
+                    'killmail_time': pd.to_datetime(start_ns + np.sort(rng.integers(0, span_ns, size)))
+                                       .strftime('%Y-%m-%d %H:%M:%S'),
+                    'region_name': np.asarray(self.regions)[rng.integers(0, len(self.regions), size)],
+                    'ship_type': np.asarray(SHIP_TYPES)[ships],
+                    'isk_destroyed': isk.round(2),
+                })
+                chunk.to_csv(f, header=False, index=False)
+                written += size
+
+    def generate_month(self, period):
+        """Создание одной папки отчёта; возвращает её путь"""
+        rng = np.random.default_rng([self.seed, self._month_index(period)])
+        folder = self.root / folder_name(period.year, period.month)
+        folder.mkdir(parents=True, exist_ok=True)
+        self.production_history(period, rng).to_csv(folder / "ProducedDestroyedMined.csv", index=False)
+        self.regional_stats(period, rng).to_csv(folder / "RegionalStats.csv", index=False)
+        self.money_supply(period, rng).to_csv(folder / "money_supply.csv", index=False)
+        self.write_kill_dump(period, folder / "kill_dump.csv", rng)
+        return folder
+
+    def generate(self):
+        """Создание всех папок; возвращает список путей"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        return [self.generate_month(self.start + i) for i in range(self.months)]
+
+
+def generate_scale(root, scale='year', **overrides):
+    """Генерация набора одного из масштабов SCALES (параметры можно переопределить)"""
+    if scale not in SCALES:
+        raise ValueError(f"Неизвестный масштаб: {scale}; доступны {list(SCALES)}")
+    return SyntheticMerGenerator(root, **{**SCALES[scale], **overrides}).generate()
+
+
+def directory_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+
+def main():
+    """Генерация синтетических отчётов: python synthetic_mer.py [масштаб] [директория]"""
+    scale = sys.argv[1] if len(sys.argv) > 1 else 'year'
+    root = Path(sys.argv[2]) if len(sys.argv) > 2 else Path.cwd() / "synthetic_mer" / scale
+
+    print("=" * 70)
+    print(f"ГЕНЕРАЦИЯ СИНТЕТИЧЕСКИХ ОТЧЁТОВ MER ({scale})")
+    print("=" * 70)
+    start = time.perf_counter()
+    folders = generate_scale(root, scale)
+    print(f"Создано папок: {len(folders)} в {root}")
+    print(f"Объём: {directory_size(root) / 2**20:,.1f} МБ за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Скрипты лежат плоско в директории выше и импортируются по имени модуля
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
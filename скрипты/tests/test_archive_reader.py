@@ -0,0 +1,63 @@
+import io
+import zipfile
+import numpy as np
+import pandas as pd
+from archive_reader import MerArchive, SplitFile
+from synthetic_mer import SyntheticMerGenerator
+from consolidate_eve_data import EveDataConsolidatorFinal
+
+
+def split(data, directory, sizes):
+    """Запись data частями заданных размеров (последняя - остаток)"""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths, start = [], 0
+    for i, size in enumerate(list(sizes) + [len(data)]):
+        path = directory / f"mer.zip.part{i + 1:03d}"
+        path.write_bytes(data[start:start + size])
+        paths.append(path)
+        start += size
+        if start >= len(data):
+            break
+    return paths
+
+
+def test_split_file_reads_across_part_boundaries(tmp_path):
+    data = np.random.default_rng(0).integers(0, 256, 10_000, dtype=np.uint8).tobytes()
+    parts = split(data, tmp_path, [3_000, 1, 2_999])
+
+    raw = SplitFile(parts)
+    assert raw.size == len(data)
+    # Как в MerArchive: буфер поверх склейки; маленький буфер - много чтений через границы
+    with io.BufferedReader(raw, buffer_size=64) as f:
+        assert f.read() == data
+        for offset, length in [(2_990, 20), (2_999, 3), (5_999, 2), (0, 10_000), (9_995, 100)]:
+            f.seek(offset)
+            assert f.read(length) == data[offset:offset + length]
+        f.seek(-5, io.SEEK_END)
+        assert f.read() == data[-5:]
+
+
+def test_consolidation_from_split_archive_matches_folders(tmp_path):
+    root = tmp_path / "mer"
+    folders = SyntheticMerGenerator(root, months=3, kills_per_month=300).generate()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path in sorted(root.rglob('*.csv')):
+            archive.write(path, f"archive/{path.relative_to(root).as_posix()}")
+    data = buffer.getvalue()
+    # Части меньше одного файла: почти каждый член архива пересекает границу частей
+    split(data, tmp_path / "parts", [len(data) // 7] * 6)
+
+    mer_archive = MerArchive(tmp_path / "parts")
+    assert sorted(mer_archive.month_folders()) == sorted(folder.name for folder in folders)
+    member = mer_archive.month_folders()[folders[1].name] / "kill_dump.csv"
+    with member.open() as f:
+        assert f.read() == (folders[1] / "kill_dump.csv").read_bytes()
+    mer_archive.close()
+
+    options = dict(log_level='ERROR', use_cache=False)
+    from_archive = EveDataConsolidatorFinal(archive_parts=tmp_path / "parts", output_dir=tmp_path / "a",
+                                            **options).consolidate_all_months_fixed()
+    from_folders = EveDataConsolidatorFinal(archives_dir=root, output_dir=tmp_path / "f",
+                                            **options).consolidate_all_months_fixed()
+    pd.testing.assert_frame_equal(from_archive, from_folders)
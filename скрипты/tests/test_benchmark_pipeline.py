@@ -0,0 +1,36 @@
+import tracemalloc
+import numpy as np
+from benchmark_pipeline import PipelineBenchmark, compare_to_baseline
+
+
+def results(**stages):
+    return {'trace_memory': True, 'stages': {name: {'seconds': seconds, 'memory_mb': memory}
+                                             for name, (seconds, memory) in stages.items()}}
+
+
+def test_stage_memory_is_measured_per_stage(tmp_path):
+    benchmark = PipelineBenchmark(tmp_path, tmp_path)
+    tracemalloc.start()
+    try:
+        kept = np.ones(8 << 20, dtype=np.uint8)  # живёт до конца: не должен попасть в следующие этапы
+        with benchmark.stage('allocate'):
+            np.ones(32 << 20, dtype=np.uint8).sum()
+        with benchmark.stage('small'):
+            np.ones(1 << 20, dtype=np.uint8).sum()
+    finally:
+        tracemalloc.stop()
+    del kept
+
+    assert 31 < benchmark.stages['allocate']['memory_mb'] < 40
+    assert benchmark.stages['small']['memory_mb'] < 2
+
+
+def test_memory_growth_is_a_regression():
+    baseline = results(consolidate_cold=(1.0, 100.0), kill_dump_sum=(0.5, 2.0))
+    current = results(consolidate_cold=(1.0, 150.0), kill_dump_sum=(0.5, 4.0))
+    assert compare_to_baseline(current, baseline) == ['consolidate_cold (память)']
+
+
+def test_slowdown_and_old_baselines_without_memory():
+    baseline = {'stages': {'consolidate_cold': {'seconds': 1.0}}}
+    assert compare_to_baseline(results(consolidate_cold=(2.0, 500.0)), baseline) == ['consolidate_cold (время)']
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+from columnar_cache import convert_table, is_fresh, load_table
+
+
+@pytest.fixture(params=[',', ';'])
+def table(tmp_path, request):
+    df = pd.DataFrame({
+        'killmail_time': ['2020-01-01 10:00:00', '2020-01-02 11:30:00', '2020-02-01 00:00:01'],
+        'region_name': ['Region-001', 'Region-002', 'Region-001'],
+        'isk_destroyed': [1.5, 2.25, 3.0],
+    })
+    csv_path = tmp_path / "combined_kill_dump.csv"
+    df.to_csv(csv_path, sep=request.param, index=False)
+    return csv_path, df
+
+
+@pytest.mark.filterwarnings('ignore:Колоночная копия')
+def test_csv_fallback_uses_detected_separator(table):
+    csv_path, df = table
+    pd.testing.assert_frame_equal(load_table(csv_path), df)
+
+
+def test_parquet_copy_keeps_all_columns(table):
+    pytest.importorskip('pyarrow')
+    csv_path, df = table
+    convert_table(csv_path)
+    assert is_fresh(csv_path)
+
+    loaded = load_table(csv_path, columns=['region_name', 'isk_destroyed'])
+    assert list(loaded.columns) == ['region_name', 'isk_destroyed']
+    assert loaded['region_name'].astype(str).tolist() == df['region_name'].tolist()
+    assert loaded['isk_destroyed'].tolist() == df['isk_destroyed'].tolist()
+
@@ -0,0 +1,50 @@
+import json
+import pandas as pd
+import pytest
+from synthetic_mer import SyntheticMerGenerator
+from consolidate_eve_data import EveDataConsolidatorFinal
+
+
+def consolidate(archives_dir, output_dir, **options):
+    consolidator = EveDataConsolidatorFinal(archives_dir=archives_dir, output_dir=output_dir,
+                                            log_level='ERROR', use_cache=False, **options)
+    return consolidator.consolidate_all_months_fixed()
+
+
+@pytest.mark.parametrize('production_history', ['per_month', 'shared'])
+def test_unreadable_files_are_skipped(tmp_path, production_history):
+    """Пустой или неразборчивый файл пропускается с ошибкой в логе, остальные месяцы считаются"""
+    folders = SyntheticMerGenerator(tmp_path / "mer", months=3, kills_per_month=200).generate()
+    clean = consolidate(tmp_path / "mer", tmp_path / "clean", production_history=production_history)
+
+    (folders[0] / "ProducedDestroyedMined.csv").write_bytes(b'')
+    (folders[1] / "money_supply.csv").write_bytes(b'')
+    (folders[2] / "kill_dump.csv").write_bytes(b'\xff\xfe\xfa' * 100 + b'\n1,2\n')
+    broken = consolidate(tmp_path / "mer", tmp_path / "broken", production_history=production_history)
+
+    assert len(broken) == 3
+    assert broken.loc[1, 'total_isk'] != broken.loc[1, 'total_isk']  # NaN: месяц без денежной массы
+    assert broken.loc[2, 'total_isk_destroyed'] == 0
+    pd.testing.assert_series_equal(broken['trade_value'], clean['trade_value'])
+    if production_history == 'per_month':
+        assert pd.isna(broken.loc[0, 'production_isk'])
+    else:
+        # Общая история из более свежих папок покрывает и месяц с пустым файлом
+        pd.testing.assert_series_equal(broken['production_isk'], clean['production_isk'])
+
+
+def test_worker_processes_match_sequential_run(tmp_path):
+    """Пул процессов даёт тот же датасет и тот же порядок записей журнала"""
+    SyntheticMerGenerator(tmp_path / "mer", months=4, kills_per_month=200).generate()
+    runs = []
+    for workers in (1, 2):
+        consolidator = EveDataConsolidatorFinal(archives_dir=tmp_path / "mer", output_dir=tmp_path / f"w{workers}",
+                                                log_level='INFO', log_format='jsonl', use_cache=False,
+                                                prefetch_months=0, workers=workers)
+        df = consolidator.consolidate_all_months_fixed()
+        records = [json.loads(line) for line in consolidator.log_file.read_text(encoding='utf-8').splitlines()]
+        runs.append((df, [(record['level'], record.get('month'), record['message']) for record in records]))
+
+    (sequential, sequential_log), (parallel, parallel_log) = runs
+    pd.testing.assert_frame_equal(parallel, sequential)
+    assert parallel_log == sequential_log
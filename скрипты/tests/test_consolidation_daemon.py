@@ -0,0 +1,73 @@
+import json
+import shutil
+import pandas as pd
+import pytest
+from synthetic_mer import SyntheticMerGenerator
+from consolidate_eve_data import EveDataConsolidatorFinal
+from consolidation_daemon import ConsolidationDaemon
+
+
+def make_daemon(tmp_path, **options):
+    consolidator = EveDataConsolidatorFinal(archives_dir=tmp_path / "mer", output_dir=tmp_path / "out",
+                                            log_level='ERROR', **options)
+    return ConsolidationDaemon(consolidator, interval=0, settle_seconds=0, use_watchdog=False)
+
+
+def test_failed_cycle_is_logged_and_retried(tmp_path, monkeypatch):
+    """Ошибка цикла не останавливает службу, а папка обрабатывается снова на следующем цикле"""
+    SyntheticMerGenerator(tmp_path / "mer", months=2, kills_per_month=200).generate()
+    daemon = make_daemon(tmp_path)
+    consolidator = daemon.consolidator
+    extract_money = consolidator.extract_money_data_fixed
+    calls = []
+
+    def failing_once(folder_path):
+        calls.append(folder_path.name)
+        if len(calls) == 1:
+            raise OSError("папка ещё копируется")
+        return extract_money(folder_path)
+
+    monkeypatch.setattr(consolidator, 'extract_money_data_fixed', failing_once)
+    daemon.run(max_cycles=2)
+
+    assert daemon.cycles == 2
+    assert sorted(daemon.months) == sorted(daemon.signatures) == ['EVEOnline_MER_Feb2020', 'EVEOnline_MER_Jan2020']
+    assert (tmp_path / "out" / "daemon_status.json").exists()
+    log = consolidator.log_file.read_text(encoding='utf-8')
+    assert "ОШИБКА цикла 1" in log
+
+
+def published_vs_cold(tmp_path, production_history):
+    published = pd.read_csv(tmp_path / "out" / "eve_consolidated_data_final.csv")
+    consolidator = EveDataConsolidatorFinal(archives_dir=tmp_path / "mer", output_dir=tmp_path / "cold",
+                                            log_level='ERROR', use_cache=False,
+                                            production_history=production_history)
+    df = consolidator.add_war_indicator(consolidator.consolidate_all_months_fixed(), percentile=75)
+    consolidator.save_results_fixed(df)
+    pd.testing.assert_frame_equal(published, pd.read_csv(tmp_path / "cold" / "eve_consolidated_data_final.csv"))
+
+
+@pytest.mark.parametrize('production_history', ['per_month', 'shared'])
+def test_added_changed_and_removed_folders(tmp_path, production_history):
+    """После добавления, изменения и удаления папок датасет совпадает с полной консолидацией"""
+    folders = SyntheticMerGenerator(tmp_path / "mer", months=3, kills_per_month=200).generate()
+    daemon = make_daemon(tmp_path, production_history=production_history)
+    assert daemon.run_once()
+    assert sorted(daemon.months) == sorted(daemon.signatures) == sorted(folder.name for folder in folders)
+    assert daemon.run_once() is False  # без изменений ничего не перезаписывается
+
+    added = SyntheticMerGenerator(tmp_path / "mer", months=1, start='2020-04', kills_per_month=200).generate()
+    money_path = folders[1] / "money_supply.csv"
+    money = pd.read_csv(money_path)
+    money['total_isk'] *= 3
+    money.to_csv(money_path, index=False)
+    shutil.rmtree(folders[0])
+    old_signature = daemon.signatures[folders[1].name]
+
+    assert daemon.run_once()
+    expected = sorted(folder.name for folder in folders[1:] + added)
+    assert sorted(daemon.months) == sorted(daemon.signatures) == sorted(daemon.tasks) == expected
+    assert daemon.signatures[folders[1].name] != old_signature
+    status = json.loads((tmp_path / "out" / "daemon_status.json").read_text(encoding='utf-8'))
+    assert status['folders'] == expected
+    published_vs_cold(tmp_path, production_history)
@@ -0,0 +1,44 @@
+import json
+import pickle
+import pytest
+from consolidation_log import ConsolidationLogger
+
+
+def test_levels_buffering_and_text_header(tmp_path):
+    logger = ConsolidationLogger(tmp_path / "log.txt", level='WARNING', echo=False, buffer_limit=3,
+                                 header=["Заголовок", "==="])
+    logger.log("подробности", 'DEBUG')
+    logger.log("обычное", 'INFO')
+    logger.log("первое", 'WARNING')
+    logger.log("второе", 'ERROR')
+    assert (tmp_path / "log.txt").read_text(encoding='utf-8') == "Заголовок\n===\n"
+
+    logger.log("третье", 'WARNING')  # буфер заполнен: запись одним открытием
+    logger.log("четвёртое", 'ERROR')
+    assert (tmp_path / "log.txt").read_text(encoding='utf-8').splitlines() == [
+        "Заголовок", "===", "первое", "второе", "третье"]
+    logger.flush()
+    assert (tmp_path / "log.txt").read_text(encoding='utf-8').splitlines()[-1] == "четвёртое"
+
+    with pytest.raises(ValueError):
+        ConsolidationLogger(tmp_path / "bad.txt", level='TRACE')
+
+
+def test_jsonl_context_and_replay_from_child(tmp_path):
+    logger = ConsolidationLogger(tmp_path / "log.jsonl", fmt='jsonl', echo=False, header=["не пишется в JSON"])
+    logger.log("до дочернего процесса")
+    logger.flush()
+
+    # Копия в дочернем процессе не несёт буфер и перехватывает записи для родителя
+    child = pickle.loads(pickle.dumps(logger))
+    child.start_capture()
+    child.context = {'month': '2020-01'}
+    child.log("\nмесяц обработан\n", rows=10)
+    child.log("отладка", 'DEBUG')
+    records = child.stop_capture()
+
+    logger.replay(records)
+    logger.flush()
+    lines = [json.loads(line) for line in (tmp_path / "log.jsonl").read_text(encoding='utf-8').splitlines()]
+    assert [line['message'] for line in lines] == ["до дочернего процесса", "месяц обработан"]
+    assert lines[1]['month'] == '2020-01' and lines[1]['rows'] == 10 and lines[1]['level'] == 'INFO'
@@ -0,0 +1,44 @@
+import json
+import pickle
+from consolidation_profiler import DISABLED, StageProfiler
+
+
+def test_nested_stages_and_child_profile(tmp_path):
+    kill_dump = tmp_path / "kill_dump.csv"
+    kill_dump.write_bytes(b'x' * 100)
+    profiler = StageProfiler()
+    with profiler.stage('consolidate'):
+        # Дочерний процесс получает копию через pickle и возвращает collect()
+        child = pickle.loads(pickle.dumps(profiler))
+        assert child.events == [] and child.origin == profiler.origin
+        with child.stage('month', month='2020-01'):
+            with child.stage('kill'):
+                pass
+        child.count_file('kill', kill_dump, rows=10)
+        profiler.merge(child.collect())
+        with profiler.stage('month', month='2020-02'):
+            pass
+
+    totals = profiler.stage_totals()
+    assert {key: value['count'] for key, value in totals.items()} == {
+        'consolidate': 1, 'consolidate/month': 2, 'consolidate/month/kill': 1}
+    summary = profiler.summary()
+    assert sorted(summary['months']) == ['2020-01', '2020-02']
+    assert summary['files'] == {'kill': 1} and summary['rows'] == {'kill': 10}
+    assert summary['bytes_read'] == {'kill': 100}
+    assert summary['wall_seconds'] == round(totals['consolidate']['seconds'], 4)
+
+    json_path, trace_path, folded_path = profiler.export(tmp_path)
+    assert len(json.loads(trace_path.read_text(encoding='utf-8'))['traceEvents']) == 4
+    assert json.loads(json_path.read_text(encoding='utf-8'))['summary']['months'] == summary['months']
+    # Собственное время этапа не больше его полного времени
+    for line in folded_path.read_text(encoding='utf-8').splitlines():
+        stack, self_us = line.rsplit(' ', 1)
+        assert int(self_us) <= totals['/'.join(stack.split(';'))]['seconds'] * 1e6 + 1
+
+
+def test_disabled_profiler_records_nothing(tmp_path):
+    with DISABLED.stage('consolidate'):
+        DISABLED.count_file('kill', tmp_path)
+    DISABLED.merge({'events': [{'name': 'x', 'path': ['x']}]})
+    assert DISABLED.events == [] and DISABLED.files == {}
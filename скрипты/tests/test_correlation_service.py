@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from correlation_service import CorrelationService
+
+COLUMNS = ['production_isk', 'total_isk_destroyed', 'trade_value']
+
+
+def test_append_with_missing_values_matches_full_recompute():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.lognormal(0, 1, (24, 3)), columns=COLUMNS)
+    service = CorrelationService(df, COLUMNS)
+    service.matrix()
+
+    rows = [
+        {'production_isk': 1.5, 'total_isk_destroyed': None, 'trade_value': 2.0},
+        {'production_isk': pd.NA, 'total_isk_destroyed': 0.7, 'trade_value': '3.5'},
+        {'production_isk': 0.2, 'trade_value': 1.1},
+    ]
+    for row in rows:
+        service.append(row)
+
+    expected = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)[COLUMNS].apply(pd.to_numeric)
+    assert (service.df[COLUMNS].dtypes == np.float64).all()
+    pd.testing.assert_frame_equal(service.matrix(), expected.corr(method='spearman'), check_names=False)
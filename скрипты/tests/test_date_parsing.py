@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+from date_parsing import INVALID_PERIOD, period_code, period_codes
+
+DATES = ['2021-02-28', '2021-02-29', '2021-02-30', '2020-02-29', '1900-02-29', '2000-02-29',
+         '2021-04-30', '2021-04-31', '2021-12-31', '2021-01-00', '2021-01-32', '2021-13-01', None, '']
+
+
+def pandas_period_codes(values, fmt):
+    dates = pd.to_datetime(pd.Series(values), format=fmt, errors='coerce')
+    return np.array([INVALID_PERIOD if pd.isna(d) else period_code(d.year, d.month) for d in dates])
+
+
+@pytest.mark.parametrize('dtype', [object, 'string[python]', 'string[pyarrow]'])
+def test_iso_fast_path_rejects_impossible_days(dtype):
+    if dtype == 'string[pyarrow]':
+        pytest.importorskip('pyarrow')
+    values = pd.Series(DATES, dtype=dtype)
+    codes = period_codes(values, '%Y-%m-%d')
+
+    np.testing.assert_array_equal(codes, pandas_period_codes(DATES, '%Y-%m-%d'))
+    assert codes[DATES.index('2021-02-30')] == INVALID_PERIOD
+    assert codes[DATES.index('2020-02-29')] == period_code(2020, 2)
+    assert codes[DATES.index('2021-04-31')] == INVALID_PERIOD
+
+
+def test_iso_fast_path_with_time_checks_day():
+    values = [f"{date} 12:00:00" for date in DATES if date]
+    codes = period_codes(values, '%Y-%m-%d %H:%M:%S')
+    np.testing.assert_array_equal(codes, pandas_period_codes(values, '%Y-%m-%d %H:%M:%S'))
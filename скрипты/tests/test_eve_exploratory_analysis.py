@@ -0,0 +1,31 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+from eve_exploratory_analysis import draw_war_spans, merge_war_spans
+
+
+def test_adjacent_war_months_merge_into_spans():
+    dates = pd.Series(pd.date_range('2020-01-01', periods=12, freq='MS'))
+    flags = pd.Series([1, 1, 0, 1, 0, 0, 1, 1, 1, 0, 0, 1])
+    spans = merge_war_spans(dates, flags)
+
+    expected = pd.DataFrame({'start': pd.to_datetime(['2020-01-01', '2020-04-01', '2020-07-01', '2020-12-01']),
+                             'end': pd.to_datetime(['2020-03-01', '2020-05-01', '2020-10-01', '2021-01-01'])})
+    pd.testing.assert_frame_equal(spans, expected)
+    assert merge_war_spans(dates, flags * 0).empty
+
+
+def test_daily_gaps_split_spans_and_one_collection_is_drawn():
+    # Пропущенный день разрывает интервал даже при соседних строках
+    dates = pd.Series(pd.to_datetime(['2020-01-01', '2020-01-02', '2020-01-04', '2020-01-05']))
+    spans = merge_war_spans(dates, pd.Series([True] * 4), period=pd.Timedelta(days=1))
+    assert list(spans['end'] - spans['start']) == [pd.Timedelta(days=2)] * 2
+
+    fig, ax = plt.subplots()
+    try:
+        collection = draw_war_spans(ax, spans)
+        assert list(ax.collections) == [collection] and len(collection.get_paths()) == 2
+        assert draw_war_spans(ax, spans.iloc[:0]) is None
+    finally:
+        plt.close(fig)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+import kill_cube
+from kill_cube import KillCube, ShipGroupMapper, build_cube
+
+
+@pytest.fixture
+def dump(tmp_path):
+    rng = np.random.default_rng(1)
+    rows = 2_000
+    times = pd.Timestamp('2020-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 90 * 86400, rows)), unit='s')
+    df = pd.DataFrame({
+        'killmail_time': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'region_name': rng.choice([f"Region-{i:03d}" for i in range(5)], rows),
+        'ship_type': rng.choice(['Rifter', 'Drake', 'Avatar', 'Unknown hull'], rows),
+        'isk_destroyed': rng.lognormal(18, 1, rows).round(2),
+    })
+    csv_path = tmp_path / "combined_kill_dump.csv"
+    df.to_csv(csv_path, index=False)
+    return csv_path, df
+
+
+def test_month_region_slice_matches_pandas(dump):
+    csv_path, df = dump
+    cube = KillCube(build_cube(csv_path, chunk_size=700))
+    result = cube.slice(by=('month', 'region'))
+
+    expected = df.groupby([df['killmail_time'].str[:7], 'region_name'])['isk_destroyed'].agg(['sum', 'size'])
+    result = result.sort_index()
+    np.testing.assert_allclose(result['total_isk_destroyed'].to_numpy(), expected['sum'].to_numpy(), rtol=1e-9)
+    np.testing.assert_array_equal(result['kill_count'].to_numpy(), expected['size'].to_numpy())
+
+
+def test_too_many_regions_is_an_error(dump, monkeypatch):
+    csv_path, _ = dump
+    monkeypatch.setattr(kill_cube, 'MAX_REGIONS', 4)
+    with pytest.raises(ValueError, match="Регионов больше 4"):
+        build_cube(csv_path)
+
+
+def test_too_many_ship_groups_is_an_error():
+    groups = {f"group-{i}": [f"hull-{i}"] for i in range(kill_cube.MAX_SHIP_GROUPS)}
+    with pytest.raises(ValueError, match="Групп кораблей"):
+        ShipGroupMapper(groups)
+    ShipGroupMapper(dict(list(groups.items())[:-1]))
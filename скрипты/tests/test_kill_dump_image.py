@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from kill_dump_image import KillDumpImage, build_image, is_image_fresh, open_kill_dump
+
+
+@pytest.fixture(params=[',', ';'], ids=['comma', 'semicolon'])
+def dump(tmp_path, request):
+    rng = np.random.default_rng(4)
+    rows = 3_000
+    times = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 60 * 86400, rows), unit='s')
+    df = pd.DataFrame({
+        'killmail_id': np.arange(rows),
+        'killmail_time': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'region_name': rng.choice([f"Region-{i:03d}" for i in range(5)], rows),
+        # Больше 127 типов: коды не помещаются в int8
+        'ship_type_name': rng.choice([f"Ship-{i:03d}" for i in range(300)], rows),
+        'isk_destroyed': rng.lognormal(18, 1, rows).round(2),
+    })
+    df.loc[[3, 4], 'region_name'] = np.nan
+    df.loc[7, 'isk_destroyed'] = np.nan
+    csv_path = tmp_path / "combined_kill_dump.csv"
+    df.to_csv(csv_path, sep=request.param, index=False)
+    return csv_path, df
+
+
+def test_image_columns_match_csv_across_chunks(tmp_path, dump):
+    csv_path, df = dump
+    image = KillDumpImage(build_image(csv_path, tmp_path / "image", chunk_size=700))
+    assert image.rows == len(df) and sorted(image.columns) == ['isk_destroyed', 'kill_time', 'region', 'ship_type']
+
+    frame = image.to_frame()
+    np.testing.assert_array_equal(frame['isk_destroyed'], df['isk_destroyed'])
+    pd.testing.assert_series_equal(frame['kill_time'], pd.to_datetime(df['killmail_time']).astype('datetime64[ns]'),
+                                   check_names=False)
+    assert list(frame['region'].astype(object).fillna('-')) == list(df['region_name'].fillna('-'))
+    assert list(frame['ship_type']) == list(df['ship_type_name'])
+    assert image.raw('ship_type').dtype == np.int16 and isinstance(image.raw('isk_destroyed'), np.memmap)
+
+    # Категории идут в порядке появления в файле
+    by_region = frame.groupby('region', observed=True)['isk_destroyed'].sum()
+    by_region.index = by_region.index.astype(str)
+    pd.testing.assert_series_equal(by_region.sort_index(), df.groupby('region_name')['isk_destroyed'].sum(),
+                                   check_names=False, check_index_type=False)
+
+
+def test_image_is_rebuilt_after_source_changes(tmp_path, dump):
+    csv_path, df = dump
+    image = open_kill_dump(csv_path)
+    assert is_image_fresh(csv_path)
+
+    df.iloc[:100].to_csv(csv_path, index=False)
+    assert not is_image_fresh(csv_path)
+    assert image.rows == len(df)
+    assert open_kill_dump(csv_path).rows == 100
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from kill_partitions import UNKNOWN_MONTH, KillPartitions, is_partitioned_fresh, partition_kill_dump
+
+
+@pytest.fixture(params=[',', ';'], ids=['comma', 'semicolon'])
+def dump(tmp_path, request):
+    rng = np.random.default_rng(3)
+    rows = 5_000
+    # Строки перемешаны по месяцам, поэтому каждый месяц встречается во многих частях чтения
+    times = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 90 * 86400, rows), unit='s')
+    df = pd.DataFrame({
+        'killmail_id': np.arange(rows),
+        'killmail_time': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'region_name': rng.choice([f"Region-{i:03d}" for i in range(7)], rows),
+        'isk_destroyed': rng.lognormal(18, 1, rows).round(2),
+    })
+    df.loc[[10, 20, 30], 'killmail_time'] = ['not a date', '', '2020-02-30 00:00:00']
+    csv_path = tmp_path / "combined_kill_dump.csv"
+    df.to_csv(csv_path, sep=request.param, index=False)
+    return csv_path, df
+
+
+def month_of(df):
+    return pd.to_datetime(df['killmail_time'], format='%Y-%m-%d %H:%M:%S', errors='coerce').dt.strftime('%Y-%m')
+
+
+@pytest.mark.parametrize('by_region', [False, True])
+def test_month_sums_match_source(tmp_path, dump, by_region):
+    csv_path, df = dump
+    parts = KillPartitions(partition_kill_dump(csv_path, tmp_path / "parts", by_region=by_region, chunk_size=700))
+    assert is_partitioned_fresh(csv_path, tmp_path / "parts", by_region)
+
+    months = month_of(df)
+    expected = df.groupby(months)['isk_destroyed'].agg(['sum', 'size'])
+    assert parts.months() == list(expected.index)
+    for month, (total, count) in expected.iterrows():
+        shard = parts.read(months=[month], columns=['isk_destroyed'])
+        assert len(shard) == count
+        assert shard['isk_destroyed'].sum() == pytest.approx(total, rel=1e-12)
+    assert parts.index['partitions'][UNKNOWN_MONTH]['rows'] == months.isna().sum() == 3
+    assert parts.index['rows'] == len(df)
+
+
+def test_region_ranges_read_only_selected_regions(tmp_path, dump):
+    csv_path, df = dump
+    parts = KillPartitions(partition_kill_dump(csv_path, tmp_path / "parts", by_region=True, chunk_size=700))
+    regions = ['Region-001', 'Region-005']
+
+    selected = parts.read(start='2020-02', end='2020-03', regions=regions)
+    months = month_of(df)
+    mask = months.between('2020-02', '2020-03') & df['region_name'].isin(regions)
+    expected = df[mask].groupby(['region_name', months[mask]])['isk_destroyed'].sum()
+    result = selected.groupby(['region_name', month_of(selected)])['isk_destroyed'].sum()
+    pd.testing.assert_series_equal(result, expected, check_names=False)
+    assert sorted(selected['killmail_id']) == sorted(df.loc[mask, 'killmail_id'])
+
+    assert parts.scanned_bytes(start='2020-02', end='2020-03', regions=regions) < parts.total_bytes() / 3
+    with pytest.raises(ValueError):
+        KillPartitions(partition_kill_dump(csv_path, tmp_path / "flat")).ranges(regions=regions)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from kill_sketches import HyperLogLog, build_sketches
+
+
+def test_distinct_ids_stable_across_chunks_with_missing_values(tmp_path):
+    """Пропуск в части дампа делает столбец float64 - те же жертвы не должны считаться заново"""
+    rng = np.random.default_rng(0)
+    rows = 70_000
+    victims = rng.integers(0, 20_000, rows).astype(float)
+    victims[rng.choice(np.arange(40_000, rows), 10, replace=False)] = np.nan
+    dump = pd.DataFrame({
+        'killmail_id': np.arange(rows),
+        'killmail_time': pd.Timestamp('2020-01-01') + pd.to_timedelta(np.arange(rows), unit='min'),
+        'region_name': 'Region-001',
+        'isk_destroyed': rng.lognormal(18, 1, rows),
+        'victim_id': pd.array(victims, dtype='Int64'),
+    })
+    csv_path = tmp_path / "combined_kill_dump.csv"
+    dump.to_csv(csv_path, index=False)
+
+    sketches = build_sketches(csv_path, tmp_path / "sketches", chunk_size=40_000)
+
+    true_distinct = dump['victim_id'].nunique()
+    assert abs(sketches.distinct_count() / true_distinct - 1) < 0.05
+
+
+def test_hll_same_value_as_int_float_and_string():
+    counts = []
+    for values in ([1, 2, 3], [1.0, 2.0, 3.0], ['1', '2', '3']):
+        counts.append(HyperLogLog().update(pd.Series(values)).registers.copy())
+    assert (counts[0] == counts[1]).all() and (counts[0] == counts[2]).all()
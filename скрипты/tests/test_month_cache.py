@@ -0,0 +1,36 @@
+import shutil
+import pandas as pd
+from synthetic_mer import SyntheticMerGenerator
+from consolidate_eve_data import EveDataConsolidatorFinal
+
+
+def consolidate(archives_dir, output_dir, **options):
+    consolidator = EveDataConsolidatorFinal(archives_dir=archives_dir, output_dir=output_dir,
+                                            log_level='ERROR', **options)
+    return consolidator.consolidate_all_months_fixed()
+
+
+def test_shared_history_warm_cache_matches_cold(tmp_path):
+    """В общем режиме новая папка меняет историю всех месяцев, в том числе взятых из кэша"""
+    root = tmp_path / "mer"
+    folders = SyntheticMerGenerator(root, months=13, kills_per_month=200).generate()
+    newest = folders[-1]
+    shutil.move(newest, tmp_path / newest.name)
+
+    consolidate(root, tmp_path / "out", production_history='shared')
+    shutil.move(tmp_path / newest.name, newest)
+    warm = consolidate(root, tmp_path / "out", production_history='shared')
+    cold = consolidate(root, tmp_path / "cold", production_history='shared', use_cache=False)
+
+    pd.testing.assert_frame_equal(warm, cold)
+
+
+def test_history_mode_switch_does_not_reuse_cache(tmp_path):
+    root = tmp_path / "mer"
+    SyntheticMerGenerator(root, months=13, kills_per_month=200).generate()
+
+    consolidate(root, tmp_path / "out", production_history='per_month')
+    warm = consolidate(root, tmp_path / "out", production_history='shared')
+    cold = consolidate(root, tmp_path / "cold", production_history='shared', use_cache=False)
+
+    pd.testing.assert_frame_equal(warm, cold)
@@ -0,0 +1,77 @@
+import time
+import pandas as pd
+import month_prefetch
+from synthetic_mer import SyntheticMerGenerator
+from schema_registry import file_key
+from consolidate_eve_data import EveDataConsolidatorFinal
+
+
+def consolidate(archives_dir, output_dir, **options):
+    consolidator = EveDataConsolidatorFinal(archives_dir=archives_dir, output_dir=output_dir,
+                                            log_level='ERROR', use_cache=False, **options)
+    return consolidator.consolidate_all_months_fixed()
+
+
+def test_prefetched_files_are_not_hashed_for_header_keys(tmp_path, monkeypatch):
+    """Ключ кэша заголовков предзагруженного файла - как у файла на диске, без хэша буфера"""
+    SyntheticMerGenerator(tmp_path / "mer", months=6, kills_per_month=200).generate()
+    hashed = []
+    blake2b = month_prefetch.hashlib.blake2b
+    monkeypatch.setattr(month_prefetch.hashlib, 'blake2b', lambda *a, **kw: hashed.append(a) or blake2b(*a, **kw))
+
+    prefetched = consolidate(tmp_path / "mer", tmp_path / "out", prefetch_months=2)
+    assert hashed == []
+    pd.testing.assert_frame_equal(prefetched, consolidate(tmp_path / "mer", tmp_path / "plain", prefetch_months=0))
+
+
+def test_prefetched_file_key_and_fingerprint(tmp_path):
+    path = tmp_path / "money_supply.csv"
+    path.write_bytes(b'history_date,total_isk\n2020-01-01,1\n')
+    prefetched = month_prefetch.PrefetchedFile(path, path.read_bytes())
+    assert file_key(prefetched) == file_key(path)
+
+    fingerprint = prefetched.fingerprint()
+    reused = month_prefetch.PrefetchedFile(path, path.read_bytes()).fingerprint(dict(fingerprint, hash='old'))
+    assert reused['hash'] == 'old'
+
+
+def test_prefetcher_respects_budget_and_returns_file_contents(tmp_path, monkeypatch):
+    folders = SyntheticMerGenerator(tmp_path / "mer", months=6, kills_per_month=300).generate()
+    tasks = [(folder, None) for folder in folders]
+    prefetcher = month_prefetch.MonthPrefetcher(kinds=('production', 'money', 'kill'), depth=3)
+    sizes = [{path.name: path.stat().st_size for path in prefetcher.month_files(folder, None)}
+             for folder in folders]
+    # В каждом месяце есть файл больше бюджета: он читается с диска, остальные ждут места в бюджете
+    prefetcher.budget = budget = min(max(month.values()) for month in sizes) - 1
+    reserved = []
+    read_all = month_prefetch._read_all
+
+    def tracking_read(source):
+        reserved.append(prefetcher._reserved)
+        return read_all(source)
+
+    monkeypatch.setattr(month_prefetch, '_read_all', tracking_read)
+    prefetched = 0
+    for (folder, _), (task_folder, _), month in zip(prefetcher.iterate(tasks), tasks, sizes):
+        assert folder.name == task_folder.name
+        # Месяц, до которого планировщик не успел дойти, читается с диска целиком
+        assert set(folder.files) <= {name for name, size in month.items() if size <= budget}
+        prefetched += len(folder.files)
+        time.sleep(0.05)  # разбор месяца: планировщик успевает прочитать следующие
+        for name in month:
+            with (folder / name).open('rb') as f:
+                assert f.read() == (task_folder / name).read_bytes()
+
+    assert reserved and max(reserved) <= budget
+    assert prefetched == prefetcher.stats['files'] > 0
+    assert len(folders) - 1 <= prefetcher.stats['over_budget'] <= sum(
+        size > budget for month in sizes for size in month.values())
+    assert prefetcher._reserved == 0
+
+
+def test_small_budget_gives_same_result(tmp_path):
+    SyntheticMerGenerator(tmp_path / "mer", months=5, kills_per_month=300).generate()
+    plain = consolidate(tmp_path / "mer", tmp_path / "plain", prefetch_months=0)
+    for budget in (0, 20_000, 200_000):
+        prefetched = consolidate(tmp_path / "mer", tmp_path / f"b{budget}", prefetch_months=3, prefetch_budget=budget)
+        pd.testing.assert_frame_equal(prefetched, plain)
@@ -0,0 +1,55 @@
+import io
+import builtins
+import pandas as pd
+import pytest
+from synthetic_mer import SyntheticMerGenerator
+from schema_registry import SchemaRegistry
+from production_history import ProductionHistoryIndex
+
+
+def count_opens(monkeypatch, file_path):
+    """Счётчик открытий файла (и через open, и через Path.open)"""
+    opened = []
+    real_open = io.open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == str(file_path):
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', counting_open)
+    monkeypatch.setattr(io, 'open', counting_open)
+    return opened
+
+
+def test_history_file_is_read_once(tmp_path, monkeypatch):
+    folder = SyntheticMerGenerator(tmp_path, months=1, kills_per_month=10).generate()[0]
+    history_path = folder / "ProducedDestroyedMined.csv"
+    plan = SchemaRegistry().resolve('production', folder)
+    index = ProductionHistoryIndex()
+    opened = count_opens(monkeypatch, history_path)
+
+    history = index.load(plan)
+    assert index.load(plan) is history
+    assert len(opened) == 1
+
+    expected = pd.read_csv(history_path)
+    assert history.rows == len(expected)
+    january = expected.loc[expected['history_date'].str[:7] == '2020-01', 'production_isk'].sum()
+    assert history.month_sums(history.counts.index.max())['production_isk'] == pytest.approx(january)
+
+
+def test_changed_history_file_is_parsed_again(tmp_path):
+    folder = SyntheticMerGenerator(tmp_path, months=1, kills_per_month=10).generate()[0]
+    history_path = folder / "ProducedDestroyedMined.csv"
+    registry = SchemaRegistry()
+    index = ProductionHistoryIndex()
+    first = index.load(registry.resolve('production', folder))
+
+    df = pd.read_csv(history_path)
+    df.iloc[:-31].to_csv(history_path, index=False)
+    second = index.load(registry.resolve('production', folder))
+
+    assert second is not first
+    assert second.rows == first.rows - 31
+    assert second.source_key != first.source_key
@@ -0,0 +1,91 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from query_layer import QueryCatalog, kills_by_month_sql
+
+
+@pytest.fixture(params=[',', ';'], ids=['comma', 'semicolon'])
+def sources(tmp_path, request):
+    rng = np.random.default_rng(0)
+    rows = 3_000
+    times = pd.Timestamp('2020-01-01') + pd.to_timedelta(np.arange(rows) * 45, unit='min')
+    dump = pd.DataFrame({
+        'killmail_id': np.arange(rows),
+        'killmail_time': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'region_name': rng.choice(['Region-001', 'Region-002'], rows),
+        'isk_destroyed': rng.lognormal(18, 1, rows).round(2),
+    })
+    tables_dir = tmp_path / "tables"
+    tables_dir.mkdir()
+    dump.to_csv(tables_dir / "combined_kill_dump.csv", sep=request.param, index=False)
+    consolidated_path = tmp_path / "eve_consolidated_data_final.csv"
+    pd.DataFrame({'history_date': ['2020-01-01', '2020-02-01', '2020-03-01'],
+                  'total_isk_destroyed': [1.0, 2.0, 3.0]}).to_csv(consolidated_path, index=False)
+    return dump, {'tables_dir': tables_dir, 'consolidated_path': consolidated_path}
+
+
+@pytest.mark.parametrize('backend, convert', [('sqlite', False), ('duckdb', False), ('duckdb', True)],
+                         ids=['sqlite', 'duckdb-csv', 'duckdb-parquet'])
+def test_kills_by_month_matches_pandas(tmp_path, sources, backend, convert):
+    if backend == 'duckdb':
+        pytest.importorskip('duckdb')
+    if convert:
+        pytest.importorskip('pyarrow')
+    dump, paths = sources
+    with QueryCatalog(tmp_path / f"catalog.{backend}", backend=backend, **paths) as catalog:
+        assert catalog.refresh(convert=convert)['combined_kill_dump'] == 'обновлена'
+        storage = catalog.tables().set_index('name').loc['combined_kill_dump', 'storage']
+        result = catalog.query(kills_by_month_sql(catalog))
+        assert catalog.refresh(convert=convert)['combined_kill_dump'] == 'актуальна'
+
+    expected_storage = {'sqlite': 'table', 'duckdb': 'parquet' if convert else 'csv'}[backend]
+    assert storage == expected_storage
+    grouped = dump.groupby(dump['killmail_time'].str[:7])['isk_destroyed']
+    assert result['month'].tolist() == grouped.size().index.tolist()
+    np.testing.assert_array_equal(result['kills'].to_numpy(), grouped.size().to_numpy())
+    np.testing.assert_allclose(result['isk_destroyed'].to_numpy(), grouped.sum().to_numpy(), rtol=1e-9)
+
+
+def test_duckdb_pushes_projection_and_filter_into_parquet_scan(tmp_path, sources):
+    pytest.importorskip('duckdb')
+    pytest.importorskip('pyarrow')
+    _, paths = sources
+    sql = ("SELECT region_name, sum(isk_destroyed) FROM combined_kill_dump "
+           "WHERE killmail_time >= '2020-02-01' GROUP BY 1")
+    with QueryCatalog(tmp_path / "catalog.duckdb", backend='duckdb', **paths) as catalog:
+        catalog.refresh()
+        plan = catalog.explain(sql)
+
+    scan = plan[plan.index('READ_PARQUET'):]
+    assert 'Projections' in scan and 'Filters' in scan
+    assert 'killmail_id' not in scan
+
+
+def test_sqlite_period_filter_uses_index(tmp_path, sources):
+    _, paths = sources
+    with QueryCatalog(tmp_path / "catalog.sqlite", backend='sqlite', **paths) as catalog:
+        catalog.refresh()
+        plan = catalog.explain("SELECT count(*) FROM combined_kill_dump WHERE killmail_time >= '2020-02'")
+    assert 'INDEX' in plan
+
+
+def test_refresh_rebuilds_copy_converted_with_wrong_separator(tmp_path, sources):
+    pytest.importorskip('duckdb')
+    pa_csv = pytest.importorskip('pyarrow.csv')
+    import pyarrow.parquet as pq
+    from columnar_cache import columnar_paths, convert_table, read_meta
+    dump, paths = sources
+    csv_path = paths['tables_dir'] / "combined_kill_dump.csv"
+    convert_table(csv_path)
+    # Копия в том виде, в каком её писала конвертация без определения разделителя
+    parquet_path, meta_path = columnar_paths(csv_path)
+    pq.write_table(pa_csv.read_csv(csv_path), parquet_path)
+    meta = read_meta(meta_path)
+    del meta['sep']
+    meta_path.write_text(json.dumps(meta), encoding='utf-8')
+
+    with QueryCatalog(tmp_path / "catalog.duckdb", backend='duckdb', **paths) as catalog:
+        catalog.refresh()
+        result = catalog.query(kills_by_month_sql(catalog))
+    assert result['kills'].sum() == len(dump)
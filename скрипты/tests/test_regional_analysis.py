@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from regional_analysis import RegionalAnalysis, load_region_month
+
+METRICS = ['total_isk_destroyed', 'trade_value', 'kill_count']
+
+
+@pytest.fixture
+def region_month(tmp_path):
+    rng = np.random.default_rng(5)
+    months = pd.period_range('2019-01', periods=24, freq='M').astype(str)
+    regions = ['Delve', 'Fountain', 'Querious', 'The Forge']
+    df = pd.DataFrame({'region_name': np.repeat(regions, len(months)), 'month': np.tile(months, len(regions))})
+    scale = df['region_name'].map(dict(zip(regions, [1.0, 5.0, 0.2, 2.0])))
+    df['total_isk_destroyed'] = rng.lognormal(25, 1, len(df)) * scale
+    df['trade_value'] = rng.lognormal(27, 0.5, len(df))
+    df['kill_count'] = rng.integers(100, 5_000, len(df)).astype(float)
+    df.loc[[3, 40, 41], 'trade_value'] = np.nan
+    csv_path = tmp_path / "summary_by_region_month.csv"
+    df.sample(frac=1, random_state=0).to_csv(csv_path, index=False)
+    return csv_path
+
+
+def test_war_flag_uses_each_region_threshold(region_month):
+    df = load_region_month(region_month, war_percentile=75)
+    assert list(df.columns[:2]) == ['region', 'month']
+    for region, group in df.groupby('region', observed=True):
+        assert group['month'].is_monotonic_increasing
+        threshold = group['total_isk_destroyed'].quantile(0.75)
+        assert (group['is_war_period'] == (group['total_isk_destroyed'] >= threshold)).all()
+        assert group['is_war_period'].sum() == 6
+
+
+def test_grouped_results_match_per_region_loop(region_month, tmp_path):
+    df = load_region_month(region_month)
+    analysis = RegionalAnalysis(df, METRICS + ['mining_isk'])
+    assert analysis.metrics == METRICS
+    table = analysis.run()
+
+    stats = analysis.results['basic_statistics']
+    comparison = analysis.results['war_peace_comparison']
+    correlations = analysis.results['spearman_correlations']
+    for region, group in df.groupby('region', observed=True):
+        for metric in METRICS:
+            values = group[metric]
+            assert stats.loc[(region, metric), 'median'] == pytest.approx(values.median())
+            assert stats.loc[(region, metric), 'std'] == pytest.approx(values.std())
+            war = values[group['is_war_period'] == 1].dropna()
+            peace = values[group['is_war_period'] == 0].dropna()
+            row = comparison.loc[(region, metric)]
+            assert (row['war_months'], row['peace_months']) == (len(war), len(peace))
+            assert row['relative_diff_pct'] == pytest.approx((war.mean() - peace.mean()) / peace.mean() * 100)
+        expected = group[METRICS].corr(method='spearman')
+        for (metric_a, metric_b), rho in correlations.loc[region, 'spearman'].items():
+            assert rho == pytest.approx(expected.loc[metric_a, metric_b])
+
+    assert set(table['analysis']) == {'basic_statistics', 'war_peace_comparison', 'spearman'}
+    saved = pd.read_csv(analysis.save(tmp_path))
+    assert len(saved) == len(table) and set(saved['region']) == set(df['region'].astype(str))
@@ -0,0 +1,37 @@
+import matplotlib.pyplot as plt
+import pytest
+import render_pipeline
+from synthetic_mer import SyntheticMerGenerator
+from consolidate_eve_data import EveDataConsolidatorFinal
+
+
+@pytest.fixture(scope='module')
+def consolidated(tmp_path_factory):
+    root = tmp_path_factory.mktemp("render")
+    SyntheticMerGenerator(root / "mer", months=12, kills_per_month=100).generate()
+    consolidator = EveDataConsolidatorFinal(archives_dir=root / "mer", output_dir=root / "out",
+                                            log_level='ERROR', use_cache=False)
+    df = consolidator.add_war_indicator(consolidator.consolidate_all_months_fixed(), percentile=75)
+    consolidator.save_results_fixed(df)
+    return root / "out" / "eve_consolidated_data_final.csv"
+
+
+def test_every_job_writes_one_file_and_figures_are_reused(tmp_path, consolidated):
+    plt.close('all')
+    done = render_pipeline.render_all(consolidated, tmp_path / "plots", fmt='svg', dpi=50, workers=1)
+    assert done == render_pipeline.render_jobs()
+    files = sorted(path.name for path in (tmp_path / "plots").iterdir())
+    assert len(files) == len(done) and all(name.endswith('.svg') for name in files)
+    # Фигуры одного размера переиспользуются, а не создаются на каждый график
+    assert len(plt.get_fignums()) < len(done)
+    plt.close('all')
+
+
+def test_worker_processes_write_the_same_files(tmp_path, consolidated):
+    sequential = render_pipeline.render_all(consolidated, tmp_path / "one", fmt='png', dpi=40, workers=1)
+    parallel = render_pipeline.render_all(consolidated, tmp_path / "two", fmt='png', dpi=40, workers=2)
+    plt.close('all')
+    assert parallel == sequential
+    one = sorted(path.name for path in (tmp_path / "one").iterdir())
+    assert one == sorted(path.name for path in (tmp_path / "two").iterdir())
+    assert all((tmp_path / "two" / name).stat().st_size > 0 for name in one)
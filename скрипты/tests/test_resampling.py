@@ -0,0 +1,56 @@
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import pytest
+from resampling import ResamplingEngine
+
+
+def months(n=40, seed=0, effect=0.0):
+    rng = np.random.default_rng(seed)
+    is_war = np.zeros(n, dtype=int)
+    is_war[rng.choice(n, n // 4, replace=False)] = 1
+    df = pd.DataFrame({'is_war_period': is_war,
+                       'kills': rng.normal(100, 10, n) * (1 + effect * is_war),
+                       'trade': rng.normal(50, 5, n)})
+    df.loc[[1, 5, 7], 'trade'] = np.nan
+    return df
+
+
+def test_means_skip_missing_values_and_effect_is_detected():
+    df = months(effect=0.5)
+    result = ResamplingEngine(n_resamples=2_000, batch_size=700).compare(df, ['kills', 'trade', 'missing'])
+
+    expected = df.groupby('is_war_period')[['kills', 'trade']].agg(['mean', 'count'])
+    assert list(result['metric']) == ['kills', 'trade']
+    np.testing.assert_allclose(result['war_mean'], expected.loc[1, (slice(None), 'mean')])
+    np.testing.assert_allclose(result['peace_mean'], expected.loc[0, (slice(None), 'mean')])
+    assert list(result['war_months']) == list(expected.loc[1, (slice(None), 'count')])
+    assert list(result['peace_months']) == list(expected.loc[0, (slice(None), 'count')])
+
+    kills = result.iloc[0]
+    assert kills['p_value'] == pytest.approx(1 / 2_001)
+    assert 0 < kills['ci_low_pct'] < kills['relative_diff_pct'] < kills['ci_high_pct']
+
+
+def test_permutation_p_value_matches_exact_enumeration():
+    df = pd.DataFrame({'is_war_period': [1, 1, 1, 0, 0, 0, 0, 0],
+                       'kills': [9.0, 7.0, 6.5, 6.0, 4.0, 5.0, 3.0, 7.5]})
+    values = df['kills'].to_numpy()
+    observed = abs(values[:3].mean() - values[3:].mean())
+    diffs = [abs(values[list(war)].mean() - np.delete(values, list(war)).mean())
+             for war in combinations(range(len(values)), 3)]
+    exact = np.mean(np.array(diffs) >= observed - 1e-12)
+
+    p_value = ResamplingEngine(n_resamples=20_000, seed=1).compare(df, ['kills'])['p_value'].iloc[0]
+    assert p_value == pytest.approx(exact, abs=0.01)
+
+
+def test_result_does_not_depend_on_workers_and_skips_one_sided_groups():
+    df = pd.concat([months(seed=1).assign(region='A'), months(seed=2, effect=0.2).assign(region='B'),
+                    months(seed=3).assign(region='C', is_war_period=1)], ignore_index=True)
+    options = dict(n_resamples=1_500, batch_size=400, seed=7)
+
+    sequential = ResamplingEngine(workers=1, **options).compare(df, ['kills', 'trade'], by='region')
+    parallel = ResamplingEngine(workers=2, **options).compare(df, ['kills', 'trade'], by='region')
+    pd.testing.assert_frame_equal(sequential, parallel)
+    assert list(sequential['region'].unique()) == ['A', 'B']
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from war_classifier import RegionalWarClassifier, SlidingQuantile, classify_series
+
+
+def random_series(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    # Повторяющиеся значения (ничьи в кучах) и пропуски, в том числе подряд
+    values = rng.integers(0, 40, n).astype(float)
+    values[rng.random(n) < 0.15] = np.nan
+    values[50:60] = np.nan
+    return pd.Series(values)
+
+
+@pytest.mark.parametrize('q', [0, 0.1, 0.5, 0.75, 0.9, 1])
+@pytest.mark.parametrize('window', [1, 5, 24, None])
+def test_sliding_quantile_matches_pandas_with_nans(q, window):
+    values = random_series()
+    sliding = SlidingQuantile(q, window)
+    result = []
+    for value in values:
+        sliding.push(value)
+        result.append(sliding.quantile())
+
+    rolling = values.rolling(window, min_periods=1) if window else values.expanding(min_periods=1)
+    np.testing.assert_allclose(result, rolling.quantile(q).to_numpy(), rtol=1e-12, equal_nan=True)
+
+
+def test_rolling_classifier_uses_only_previous_months():
+    values = random_series(seed=1).fillna(0) * 1e9
+    labels = classify_series(values, 'rolling', percentile=75, window=24, min_periods=6)
+
+    expected = values.rolling(24, min_periods=6).quantile(0.75).shift(1)
+    np.testing.assert_allclose(labels['war_threshold'], expected, equal_nan=True)
+    np.testing.assert_array_equal(labels['is_war_period'], (values >= expected).astype(int))
+    # Новые месяцы не меняют уже выставленные метки
+    pd.testing.assert_frame_equal(classify_series(values[:200], 'rolling'), classify_series(values, 'rolling')[:200])
+
+
+def test_regional_classifier_matches_per_region_series():
+    rng = np.random.default_rng(2)
+    months = pd.period_range('2018-01', periods=36, freq='M').astype(str)
+    df = pd.DataFrame({'month': np.repeat(months, 3), 'region': np.tile(['A', 'B', 'C'], 36),
+                       'total_isk_destroyed': rng.lognormal(20, 1, 108)}).sample(frac=1, random_state=0)
+
+    result = RegionalWarClassifier('ewma', span=6).classify_frame(df)
+    for region, group in df.groupby('region'):
+        ordered = group.sort_values('month')
+        expected = classify_series(ordered['total_isk_destroyed'], 'ewma', span=6)
+        pd.testing.assert_frame_equal(result.loc[ordered.index], expected)
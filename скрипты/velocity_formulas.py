@@ -0,0 +1,127 @@
+import ast
+import operator
+import numpy as np
+import pandas as pd
+
+# Варианты формулы скорости обращения денег
+VELOCITY_FORMULAS = {
+    'formula1': 'trade_value / total_isk',
+    'formula2': '(trade_value + destruction_isk) / total_isk',  # официальная
+    'formula3': 'trade_value / (total_isk * 0.85)',  # коэффициент коррекции
+}
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+
+class VelocityFormulaEngine:
+    """
+    Векторное вычисление набора формул над столбцами DataFrame
+
+    Формулы задаются строками арифметических выражений над именами
+    столбцов (+, -, *, /, скобки, числа). Все формулы считаются одним
+    проходом над целыми столбцами; общие подвыражения вычисляются один
+    раз. Строка получает NaN, если любой знаменатель в ней не
+    положителен или не определён (как в прежнем построчном варианте
+    `... if row['total_isk'] > 0 else np.nan`).
+    """
+
+    def __init__(self, formulas=None):
+        """
+        Parameters:
+        -----------
+        formulas : dict, optional
+            Имя формулы -> выражение; по умолчанию VELOCITY_FORMULAS
+        """
+        self.formulas = dict(formulas or VELOCITY_FORMULAS)
+        self.trees = {name: ast.parse(expr, mode='eval').body for name, expr in self.formulas.items()}
+
+    def columns_used(self):
+        """Имена столбцов, на которые ссылаются формулы"""
+        names = set()
+        for tree in self.trees.values():
+            names.update(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+        return sorted(names)
+
+    def _evaluate_node(self, node, data, cache):
+        """Значение и маска допустимости узла выражения"""
+        key = ast.dump(node)
+        if key in cache:
+            return cache[key]
+
+        if isinstance(node, ast.Name):
+            values = data[node.id]
+            result = (values, np.ones(len(values), dtype=bool))
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            result = (float(node.value), True)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            values, valid = self._evaluate_node(node.operand, data, cache)
+            result = (-values if isinstance(node.op, ast.USub) else values, valid)
+        elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            left, left_valid = self._evaluate_node(node.left, data, cache)
+            right, right_valid = self._evaluate_node(node.right, data, cache)
+            valid = left_valid & right_valid
+            if isinstance(node.op, ast.Div):
+                # Знаменатель должен быть положительным (NaN > 0 тоже False)
+                valid = valid & (right > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = BINARY_OPERATORS[type(node.op)](left, right)
+            result = (values, valid)
+        else:
+            raise ValueError(f"Недопустимый элемент формулы: {ast.unparse(node)}")
+
+        cache[key] = result
+        return result
+
+    def evaluate(self, df):
+        """
+        Вычисление всех формул
+
+        Returns:
+        --------
+        pd.DataFrame
+            Столбцы velocity_<имя формулы> с индексом исходного df
+        """
+        data = {name: df[name].to_numpy(dtype=np.float64) for name in self.columns_used()}
+        cache = {}
+        results = {}
+        for name, tree in self.trees.items():
+            values, valid = self._evaluate_node(tree, data, cache)
+            values = np.broadcast_to(values, len(df))
+            results[f'velocity_{name}'] = np.where(valid, values, np.nan)
+        return pd.DataFrame(results, index=df.index)
+
+    def comparison_table(self, df, by=None):
+        """
+        Сравнительная таблица формул: число значений, среднее, ст. отклонение, диапазон
+
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            Исходные данные (месячные, дневные, по регионам)
+        by : str или list, optional
+            Столбцы группировки (например, регион); статистика считается
+            для всех групп одной агрегацией
+
+        Returns:
+        --------
+        pd.DataFrame
+            Строка на формулу (и группу)
+        """
+        velocities = self.evaluate(df)
+        stats = ['count', 'mean', 'std', 'min', 'max']
+
+        if by is None:
+            table = velocities.agg(stats).T
+            table.index = [name.replace('velocity_', '', 1) for name in table.index]
+            table.index.name = 'formula'
+            return table
+
+        keys = [by] if isinstance(by, str) else list(by)
+        velocities.columns = [name.replace('velocity_', '', 1) for name in velocities.columns]
+        tidy = velocities.join(df[keys]).melt(id_vars=keys, var_name='formula', value_name='velocity')
+        return tidy.groupby(keys + ['formula'], observed=True, sort=True)['velocity'].agg(stats)
@@ -0,0 +1,244 @@
+import heapq
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Все классификаторы причинные: порог месяца считается только по
+# предыдущим месяцам, поэтому добавление новых месяцев не меняет
+# уже выставленные метки и кэши, построенные на них, остаются верными.
+
+
+class SlidingQuantile:
+    """
+    Квантиль по скользящему окну на двух кучах
+
+    Нижняя куча (max-heap) хранит k + 1 наименьших значений окна,
+    где k = floor(q * (n - 1)), верхняя (min-heap) - остальные. Квантиль
+    с линейной интерполяцией (как pandas.Series.quantile) берётся по
+    вершинам куч. Вытесняемые из окна значения удаляются лениво, поэтому
+    добавление значения стоит O(log n) без пересортировки окна.
+    """
+
+    def __init__(self, q, window=None):
+        """
+        Parameters:
+        -----------
+        q : float
+            Квантиль от 0 до 1
+        window : int, optional
+            Размер окна в наблюдениях (None - вся история)
+        """
+        if not 0 <= q <= 1:
+            raise ValueError(f"Квантиль должен быть от 0 до 1: {q}")
+        self.q = q
+        self.window = window
+        self._low = []   # (-значение, -номер): max-heap
+        self._high = []  # (значение, номер): min-heap
+        self._low_size = 0
+        self._high_size = 0
+        self._removed = set()
+        self._entries = deque()
+        self._seq = 0
+
+    def __len__(self):
+        return self._low_size + self._high_size
+
+    def _prune(self):
+        while self._low and -self._low[0][1] in self._removed:
+            self._removed.discard(-heapq.heappop(self._low)[1])
+        while self._high and self._high[0][1] in self._removed:
+            self._removed.discard(heapq.heappop(self._high)[1])
+
+    def _low_top(self):
+        value, seq = self._low[0]
+        return (-value, -seq)
+
+    def _rebalance(self):
+        n = len(self)
+        target = math.floor(self.q * (n - 1)) + 1 if n else 0
+        self._prune()
+        while self._low_size > target:
+            value, seq = self._low_top()
+            heapq.heappop(self._low)
+            heapq.heappush(self._high, (value, seq))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune()
+        while self._low_size < target:
+            value, seq = heapq.heappop(self._high)
+            heapq.heappush(self._low, (-value, -seq))
+            self._high_size -= 1
+            self._low_size += 1
+            self._prune()
+
+    def _remove(self, entry):
+        # Пары (значение, номер) уникальны, поэтому куча элемента известна точно
+        if self._low_size and entry <= self._low_top():
+            self._low_size -= 1
+        else:
+            self._high_size -= 1
+        self._removed.add(entry[1])
+
+    def push(self, value):
+        """Добавление наблюдения (NaN занимает место в окне, но не учитывается)"""
+        entry = None
+        if value is not None and not math.isnan(value):
+            entry = (float(value), self._seq)
+            if self._low_size and entry <= self._low_top():
+                heapq.heappush(self._low, (-entry[0], -entry[1]))
+                self._low_size += 1
+            else:
+                heapq.heappush(self._high, entry)
+                self._high_size += 1
+        self._seq += 1
+        self._entries.append(entry)
+
+        if self.window is not None and len(self._entries) > self.window:
+            expired = self._entries.popleft()
+            if expired is not None:
+                self._remove(expired)
+        self._rebalance()
+
+    def quantile(self):
+        n = len(self)
+        if n == 0:
+            return np.nan
+        position = self.q * (n - 1)
+        k = math.floor(position)
+        frac = position - k
+        low = self._low_top()[0]
+        if frac == 0 or not self._high_size:
+            return low
+        high = self._high[0][0]
+        return low + (high - low) * frac
+
+
+class RollingQuantileClassifier:
+    """Война - месяц, потери которого не ниже квантиля предыдущих window месяцев"""
+
+    def __init__(self, percentile=75, window=24, min_periods=6):
+        self.percentile = percentile
+        self.window = window
+        self.min_periods = min_periods
+        self._quantile = SlidingQuantile(percentile / 100, window)
+
+    def threshold(self):
+        if len(self._quantile) < self.min_periods:
+            return np.nan
+        return self._quantile.quantile()
+
+    def update(self, value):
+        """
+        Классификация очередного месяца и добавление его в историю
+
+        Returns:
+        --------
+        tuple
+            (метка 0/1, порог)
+        """
+        threshold = self.threshold()
+        label = int(not np.isnan(threshold) and value >= threshold)
+        self._quantile.push(value)
+        return label, threshold
+
+
+class EwmaClassifier:
+    """Война - месяц, потери которого выше EWMA-среднего на k EWMA-отклонений"""
+
+    def __init__(self, span=12, k=1.0, min_periods=6):
+        self.alpha = 2 / (span + 1)
+        self.k = k
+        self.min_periods = min_periods
+        self._mean = None
+        self._var = 0.0
+        self._count = 0
+
+    def threshold(self):
+        if self._count < self.min_periods:
+            return np.nan
+        return self._mean + self.k * math.sqrt(self._var)
+
+    def update(self, value):
+        threshold = self.threshold()
+        label = int(not np.isnan(threshold) and value >= threshold)
+        if value is not None and not math.isnan(value):
+            if self._mean is None:
+                self._mean = float(value)
+            else:
+                # Экспоненциально взвешенные среднее и дисперсия (O(1) на месяц)
+                diff = value - self._mean
+                increment = self.alpha * diff
+                self._mean += increment
+                self._var = (1 - self.alpha) * (self._var + diff * increment)
+            self._count += 1
+        return label, threshold
+
+
+CLASSIFIERS = {
+    'rolling': RollingQuantileClassifier,
+    'ewma': EwmaClassifier,
+}
+
+
+def make_classifier(method, **options):
+    if method not in CLASSIFIERS:
+        raise ValueError(f"Неизвестный метод классификации войн: {method}")
+    return CLASSIFIERS[method](**options)
+
+
+def classify_series(values, method='rolling', **options):
+    """
+    Причинная разметка ряда потерь
+
+    Parameters:
+    -----------
+    values : pd.Series
+        Потери по месяцам в хронологическом порядке
+    method : str
+        'rolling' или 'ewma'
+    **options
+        Параметры классификатора (percentile, window, span, k, min_periods)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Столбцы is_war_period и war_threshold с индексом values
+    """
+    classifier = make_classifier(method, **options)
+    results = [classifier.update(value) for value in values.to_numpy(dtype=np.float64)]
+    labels, thresholds = zip(*results) if results else ((), ())
+    return pd.DataFrame({'is_war_period': np.array(labels, dtype=int),
+                         'war_threshold': np.array(thresholds, dtype=np.float64)}, index=values.index)
+
+
+class RegionalWarClassifier:
+    """Отдельный причинный классификатор для каждого региона"""
+
+    def __init__(self, method='rolling', **options):
+        self.method = method
+        self.options = options
+        self.classifiers = {}
+
+    def update(self, region, value):
+        classifier = self.classifiers.get(region)
+        if classifier is None:
+            classifier = self.classifiers[region] = make_classifier(self.method, **self.options)
+        return classifier.update(value)
+
+    def classify_frame(self, df, region_col='region', value_col='total_isk_destroyed', time_col='month'):
+        """
+        Разметка помесячной таблицы по регионам
+
+        Returns:
+        --------
+        pd.DataFrame
+            Столбцы is_war_period и war_threshold с индексом df
+        """
+        ordered = df.sort_values(time_col, kind='stable')
+        results = [self.update(region, value) for region, value
+                   in zip(ordered[region_col].to_numpy(), ordered[value_col].to_numpy(dtype=np.float64))]
+        labels, thresholds = zip(*results) if results else ((), ())
+        result = pd.DataFrame({'is_war_period': np.array(labels, dtype=int),
+                               'war_threshold': np.array(thresholds, dtype=np.float64)}, index=ordered.index)
+        return result.reindex(df.index)